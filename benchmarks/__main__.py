@@ -0,0 +1,74 @@
+"""python -m benchmarks [--quick] [--output results.json] [--update-baseline]
+
+Runs the benchmarks, writes the JSON results and fails when a case is
+slower than the stored baseline by more than the threshold.
+"""
+import argparse
+import json
+import os
+import sys
+
+from benchmarks.suite import BENCHMARKS, DEFAULT_THRESHOLD, MIN_TIME, \
+    run, compare
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("names", nargs="*",
+                        help=f"benchmarks to run, of {', '.join(BENCHMARKS)} "
+                             f"(default: all)")
+    parser.add_argument("--quick", action="store_true",
+                        help="only the smallest circuit lengths and batches")
+    parser.add_argument("--output", help="file for the JSON results")
+    parser.add_argument("--baseline", default=BASELINE,
+                        help="baseline JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown relative to the baseline")
+    parser.add_argument("--min-time", type=float, default=MIN_TIME,
+                        help="minimal duration of one timed repeat (s)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store the results as the new baseline")
+    arguments = parser.parse_args(argv)
+    unknown = set(arguments.names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = run(arguments.names, arguments.quick, arguments.min_time)
+    for case, result in results.items():
+        print(f"{case:60} {result['seconds'] * 1e3:12.4f} ms "
+              f"{result['relative']:12.4g} x reference")
+    if arguments.output:
+        _dump(results, arguments.output)
+
+    if arguments.update_baseline:
+        baseline = _load(arguments.baseline)
+        baseline.update(results)
+        _dump(baseline, arguments.baseline)
+        return 0
+
+    regressions = compare(results, _load(arguments.baseline),
+                          arguments.threshold)
+    for case, ratio in regressions:
+        print(f"REGRESSION {case}: {ratio:.2f} times slower than "
+              f"the baseline", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def _load(path):
+    """Loads JSON results, an empty dict if the file does not exist"""
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)
+
+
+def _dump(results, path):
+    """Writes JSON results"""
+    with open(path, "w") as file:
+        json.dump(results, file, indent=2, sort_keys=True)
+        file.write("\n")
+
+
+sys.exit(main())
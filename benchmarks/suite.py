@@ -0,0 +1,218 @@
+"""Benchmarks of the optimize_circuit package
+
+Every benchmark is a function benchmark(length, batch) returning the
+callable to time, it is swept over the circuit lengths and the batch
+sizes given in BENCHMARKS. The timings are stored together with their
+ratio to a fixed reference workload, the ratios are compared with the
+baseline, so that a baseline recorded on one machine stays meaningful
+on another one.
+"""
+import time
+
+import numpy as np
+
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.gates import X, Y, Z, CX, OneQubitUnitary
+from optimize_circuit.hardware_configuration import HardwareConfiguration
+from optimize_circuit.optimize_gates import optimize_one_qubit_circuit, \
+    micro_optimize_one_qubit_circuit, optimize_batch
+from optimize_circuit.transformations import u_to_zxz_gates, \
+    u_to_zyz_gates
+
+DEFAULT_THRESHOLD = 1.5
+MIN_TIME = 0.05  # s, the minimal duration of one timed repeat
+
+
+def _random_gates(length, seed=0, qubit_number=1, low=-180, high=180):
+    """Random X, Y, Z (and CX for two qubits) gates"""
+    rng = np.random.default_rng(seed)
+    gates = []
+    for _ in range(length):
+        qubit = int(rng.integers(qubit_number))
+        if qubit_number == 2 and rng.random() < 0.2:
+            gates.append(CX(qubit, 1 - qubit))
+        else:
+            gate_type = (X, Y, Z)[rng.integers(3)]
+            gates.append(gate_type(qubit, float(rng.uniform(low, high))))
+    return gates
+
+
+def _random_circuit_strings(length, batch):
+    """Strings of batch random one qubit circuits"""
+    return [", ".join(str(gate) for gate in _random_gates(length, seed))
+            for seed in range(batch)]
+
+
+def bench_add_from_string(length, batch):
+    hardware = HardwareConfiguration(1)
+    strings = _random_circuit_strings(length, batch)
+
+    def run():
+        for string in strings:
+            QuantumCircuit(hardware).add_from_string(string)
+    return run
+
+
+def bench_add_with_translation(length, batch):
+    hardware = HardwareConfiguration(1, basis_gates={'X', 'Z', 'CX'})
+    circuits = [_random_gates(length, seed) for seed in range(batch)]
+
+    def run():
+        for gates in circuits:
+            circuit = QuantumCircuit(hardware)
+            for gate in gates:
+                circuit.add(gate)
+    return run
+
+
+def bench_optimize_one_qubit_circuit(length, batch):
+    hardware = HardwareConfiguration(1)
+    circuits = [_random_gates(length, seed) for seed in range(batch)]
+
+    def run():
+        for gates in circuits:
+            optimize_one_qubit_circuit(gates, hardware)
+    return run
+
+
+def bench_optimize_batch(length, batch):
+    hardware = HardwareConfiguration(1)
+    circuits = [_random_gates(length, seed) for seed in range(batch)]
+
+    def run():
+        optimize_batch(circuits, hardware)
+    return run
+
+
+def bench_micro_optimize(length, batch):
+    # the fused angles of neighbours stay away from multiples of 360
+    circuits = [_random_gates(length, seed, low=10, high=170)
+                for seed in range(batch)]
+
+    def run():
+        for gates in circuits:
+            micro_optimize_one_qubit_circuit(gates)
+    return run
+
+
+def bench_gate_construction(length, batch):
+    angles = np.random.default_rng(0).uniform(
+        -180, 180, length * batch).tolist()
+
+    def run():
+        for angle in angles:
+            X(0, angle)
+            Y(0, angle)
+            Z(0, angle)
+    return run
+
+
+def bench_decompositions(length, batch):
+    rng = np.random.default_rng(0)
+    unitaries = [OneQubitUnitary(0, *rng.uniform(-180, 180, 3))
+                 for _ in range(length * batch)]
+
+    def run():
+        for unitary in unitaries:
+            u_to_zxz_gates(unitary)
+            u_to_zyz_gates(unitary)
+    return run
+
+
+# name -> (benchmark, circuit lengths, batch sizes)
+BENCHMARKS = {
+    "add_from_string": (bench_add_from_string, (10, 1000, 10000), (1, 100)),
+    "add_with_translation": (bench_add_with_translation, (10, 1000), (1, 10)),
+    "optimize_one_qubit_circuit": (bench_optimize_one_qubit_circuit,
+                                   (4, 64, 1024), (1, 100)),
+    "optimize_batch": (bench_optimize_batch, (4, 64, 1024), (1, 100)),
+    "micro_optimize": (bench_micro_optimize, (1, 2, 3), (1, 1000)),
+    "gate_construction": (bench_gate_construction, (1,), (1, 1000)),
+    "decompositions": (bench_decompositions, (1,), (1, 1000)),
+}
+
+
+def reference():
+    """A fixed workload of Python loops and small numpy products,
+    the timings are given relative to it"""
+    matrix = np.identity(2, dtype=complex)
+    rotation = X(0, 1.0).arr
+    for _ in range(2000):
+        matrix = rotation @ matrix
+    return sum(i * i for i in range(20000))
+
+
+def measure(function, min_time=MIN_TIME, repeat=3):
+    """The best time of one call of the function
+
+    :param function: callable without arguments
+    :param min_time: float, minimal duration of one repeat in seconds
+    :param repeat: int, number of the repeats
+    :return: float, seconds per call
+    """
+    function()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed == 0 else \
+            max(2, min(10, int(min_time / elapsed) + 1))
+
+    best = elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def run(names=None, quick=False, min_time=MIN_TIME, repeat=3):
+    """Runs the benchmarks
+
+    :param names: list of the names of BENCHMARKS, None runs all of them
+    :param quick: bool, only the two smallest lengths and the smallest
+            batch size
+    :param min_time: float, minimal duration of one repeat in seconds
+    :param repeat: int, number of the repeats
+    :return: dict, case name -> {"seconds": ..., "relative": ...}
+    """
+    reference_time = measure(reference, min_time, repeat)
+    results = {}
+    for name in names or BENCHMARKS:
+        benchmark, lengths, batches = BENCHMARKS[name]
+        if quick:
+            lengths, batches = lengths[:2], batches[:1]
+        for length in lengths:
+            for batch in batches:
+                seconds = measure(benchmark(length, batch), min_time, repeat)
+                results[case_name(name, length, batch)] = {
+                    "seconds": seconds,
+                    "relative": seconds / reference_time}
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Finds the cases slower than the baseline by more than threshold
+
+    :param results: dict returned by run
+    :param baseline: dict returned by run, e.g. loaded from baseline.json
+    :param threshold: float, the allowed ratio of the relative timings
+    :return: list of (case name, ratio) of the regressions
+    """
+    regressions = []
+    for case, result in results.items():
+        if case in baseline:
+            ratio = result["relative"] / baseline[case]["relative"]
+            if ratio > threshold:
+                regressions.append((case, ratio))
+    return regressions
+
+
+def case_name(name, length, batch):
+    """Name of a benchmark case, e.g. 'optimize_batch[length=64,batch=100]'"""
+    return f"{name}[length={length},batch={batch}]"
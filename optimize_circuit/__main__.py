@@ -0,0 +1,5 @@
+import sys
+
+from optimize_circuit.cli import main
+
+sys.exit(main())
@@ -0,0 +1,170 @@
+"""Compact binary format of circuits with memory-mapped loading
+
+A file starts with MAGIC, the uint32 size of the header and the header
+itself: JSON with the format version, the qubit number, the basis gates
+and the gate durations of the hardware, padded with spaces so that the
+gates start at a multiple of HEADER_ALIGNMENT. The gates follow as the
+records of GATE_DTYPE, one per gate in the time order, and their number
+is given by the size of the file, so gates are appended to a file
+without rewriting it.
+
+load maps the records into memory: the columns of GateStorage are views
+of the fields of the mapped records, so a circuit of any length is
+opened without reading it and no per gate objects are created. The map
+is copy-on-write, the changes of a loaded circuit never reach the file.
+"""
+import json
+import os
+import struct
+
+import numpy as np
+
+from optimize_circuit.gate_storage import GateStorage
+from optimize_circuit.hardware_configuration import HardwareConfiguration
+
+MAGIC = b"OQCB"
+VERSION = 1
+HEADER_ALIGNMENT = 64
+# aligned little endian records of 16 bytes, the field types are the
+# column types of GateStorage
+GATE_DTYPE = np.dtype({"names": ["code", "flags", "qubit_1", "qubit_2",
+                                 "angle"],
+                       "formats": ["i1", "u1", "<i2", "<i2", "<f8"],
+                       "offsets": [0, 1, 2, 4, 8], "itemsize": 16})
+_PREFIX = struct.Struct("<4sI")
+
+
+def save(path, storage, hardware):
+    """Writes the gates and the hardware into a new file
+
+    :param path: path of the file, overwritten if it exists
+    :param storage: GateStorage of the circuit
+    :param hardware: HardwareConfiguration
+    """
+    header = json.dumps({
+        "version": VERSION,
+        "qubit_number": hardware.qubit_number,
+        "basis_gates": sorted(hardware.basis_gates),
+        "length_x": hardware.length_x,
+        "length_y": hardware.length_y,
+        "length_z": hardware.length_z,
+        "length_cx": hardware.length_cx}).encode()
+    size = -(-(_PREFIX.size + len(header)) // HEADER_ALIGNMENT) * \
+        HEADER_ALIGNMENT
+    with open(path, "wb") as file:
+        file.write(_PREFIX.pack(MAGIC, size))
+        file.write(header.ljust(size - _PREFIX.size))
+        file.write(_records(storage).tobytes())
+
+
+def append(path, storage):
+    """Appends the gates to an existing file
+
+    :param path: path of a file written by save
+    :param storage: GateStorage of the appended gates
+    """
+    header, _ = _read_header(path)
+    if len(storage) and max(storage.qubits_1.max(), storage.qubits_2.max()) \
+            >= header["qubit_number"]:
+        raise ValueError("The appended gates act on qubits missing in "
+                         f"the {header['qubit_number']} qubit circuit")
+    with open(path, "ab") as file:
+        file.write(_records(storage).tobytes())
+
+
+def load(path, start=0, stop=None):
+    """Maps the gates of a file (or of a slice of it) into memory
+
+    :param path: path of a file written by save
+    :param start: int, index of the first loaded gate
+    :param stop: int, index after the last loaded gate, None for the end
+    :return: tuple (GateStorage, header dict)
+    """
+    header, offset = _read_header(path)
+    records = _map(path, offset)[start:stop]
+    storage = GateStorage.from_columns(
+        records["code"], records["qubit_1"], records["qubit_2"],
+        records["angle"], records["flags"])
+    return storage, header
+
+
+def read_header(path):
+    """:returns the header dict of a file"""
+    return _read_header(path)[0]
+
+
+def header_hardware(header):
+    """Creates the hardware described by a header
+
+    :param header: dict, see read_header
+    :return: HardwareConfiguration
+    """
+    hardware = HardwareConfiguration(header["qubit_number"],
+                                     frozenset(header["basis_gates"]))
+    for name in ("length_x", "length_y", "length_z", "length_cx"):
+        setattr(hardware, name, header[name])
+    return hardware
+
+
+def gate_number(path):
+    """:returns int, the number of the gates of a file, without mapping
+    it"""
+    _, offset = _read_header(path)
+    return (os.path.getsize(path) - offset) // GATE_DTYPE.itemsize
+
+
+def to_bytes(storage):
+    """:returns bytes, the gates of GateStorage as GATE_DTYPE records,
+    equal gates give equal bytes"""
+    return _records(storage).tobytes()
+
+
+def from_bytes(data):
+    """Creates GateStorage from the bytes of to_bytes
+
+    :param data: bytes of GATE_DTYPE records
+    :return: GateStorage
+    """
+    records = np.frombuffer(data, dtype=GATE_DTYPE).copy()
+    return GateStorage.from_columns(
+        records["code"], records["qubit_1"], records["qubit_2"],
+        records["angle"], records["flags"])
+
+
+def _records(storage):
+    """The gates of GateStorage as an array of GATE_DTYPE, the padding
+    bytes are zero"""
+    records = np.zeros(len(storage), dtype=GATE_DTYPE)
+    records["code"] = storage.codes
+    records["flags"] = storage.flags
+    records["qubit_1"] = storage.qubits_1
+    records["qubit_2"] = storage.qubits_2
+    records["angle"] = storage.angles
+    return records
+
+
+def _read_header(path):
+    """Reads and validates the header
+
+    :return: tuple (header dict, offset of the first gate)
+    """
+    with open(path, "rb") as file:
+        prefix = file.read(_PREFIX.size)
+        if len(prefix) < _PREFIX.size or prefix[:4] != MAGIC:
+            raise ValueError(f"'{path}' is not a binary circuit file")
+        _, offset = _PREFIX.unpack(prefix)
+        header = json.loads(file.read(offset - _PREFIX.size))
+    if header.get("version") != VERSION:
+        raise ValueError("Unsupported version of the binary circuit "
+                         f"file: {header.get('version')}")
+    if (os.path.getsize(path) - offset) % GATE_DTYPE.itemsize:
+        raise ValueError(f"'{path}' is truncated")
+    return header, offset
+
+
+def _map(path, offset):
+    """Copy-on-write memory map of the records of a file"""
+    if os.path.getsize(path) == offset:
+        # an empty file region can not be mapped
+        return np.zeros(0, dtype=GATE_DTYPE)
+    return np.memmap(path, dtype=GATE_DTYPE, mode="c", offset=offset)
@@ -0,0 +1,152 @@
+"""Per qubit and per edge calibration of the gate lengths and error rates
+
+A calibration file lists the calibrated gates, one entry per gate type
+and qubit (X, Y, Z) or per directed edge (CX). In JSON
+
+    {"gates": [{"gate": "X", "qubit": 0, "length": 12, "error": 1e-4},
+               {"gate": "CX", "qubit": 0, "target": 1, "length": 300,
+                "error": 0.01}]}
+
+and in CSV with the header gate,qubit,target,length,error, the target
+is empty for the one qubit gates. The lengths are integers in ns, the
+same as the lengths of HardwareConfiguration, the error rates may be
+left out. The gates missing in a file keep the lengths of the hardware
+and the error rate zero.
+"""
+import csv
+import hashlib
+import json
+import numbers
+
+import numpy as np
+
+from optimize_circuit.gates import CX, GATE_CODES
+
+CALIBRATION_FIELDS = ("gate", "qubit", "target", "length", "error")
+
+
+class Calibration:
+    """Read only tables of the calibrated gates of a device
+
+    :ivar lengths: int array (qubit_number, 3), the lengths of the X, Y
+            and Z gates of every qubit, 0 where not calibrated
+    :ivar errors: float array (qubit_number, 3), the error rates
+    :ivar cx_lengths: int array (qubit_number, qubit_number), the
+            lengths of the CX gates indexed by (control, target), 0
+            where not calibrated
+    :ivar cx_errors: float array (qubit_number, qubit_number)
+    :ivar fingerprint: str, SHA-256 hash of the tables
+    """
+
+    def __init__(self, qubit_number, entries=()):
+        """Builds the tables from calibration entries
+
+        :param qubit_number: int, the qubit number of the device
+        :param entries: iterable of (gate name, qubit, target, length,
+                error), the target is None for X, Y and Z gates and the
+                error is None when it is not known
+        """
+        if not isinstance(qubit_number, int) or qubit_number <= 0:
+            raise ValueError("The qubit number must be a positive integer")
+        self.lengths = np.zeros((qubit_number, CX.code), dtype=np.int64)
+        self.errors = np.zeros((qubit_number, CX.code))
+        self.cx_lengths = np.zeros((qubit_number, qubit_number),
+                                   dtype=np.int64)
+        self.cx_errors = np.zeros((qubit_number, qubit_number))
+        for entry in entries:
+            try:
+                self._add_entry(*entry)
+            except (TypeError, ValueError) as error:
+                raise ValueError(
+                    f"Bad calibration entry {entry}: {error}") from None
+
+        digest = hashlib.sha256()
+        digest = hashlib.sha256()
+        for table in (self.lengths, self.errors, self.cx_lengths,
+                      self.cx_errors):
+            table.flags.writeable = False
+            digest.update(table.tobytes())
+        self.fingerprint = digest.hexdigest()
+
+    @property
+    def qubit_number(self):
+        """The qubit number of the device"""
+        return len(self.lengths)
+
+    def _add_entry(self, gate, qubit, target, length, error):
+        """Validates a calibration entry and writes it into the tables"""
+        if gate not in GATE_CODES:
+            raise ValueError(f"'{gate}' is not a gate of the hardware")
+        _validate_qubits(gate, qubit, target, self.qubit_number)
+        if not isinstance(length, (int, np.integer)) or \
+                isinstance(length, bool) or length <= 0:
+            raise ValueError(f"The length of {gate} on {qubit} must be "
+                             f"a positive integer, it was given: {length}")
+        if error is not None and (
+                not isinstance(error, numbers.Real) or
+                isinstance(error, bool) or not 0 <= error <= 1):
+            raise ValueError(f"The error rate of {gate} on {qubit} "
+                             f"must be in [0, 1], it was given: {error}")
+        code = GATE_CODES[gate]
+        lengths, errors, position = \
+            (self.cx_lengths, self.cx_errors, (qubit, target)) \
+            if code == CX.code else \
+            (self.lengths, self.errors, (qubit, code))
+        lengths[position] = length
+        errors[position] = error or 0.0
+
+
+def load_calibration(path, qubit_number=None):
+    """Reads a calibration file, JSON or CSV by its extension
+
+    :param path: path of a .json or .csv file
+    :param qubit_number: int, the largest qubit index plus one if None
+    :return: Calibration
+    """
+    path = str(path)
+    try:
+        with open(path, newline="") as file:
+            if path.endswith(".json"):
+                entries = [tuple(entry.get(field) for field in
+                                 CALIBRATION_FIELDS)
+                           for entry in json.load(file)["gates"]]
+            elif path.endswith(".csv"):
+                entries = [_csv_entry(row) for row in csv.DictReader(file)]
+            else:
+                raise ValueError(f"'{path}' is not a .json or .csv file")
+        if qubit_number is None:
+            # the wrong qubits are reported by Calibration with their entry
+            qubit_number = 1 + max(
+                (index for _, qubit, target, _, _ in entries
+                 for index in (qubit, target)
+                 if isinstance(index, int) and not isinstance(index, bool)),
+                default=0)
+    except (KeyError, TypeError, AttributeError) as error:
+        raise ValueError(f"'{path}' is not a calibration file: "
+                         f"{error!r}") from None
+    return Calibration(qubit_number, entries)
+
+
+def _csv_entry(row):
+    """Converts a row of a CSV calibration file into an entry"""
+    try:
+        return (row["gate"].strip(), int(row["qubit"]),
+                int(row["target"]) if (row.get("target") or "").strip()
+                else None,
+                int(row["length"]),
+                float(row["error"]) if (row.get("error") or "").strip()
+                else None)
+    except (KeyError, TypeError, AttributeError, ValueError) as error:
+        raise ValueError(f"Bad calibration row {row}: {error}") from None
+
+
+def _validate_qubits(gate, qubit, target, qubit_number):
+    """Validates the qubits of a calibration entry"""
+    qubits = (qubit, target) if gate == "CX" else (qubit,)
+    for index in qubits:
+        if not isinstance(index, int) or not 0 <= index < qubit_number:
+            raise ValueError(f"'{index}' is not valid qubit index of {gate}")
+    if gate == "CX" and qubit == target:
+        raise ValueError("The control and the target of CX must differ")
+    if gate != "CX" and target is not None:
+        raise ValueError(f"The {gate} gate has no target qubit")
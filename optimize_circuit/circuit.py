@@ -1,6 +1,21 @@
-from optimize_circuit.gates import X, Y, Z, CX, Gate
-from optimize_circuit.optimize_gates import \
-    optimize_one_qubit_circuit, micro_optimize_one_qubit_circuit
+import numpy as np
+
+from optimize_circuit import binary_format, quaternion, scheduler
+from optimize_circuit.dag import CircuitDAG
+from optimize_circuit.gates import X, Y, Z, CX, Gate, circuit_matrices
+from optimize_circuit.gate_statistics import GateStatistics
+from optimize_circuit.gate_storage import GateStorage, GateListView, \
+    gate_to_row, row_to_string, NO_QUBIT, INTEGER_ANGLE
+from optimize_circuit.optimize_gates import fused_angles_to_gates, \
+    fused_run_angles, micro_optimize_one_qubit_circuit, optimize_wires
+from optimize_circuit.instrumentation import timed
+from optimize_circuit.parser import iter_gate_columns, parse_string, \
+    validate_columns, CHUNK_SIZE
+from optimize_circuit.product_tree import ProductTree
+from optimize_circuit.rewrite_rules import rewrite_storage
+from optimize_circuit.transformations import ZERO_TOLERANCE
+from optimize_circuit.two_qubit_synthesis import synthesize, \
+    storage_unitary
 from optimize_circuit.hardware_configuration import \
     HardwareConfiguration
 
@@ -13,98 +28,446 @@ class QuantumCircuit:
     are parameters, and one two qubit gate: CNOT.
     """
 
-    def __init__(self, hardware: HardwareConfiguration):
+    def __init__(self, hardware: HardwareConfiguration,
+                 decomposition_cache=None):
         """Initializes a quantum circuit. If qubit_number > 2 raises
         not implemented error.
 
         :param hardware: QuantumHardware
+        :param decomposition_cache: optional DecompositionCache shared
+                by the optimizations of the circuit
         """
 
         self.hardware = hardware
-        self.gates = []
+        self.decomposition_cache = decomposition_cache
+        self._storage = GateStorage()
+        self._tree = None
+        self._statistics = None
+
+    @property
+    def gates(self):
+        """The gates of the circuit as a lazy read only list of Gates"""
+        return GateListView(self._storage)
+
+    @gates.setter
+    def gates(self, gate_list):
+        """Replaces the gates of the circuit (no basis translation)"""
+        self.storage = GateStorage.from_gates(gate_list)
+
+    @property
+    def storage(self):
+        """The columnar GateStorage holding the gates of the circuit"""
+        return self._storage
+
+    @storage.setter
+    def storage(self, storage):
+        """Replaces the gates of the circuit by GateStorage (no basis
+        translation)"""
+        self._storage = storage
+        self._tree = None
+        self._statistics = None
 
+    @timed("translation", count=lambda *_: 1)
     def add(self, gate: Gate):
         """Adds a gate represented by an instance of Gate class
         :param gate: Gate object
         """
-        if isinstance(gate, X) and "X" not in self.hardware.basis_gates:
-            self.add(Z(gate.qubit_index, 90))
-            self.add(Y(gate.qubit_index, gate.theta))
-            self.add(Z(gate.qubit_index, -90))
-        elif isinstance(gate, Y) and "Y" not in self.hardware.basis_gates:
-            self.add(Z(gate.qubit_index, -90))
-            self.add(X(gate.qubit_index, gate.theta))
-            self.add(Z(gate.qubit_index, 90))
+        size = len(self._storage)
+        for row in self._translated_rows(gate):
+            self._storage.append(*row)
+        self._count(size, len(self._storage))
+        self._inserted(size, len(self._storage) - size)
+
+    def insert(self, position, gate: Gate):
+        """Inserts a gate (translated into the hardware basis) before
+        the given position
+
+        :param position: int, index of the gate in the circuit
+        :param gate: Gate object
+        """
+        position = self._position(position, len(self._storage) + 1)
+        rows = self._translated_rows(gate)
+        self._storage.insert(position, rows)
+        self._count(position, position + len(rows))
+        self._inserted(position, len(rows))
+
+    def delete(self, position):
+        """Deletes the gate at the given position
+
+        :param position: int, index of the gate in the circuit
+        """
+        position = self._position(position, len(self._storage))
+        self._count(position, position + 1, -1)
+        self._storage.delete(position)
+        if self._tree is not None:
+            self._tree.delete(position)
+
+    def replace(self, position, gate: Gate):
+        """Replaces the gate at the given position by a gate
+        (translated into the hardware basis)
+
+        :param position: int, index of the gate in the circuit
+        :param gate: Gate object
+        """
+        position = self._position(position, len(self._storage))
+        rows = self._translated_rows(gate)
+        self._count(position, position + 1, -1)
+        if len(rows) == 1:
+            self._storage.set(position, rows[0])
+            if self._tree is not None:
+                self._tree.mark(position, position + 1)
         else:
-            self.gates.append(gate)
+            self._storage.delete(position)
+            self._storage.insert(position, rows)
+            if self._tree is not None:
+                self._tree.delete(position)
+            self._inserted(position, len(rows))
+        self._count(position, position + len(rows))
+
+    def unitary(self):
+        """The unitary of the circuit, G_n ... G_1 for the gates
+        G_1, ..., G_n in the time order. It is maintained incrementally
+        from the first call on, so only the gates changed since the last
+        call are refolded.
+
+        :return: array of shape (2 ** qubit_number, 2 ** qubit_number)
+        """
+        root = self._product()
+        if self.hardware.qubit_number == 1:
+            return quaternion.to_unitaries(root)
+        return root.copy()
+
+    @timed("translation", count=lambda _, self, codes, *args: len(codes))
+    def add_columns(self, codes, qubits_1, qubits_2, angles, flags):
+        """Adds many gates given in the columnar form of GateStorage,
+        X and Y gates are translated into the basis of the hardware in
+        vectorized form, the same way as in add
+
+        :param codes: array of gate codes
+        :param qubits_1: array of the first (or only) qubit indexes
+        :param qubits_2: array of the second qubit indexes
+        :param angles: array of the angles in degrees
+        :param flags: array of the flags of the gates
+        """
+        codes = np.asarray(codes, dtype=np.int8)
+        columns = [np.asarray(qubits_1), np.asarray(qubits_2),
+                   np.asarray(angles, dtype=np.float64), np.asarray(flags)]
+
+        translate = np.zeros(len(codes), dtype=bool)
+        if "X" not in self.hardware.basis_gates:
+            translate |= codes == X.code
+        if "Y" not in self.hardware.basis_gates:
+            translate |= codes == Y.code
+        if not translate.any():
+            size = len(self._storage)
+            self._storage.extend(codes, *columns)
+            self._count(size, len(self._storage))
+            self._inserted(size, len(self._storage) - size)
+            return
+
+        # every translated gate G(theta) becomes Z(+-90), G'(theta), Z(-+90)
+        repeats = np.where(translate, 3, 1)
+        first = (np.cumsum(repeats) - repeats)[translate]
+        sign = np.where(codes[translate] == X.code, 1, -1)
+        swapped = np.where(codes[translate] == X.code, Y.code, X.code)
+
+        codes = np.repeat(codes, repeats)
+        qubits_1, qubits_2, angles, flags = [
+            np.repeat(column, repeats) for column in columns]
+        codes[first] = codes[first + 2] = Z.code
+        codes[first + 1] = swapped
+        angles[first], angles[first + 2] = 90 * sign, -90 * sign
+        flags[first] = flags[first + 2] = INTEGER_ANGLE
+        size = len(self._storage)
+        self._storage.extend(codes, qubits_1, qubits_2, angles, flags)
+        self._count(size, len(self._storage))
+        self._inserted(size, len(self._storage) - size)
 
     def add_from_string(self, gates_in_string):
         """Adds gates from the string
 
         :param gates_in_string: str, e.g. "X(1, 90), Z(1, 180), CX(0,1)"
+                or an OpenQASM 2 program
         """
+        self._add_parsed_columns(*parse_string(gates_in_string))
 
-        gate_string_list = gates_in_string.split("), ")
-        gate_string_list[-1] = gate_string_list[-1].replace(")", "")
+    def add_from_file(self, source, fmt=None, chunk_size=CHUNK_SIZE):
+        """Adds gates streamed from a file in the text notation or in
+        OpenQASM 2, see optimize_circuit.parser
 
-        for gate_str in gate_string_list:
-            if gate_str[0:2] == "CX":
-                index_1 = int(gate_str[3])
-                index_2 = int(gate_str[-1])
-                self.hardware.validate_qubit_index(index_1)
-                self.hardware.validate_qubit_index(index_2)
-                self.add(CX(index_1, index_2))
-            else:
-                index = int(gate_str[2])
-                self.hardware.validate_qubit_index(index)
-                theta = float(gate_str.split()[-1])
-                if gate_str[0] == "X":
-                    self.add(X(index, theta))
-                elif gate_str[0] == "Y":
-                    self.add(Y(index, theta))
-                elif gate_str[0] == "Z":
-                    self.add(Z(index, theta))
-                else:
-                    raise ValueError(
-                        "The given string must be in the "
-                        "following form '{Gate}({qubit}, {Angle}), "
-                        "CX({qubitA}, {qubitB}), ...' "
-                        "with exact spacing. The given string = "
-                        f"{gates_in_string}")
+        :param source: path of a file, file object or iterable of lines
+        :param fmt: "text", "qasm" or None to detect it
+        :param chunk_size: int, size of the read chunks in bytes
+        """
+        for columns in iter_gate_columns(source, fmt, chunk_size):
+            self._add_parsed_columns(*columns)
+
+    @classmethod
+    def from_file(cls, source, hardware: HardwareConfiguration, fmt=None,
+                  chunk_size=CHUNK_SIZE):
+        """Creates a circuit from a file, see add_from_file
+
+        :return: QuantumCircuit
+        """
+        circuit = cls(hardware)
+        circuit.add_from_file(source, fmt, chunk_size)
+        return circuit
+
+    def save(self, path):
+        """Writes the circuit and its hardware into a binary file, see
+        optimize_circuit.binary_format
+
+        :param path: path of the file, overwritten if it exists
+        """
+        binary_format.save(path, self._storage, self.hardware)
+
+    def append_to(self, path):
+        """Appends the gates of the circuit to a binary file
 
+        :param path: path of a file written by save
+        """
+        binary_format.append(path, self._storage)
+
+    @classmethod
+    def load(cls, path, hardware: HardwareConfiguration = None,
+             decomposition_cache=None, start=0, stop=None):
+        """Opens a circuit (or a slice of it) saved in a binary file, the
+        gates are memory-mapped and read only when they are accessed
+
+        :param path: path of a file written by save
+        :param hardware: HardwareConfiguration with the qubit number and
+                the basis gates stored in the file, None creates the
+                hardware stored in the file
+        :param decomposition_cache: optional DecompositionCache
+        :param start: int, index of the first loaded gate
+        :param stop: int, index after the last loaded gate
+        :return: QuantumCircuit
+        """
+        storage, header = binary_format.load(path, start, stop)
+        if hardware is None:
+            hardware = binary_format.header_hardware(header)
+        elif hardware.qubit_number != header["qubit_number"]:
+            raise ValueError(
+                f"The circuit is saved for {header['qubit_number']} "
+                f"qubits, the hardware has {hardware.qubit_number}")
+        elif set(hardware.basis_gates) != set(header["basis_gates"]):
+            raise ValueError(
+                f"The circuit is saved for the basis gates "
+                f"{sorted(header['basis_gates'])}, the hardware has "
+                f"{sorted(hardware.basis_gates)}")
+        circuit = cls(hardware, decomposition_cache)
+        circuit.storage = storage
+        return circuit
+
+    def _add_parsed_columns(self, codes, qubits_1, qubits_2, angles):
+        """Validates the qubit indexes of parsed gates and adds them"""
+        validate_columns(codes, qubits_1, qubits_2,
+                         self.hardware.qubit_number)
+        self.add_columns(codes, qubits_1, qubits_2, angles,
+                         np.zeros(len(codes), dtype=np.uint8))
+
+    @timed("optimize")
     def optimize(self):
-        """Optimizes the circuit"""
-        if self.hardware.qubit_number == 1 and len(self.gates) > 3:
-            self.gates = optimize_one_qubit_circuit(self.gates, self.hardware)
+        """Optimizes the circuit, the circuits on many qubits are
+        optimized wire by wire between the CX gates"""
+        storage = self._storage
+        if self.hardware.qubit_number == 1 and len(storage) > 3:
+            if self._tree is not None:
+                theta, phi, lam = quaternion.to_angles(
+                    self._product()[np.newaxis])
+                tolerance = ZERO_TOLERANCE
+            else:
+                theta, phi, lam, tolerance = fused_run_angles(
+                    storage.codes, storage.angles, [0], [len(storage)],
+                    self.hardware)
+            self.gates = fused_angles_to_gates(
+                theta, phi, lam, [int(storage.qubits_1[0])], self.hardware,
+                self.decomposition_cache, tolerance)[0]
+        elif self.hardware.qubit_number == 1:
+            # no rule applies to fused gates, choose_euler_bases already
+            # shortens them, so only short circuits are micro optimized
+            self.gates = micro_optimize_one_qubit_circuit(list(self.gates))
+
+        if self.hardware.qubit_number > 1:
+            # rotations commuting through CX are merged before and after
+            # the runs between CX gates are fused
+            dag = self.to_dag()
+            dag.cancel_commuting()
+            optimized = optimize_wires(dag.to_storage(), self.hardware,
+                                       self.decomposition_cache)
+            dag = CircuitDAG.from_storage(optimized)
+            dag.cancel_commuting()
+            self.storage = dag.to_storage()
+
+        if self.hardware.qubit_number == 2 and self.get_cx_number() > 0:
+            # the whole circuit is one two qubit block, its synthesis
+            # with the minimal CX count is kept when it runs shorter
+            synthesized = synthesize([storage_unitary(self._storage)],
+                                     self.hardware)[0]
+            if scheduler.duration(synthesized, self.hardware) < \
+                    scheduler.duration(self._storage, self.hardware):
+                self.storage = synthesized
+
+    def rewrite(self):
+        """Rewrites the one qubit gates of every wire between the CX
+        gates with the identities of optimize_circuit.rewrite_rules,
+        without fusing them"""
+        self.storage = rewrite_storage(self._storage)
+
+    def schedule(self, mode=scheduler.ASAP):
+        """Assigns the start times to the gates, the gates on different
+        qubits run in parallel, see optimize_circuit.scheduler
+
+        :param mode: "asap" or "alap"
+        :return: Schedule
+        """
+        return scheduler.schedule(self._storage, self.hardware, mode)
+
+    def to_dag(self):
+        """:returns CircuitDAG of the gates of the circuit"""
+        return CircuitDAG.from_storage(self._storage)
+
+    @classmethod
+    def from_dag(cls, dag, hardware: HardwareConfiguration,
+                 decomposition_cache=None):
+        """Lowers a CircuitDAG into a circuit (no basis translation)
+
+        :param dag: CircuitDAG
+        :param hardware: HardwareConfiguration
+        :param decomposition_cache: optional DecompositionCache
+        :return: QuantumCircuit
+        """
+        circuit = cls(hardware, decomposition_cache)
+        circuit.storage = dag.to_storage()
+        return circuit
 
-        if self.hardware.qubit_number == 1 and len(self.gates) <= 3:
-            self.gates = micro_optimize_one_qubit_circuit(self.gates)
+    def _translated_rows(self, gate):
+        """Translates a gate into the basis of the hardware
+
+        :param gate: Gate object
+        :return: list of rows of GateStorage columns
+        """
+        return translated_rows(gate, self.hardware.basis_gates)
+
+    def _position(self, position, upper):
+        """Validates a (possibly negative) position of a gate"""
+        if position < 0:
+            position += len(self._storage)
+        if not 0 <= position < upper:
+            raise IndexError(f"'{position}' is not valid gate position")
+        return position
+
+    @timed("fusion", count=lambda _, self: len(self))
+    def _product(self):
+        """The root of the ProductTree of the circuit, the tree is
+        created on the first call, so circuits which are only read and
+        optimized never allocate it"""
+        if self._tree is None:
+            if self.hardware.qubit_number == 1:
+                self._tree = ProductTree(quaternion.IDENTITY,
+                                         quaternion.multiply)
+            elif self.hardware.qubit_number == 2:
+                self._tree = ProductTree(np.identity(4, dtype=complex),
+                                         np.matmul)
+            else:
+                raise NotImplementedError(
+                    "The unitary is available for one and two qubit "
+                    "circuits")
+            self._tree.insert(0, len(self._storage))
+        return self._tree.product(self._leaf_values)
+
+    def _inserted(self, position, count):
+        """Gives the gates inserted at position their (changed) leaves
+        in the ProductTree, the leaves of the other gates are kept"""
+        if self._tree is not None:
+            self._tree.insert(position, count)
+
+    def _leaf_values(self, positions):
+        """The elements of ProductTree for the gates at positions"""
+        storage = self._storage
+        if self.hardware.qubit_number == 1:
+            return quaternion.rotation_quaternions(
+                storage.codes[positions], storage.angles[positions])
+        return circuit_matrices(
+            storage.codes[positions], storage.qubits_1[positions],
+            storage.qubits_2[positions], storage.angles[positions],
+            self.hardware.qubit_number)
+
+    def stats(self):
+        """The gate counts per type and per qubit, the gate durations and
+        the angle histograms, see GateStatistics.summary. The counts are
+        kept up to date by the edits of the circuit, after its gates are
+        replaced (e.g. by optimize) they are counted once on demand.
+
+        :return: dict
+        """
+        return self._gate_statistics().summary(self.hardware)
+
+    def _gate_statistics(self):
+        """GateStatistics of the circuit, counted on the first call"""
+        if self._statistics is None:
+            self._statistics = GateStatistics.from_storage(
+                self._storage, self.hardware.qubit_number)
+        return self._statistics
+
+    def _count(self, start, stop, sign=1):
+        """Counts the gates at the positions start...stop - 1, sign -1
+        uncounts them"""
+        if self._statistics is not None:
+            storage = self._storage
+            self._statistics.add(
+                storage.codes[start:stop], storage.qubits_1[start:stop],
+                storage.qubits_2[start:stop], storage.angles[start:stop],
+                sign)
 
     def get_cx_number(self):
-        """Calculates the number of CX gates on the fly"""
-        return sum([1 for gate in self.gates if isinstance(gate, CX)] + [0])
+        """The number of CX gates"""
+        return int(self._gate_statistics().totals[CX.code])
 
     def get_x_number(self):
-        """Calculates the number of X gates on the fly"""
-        return sum([1 for gate in self.gates if isinstance(gate, X)] + [0])
+        """The number of X gates"""
+        return int(self._gate_statistics().totals[X.code])
 
     def get_y_number(self):
-        """Calculates the number of Y gates on the fly"""
-        return sum([1 for gate in self.gates if isinstance(gate, Y)] + [0])
+        """The number of Y gates"""
+        return int(self._gate_statistics().totals[Y.code])
 
     def get_z_number(self):
-        """Calculates the number of Z gates on the fly"""
-        return sum([1 for gate in self.gates if isinstance(gate, Z)] + [0])
+        """The number of Z gates"""
+        return int(self._gate_statistics().totals[Z.code])
 
     def __str__(self):
         """Uses string representation of the circuit:
             e.g. 'X(1, 90), Z(1, 180), CX(0,1)'
         """
-        if len(self.gates) == 0:
+        storage = self._storage
+        if len(storage) == 0:
             return "[]"
         else:
-            return ", ".join([gate.to_sting_notation() for gate in self.gates])
+            return ", ".join(map(
+                row_to_string, storage.codes.tolist(),
+                storage.qubits_1.tolist(), storage.qubits_2.tolist(),
+                storage.angles.tolist(), storage.flags.tolist()))
 
     def __len__(self):
         """Return number of gates in the circuit."""
-        return len(self.gates)
+        return len(self._storage)
+
+
+def translated_rows(gate, basis_gates):
+    """Translates a gate into the basis gates
+
+    :param gate: Gate object
+    :param basis_gates: set of the names of the basis gates
+    :return: list of rows of GateStorage columns
+    """
+    code, qubit_1, qubit_2, angle, flags = gate_to_row(gate)
+    if code == X.code and "X" not in basis_gates:
+        return [(Z.code, qubit_1, NO_QUBIT, 90, INTEGER_ANGLE),
+                (Y.code, qubit_1, NO_QUBIT, angle, flags),
+                (Z.code, qubit_1, NO_QUBIT, -90, INTEGER_ANGLE)]
+    if code == Y.code and "Y" not in basis_gates:
+        return [(Z.code, qubit_1, NO_QUBIT, -90, INTEGER_ANGLE),
+                (X.code, qubit_1, NO_QUBIT, angle, flags),
+                (Z.code, qubit_1, NO_QUBIT, 90, INTEGER_ANGLE)]
+    return [(code, qubit_1, qubit_2, angle, flags)]
@@ -0,0 +1,293 @@
+"""Command line interface: python -m optimize_circuit
+
+Reads one circuit per line (the notation of QuantumCircuit.__str__),
+optimizes the circuits on a pool of processes and writes the optimized
+circuits line by line in the input order. Blank lines are kept.
+"""
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from itertools import islice
+
+from optimize_circuit.calibration import load_calibration
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.decomposition_cache import DecompositionCache
+from optimize_circuit.optimize_gates import optimize_batch
+from optimize_circuit.result_cache import ResultCache, optimize_cached, \
+    DEFAULT_MAX_BYTES
+from optimize_circuit.hardware_configuration import \
+    HardwareConfiguration, DEFAULT_BASIS_GATES, SINGLE, DOUBLE
+
+# errors of a single circuit, reported with the number of its line
+_LINE_ERRORS = (ValueError, NotImplementedError, ArithmeticError, TypeError)
+
+# per process state, set by _init_worker
+_hardware = None
+_cache = None
+_results = None
+
+
+def main(argv=None):
+    """Runs the command line interface
+
+    :param argv: list of the arguments, sys.argv[1:] if None
+    :return: int, the exit status
+    """
+    arguments = _argument_parser().parse_args(argv)
+    try:
+        hardware_settings = settings_from_arguments(arguments)
+    except (TypeError, ValueError, OSError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 2
+
+    with ExitStack() as files:
+        try:
+            source = sys.stdin if arguments.input == "-" \
+                else files.enter_context(open(arguments.input))
+            target = sys.stdout if arguments.output == "-" \
+                else files.enter_context(open(arguments.output, "w"))
+        except OSError as error:
+            print(f"error: {error}", file=sys.stderr)
+            return 2
+        try:
+            statistics = optimize_lines(
+                source, target, hardware_settings, arguments.workers,
+                arguments.chunk_size, arguments.result_cache,
+                arguments.result_cache_size * 2 ** 20)
+        except ValueError as error:
+            print(f"error: {error}", file=sys.stderr)
+            return 1
+
+    if not arguments.quiet:
+        _report(statistics, sys.stderr)
+    return 0
+
+
+def optimize_lines(lines, output, hardware_settings, workers=None,
+                   chunk_size=64, result_cache=None,
+                   max_bytes=DEFAULT_MAX_BYTES):
+    """Optimizes the circuits given one per line and writes them to
+    output in the same order as soon as they are ready. At most
+    2 * workers chunks are in flight, so the memory does not depend on
+    the number of the circuits.
+
+    :param lines: iterable of str, one circuit per line
+    :param output: text file object
+    :param hardware_settings: dict, see settings_from_arguments
+    :param workers: int, number of the processes, 1 optimizes in the
+            current process, None uses all the CPUs
+    :param chunk_size: int, number of the circuits sent to a worker at once
+    :param result_cache: path of a ResultCache database shared by the
+            workers, None optimizes every circuit
+    :param max_bytes: int, the maximal size of the result cache
+    :return: dict with the circuit number, the elapsed seconds,
+            {pid: (circuits, seconds)} of the workers and the number of
+            the circuits taken from the result cache or from an equal
+            circuit of the same chunk
+    """
+    if chunk_size <= 0:
+        raise ValueError("The chunk size must be positive")
+    workers = workers or os.cpu_count() or 1
+    chunks = _numbered_chunks(lines, chunk_size)
+    start = time.perf_counter()
+    per_worker = {}
+    reused = 0
+
+    def write(result):
+        nonlocal reused
+        pid, seconds, optimized, chunk_reused = result
+        reused += chunk_reused
+        circuits, busy = per_worker.get(pid, (0, 0.0))
+        per_worker[pid] = (circuits + len(optimized), busy + seconds)
+        output.writelines(line + "\n" for line in optimized)
+        output.flush()
+
+    initargs = (hardware_settings, result_cache, max_bytes)
+    if workers == 1:
+        _init_worker(*initargs)
+        for chunk in chunks:
+            write(_optimize_chunk(chunk))
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker,
+                                 initargs=initargs) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(_optimize_chunk, chunk))
+                if len(pending) >= 2 * workers:
+                    write(pending.popleft().result())
+            while pending:
+                write(pending.popleft().result())
+
+    return {"circuits": sum(c for c, _ in per_worker.values()),
+            "seconds": time.perf_counter() - start,
+            "workers": per_worker,
+            "reused": reused if result_cache is not None else None}
+
+
+def _init_worker(hardware_settings, result_cache=None,
+                 max_bytes=DEFAULT_MAX_BYTES):
+    """Creates the hardware, the decomposition cache and the result
+    cache of a process"""
+    global _hardware, _cache, _results
+    _hardware = make_hardware(hardware_settings)
+    _cache = DecompositionCache()
+    if _results is not None:
+        _results.close()
+    _results = ResultCache(result_cache, max_bytes) \
+        if result_cache is not None else None
+
+
+def _optimize_chunk(chunk):
+    """Optimizes a chunk of numbered lines in a worker
+
+    :param chunk: list of (line number, line) pairs
+    :return: tuple (pid, seconds, list of the optimized circuits,
+            number of the reused results)
+    """
+    start = time.perf_counter()
+    circuits = []
+    for number, line in chunk:
+        circuit = QuantumCircuit(_hardware, decomposition_cache=_cache)
+        try:
+            circuit.add_from_string(line)
+            if _hardware.qubit_number != 1 and _results is None:
+                circuit.optimize()
+        except _LINE_ERRORS as error:
+            raise ValueError(f"line {number}: {error}") from None
+        circuits.append(circuit)
+
+    reused = 0
+    try:
+        if _results is not None:
+            before = _results.hits + _results.duplicates
+            optimize_cached(circuits, _hardware, _results, _cache)
+            reused = _results.hits + _results.duplicates - before
+        elif _hardware.qubit_number == 1:
+            # one qubit circuits of a chunk are fused at once
+            for circuit, gate_list in zip(
+                    circuits, optimize_batch(circuits, _hardware, _cache)):
+                circuit.gates = gate_list
+    except _LINE_ERRORS as error:
+        raise _chunk_error(chunk, error) from None
+    optimized = [str(circuit) if len(circuit) or line.strip() else ""
+                 for circuit, (_, line) in zip(circuits, chunk)]
+    return os.getpid(), time.perf_counter() - start, optimized, reused
+
+
+def _chunk_error(chunk, error):
+    """ValueError of a chunk optimized at once, naming the first line
+    whose circuit fails to be optimized alone"""
+    for number, line in chunk:
+        circuit = QuantumCircuit(_hardware, decomposition_cache=_cache)
+        try:
+            circuit.add_from_string(line)
+            circuit.optimize()
+        except _LINE_ERRORS as line_error:
+            return ValueError(f"line {number}: {line_error}")
+    return ValueError(f"lines {chunk[0][0]}-{chunk[-1][0]}: {error}")
+
+
+def _numbered_chunks(lines, chunk_size):
+    """Generator of lists of (line number, line) of the given size"""
+    numbered = enumerate((line.rstrip("\n") for line in lines), start=1)
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def settings_from_arguments(arguments):
+    """Picklable settings of the hardware, validated by creating it"""
+    settings = {
+        "qubit_number": arguments.qubits,
+        "basis_gates": frozenset(
+            gate.strip() for gate in arguments.basis_gates.split(",")),
+        "length_x": arguments.length_x,
+        "length_y": arguments.length_y,
+        "length_z": arguments.length_z,
+        "length_cx": arguments.length_cx,
+        "precision": arguments.precision,
+        "calibration": arguments.calibration,
+    }
+    make_hardware(settings)
+    return settings
+
+
+def make_hardware(settings):
+    """Creates HardwareConfiguration from the settings"""
+    hardware = HardwareConfiguration(settings["qubit_number"],
+                                     settings["basis_gates"])
+    for name in ("length_x", "length_y", "length_z", "length_cx"):
+        if settings[name] is not None:
+            setattr(hardware, name, settings[name])
+    hardware.precision = settings.get("precision", DOUBLE)
+    if settings.get("calibration") is not None:
+        hardware.calibration = load_calibration(
+            settings["calibration"], hardware.qubit_number)
+    return hardware
+
+
+def _report(statistics, stream):
+    """Writes the throughput and the per worker timing"""
+    circuits, seconds = statistics["circuits"], statistics["seconds"]
+    rate = circuits / seconds if seconds else 0.0
+    print(f"{circuits} circuits in {seconds:.3f} s "
+          f"({rate:.1f} circuits/s)", file=stream)
+    if statistics["reused"] is not None:
+        print(f"result cache: {statistics['reused']} of {circuits} "
+              "circuits reused", file=stream)
+    for pid, (count, busy) in sorted(statistics["workers"].items()):
+        print(f"worker {pid}: {count} circuits, {busy:.3f} s busy",
+              file=stream)
+
+
+def add_hardware_arguments(parser):
+    """Adds the options of the hardware to an argument parser, see
+    settings_from_arguments"""
+    parser.add_argument("-q", "--qubits", type=int, default=1,
+                        help="number of the qubits of the hardware")
+    parser.add_argument("-b", "--basis-gates",
+                        default=",".join(sorted(DEFAULT_BASIS_GATES)),
+                        help="comma separated basis gates, e.g. X,Z,CX")
+    for gate in ("x", "y", "z", "cx"):
+        parser.add_argument(f"--length-{gate}", type=int,
+                            help=f"length of the {gate.upper()} gate in ns")
+    parser.add_argument("--calibration", default=None,
+                        help="JSON or CSV file with the gate lengths and "
+                             "error rates per qubit and per edge")
+    parser.add_argument("--precision", choices=(SINGLE, DOUBLE),
+                        default=DOUBLE,
+                        help="float precision of the fusion of one qubit "
+                             "gates, single falls back to double for "
+                             "the circuits with too large rounding errors")
+
+
+def _argument_parser():
+    """The parser of the command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="python -m optimize_circuit",
+        description="Optimizes circuits given one per line, "
+                    "e.g. 'X(0, 90), Y(0, 45), Z(0, 30)'.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="file with one circuit per line, "
+                             "'-' for stdin (default)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="output file, '-' for stdout (default)")
+    add_hardware_arguments(parser)
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of the processes (default: CPUs)")
+    parser.add_argument("-c", "--chunk-size", type=int, default=64,
+                        help="circuits sent to a process at once")
+    parser.add_argument("--result-cache", default=None,
+                        help="SQLite file of the optimized circuits kept "
+                             "across runs")
+    parser.add_argument("--result-cache-size", type=int, default=256,
+                        help="the maximal size of the result cache in MiB")
+    parser.add_argument("--quiet", action="store_true",
+                        help="do not report the timing to stderr")
+    return parser
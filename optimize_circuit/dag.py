@@ -0,0 +1,192 @@
+"""Directed acyclic graph of a circuit with commutation-aware cancellation
+
+Every gate is a node, the edges go along the wires: the successor of a
+gate on a wire is the next gate acting on that wire. The commutation
+rules are indexed per gate code in COMMUTES_THROUGH: Z rotations commute
+with the control of CX, X rotations with its target.
+
+On a wire the gates and CX ports with the same commutation class form
+blocks, e.g. Z(0, a), control of CX(0, 1), Z(0, b), in which everything
+commutes. The rotations of a block are merged into one and the CX gates
+with the same control and target blocks cancel in pairs, which may in
+turn join blocks, so the passes are repeated until nothing changes.
+"""
+import numpy as np
+
+from optimize_circuit.gates import X, Y, Z, CX
+from optimize_circuit.gate_storage import GateStorage, INTEGER_ANGLE
+
+# commutation classes of the gates on a wire
+NONE, CONTROL, TARGET = 0, 1, 2
+# gate code -> the port of CX the one qubit gate commutes through
+COMMUTES_THROUGH = {X.code: TARGET, Y.code: NONE, Z.code: CONTROL}
+_CLASSES = np.array([COMMUTES_THROUGH.get(code, NONE)
+                     for code in range(max(X.code, Y.code, Z.code, CX.code)
+                                       + 1)])
+
+
+class CircuitDAG:
+    """A circuit as a DAG of the gates connected along the wires"""
+
+    def __init__(self, codes, qubits_1, qubits_2, angles, flags):
+        """Creates the DAG of the gates given in the columnar form of
+        GateStorage in the time order
+
+        :param codes: array of gate codes
+        :param qubits_1: array of the first (or only) qubit indexes
+        :param qubits_2: array of the second qubit indexes
+        :param angles: array of the angles in degrees
+        :param flags: array of the flags of the gates
+        """
+        self._codes = np.array(codes, dtype=np.int8)
+        self._qubits_1 = np.array(qubits_1, dtype=np.int64)
+        self._qubits_2 = np.array(qubits_2, dtype=np.int64)
+        self._angles = np.array(angles, dtype=np.float64)
+        self._flags = np.array(flags, dtype=np.uint8)
+
+    @classmethod
+    def from_storage(cls, storage):
+        """:returns CircuitDAG of the gates of GateStorage"""
+        return cls(storage.codes, storage.qubits_1, storage.qubits_2,
+                   storage.angles, storage.flags)
+
+    def to_storage(self):
+        """Lowers the DAG into GateStorage, the gates keep the order of
+        the circuit the DAG was built from
+
+        :return: GateStorage
+        """
+        storage = GateStorage(max(len(self._codes), 16))
+        storage.extend(self._codes, self._qubits_1, self._qubits_2,
+                       self._angles, self._flags)
+        return storage
+
+    def wire(self, qubit):
+        """Nodes acting on the qubit in the time order
+
+        :param qubit: int, index of the qubit
+        :return: array of node indexes
+        """
+        on_wire = (self._qubits_1 == qubit) | \
+            ((self._codes == CX.code) & (self._qubits_2 == qubit))
+        return np.flatnonzero(on_wire)
+
+    def successors(self, node):
+        """:returns list of the nodes following the node on its wires"""
+        return self._neighbours(node, 1)
+
+    def predecessors(self, node):
+        """:returns list of the nodes preceding the node on its wires"""
+        return self._neighbours(node, -1)
+
+    def cancel_commuting(self):
+        """Merges the rotations commuting with each other and cancels
+        the commuting CX pairs until nothing changes, the remaining
+        nodes are renumbered in the time order
+
+        :return: int, the number of the removed gates
+        """
+        removed = 0
+        while True:
+            kill, emptied = self._cancel_pass()
+            self._codes, self._qubits_1, self._qubits_2, self._angles, \
+                self._flags = (column[~kill] for column in (
+                    self._codes, self._qubits_1, self._qubits_2,
+                    self._angles, self._flags))
+            removed += int(np.count_nonzero(kill))
+            # only an emptied block lets its neighbours join, otherwise
+            # every block is left with at most one rotation and one CX
+            # of every CX group
+            if not emptied:
+                return removed
+
+    def _cancel_pass(self):
+        """One linear pass of merging and cancellation over all wires
+
+        :return: boolean mask of the nodes to remove and True if some
+                block of a wire is removed completely
+        """
+        is_cx = self._codes == CX.code
+        control_blocks = np.full(len(self._codes), -1)
+        target_blocks = np.full(len(self._codes), -1)
+        kill = np.zeros(len(self._codes), dtype=bool)
+        wires = []
+        offset = 0
+        for qubit in np.unique(np.concatenate(
+                [self._qubits_1, self._qubits_2[is_cx]])).tolist():
+            nodes = self.wire(qubit)
+            classes = np.where(
+                is_cx[nodes],
+                np.where(self._qubits_1[nodes] == qubit, CONTROL, TARGET),
+                _CLASSES[self._codes[nodes]])
+            starts = np.ones(len(nodes), dtype=bool)
+            starts[1:] = (classes[1:] != classes[:-1]) | (classes[1:] == NONE)
+            blocks = np.cumsum(starts) + offset
+            offset = blocks[-1] + 1
+            wires.append((nodes, np.flatnonzero(starts)))
+
+            cx = is_cx[nodes]
+            controls = cx & (classes == CONTROL)
+            control_blocks[nodes[controls]] = blocks[controls]
+            target_blocks[nodes[cx & ~controls]] = blocks[cx & ~controls]
+            rotations = ~cx & (classes != NONE)
+            kill |= self._merge(nodes[rotations], blocks[rotations])
+
+        cx_nodes = np.flatnonzero(is_cx)
+        if len(cx_nodes):
+            _, group, counts = np.unique(
+                control_blocks[cx_nodes] * (offset + 1) +
+                target_blocks[cx_nodes],
+                return_inverse=True, return_counts=True)
+            order = np.argsort(group, kind="stable")
+            rank = np.empty(len(order), dtype=int)
+            rank[order] = np.arange(len(order)) - \
+                (np.cumsum(counts) - counts)[group[order]]
+            # an odd group keeps its first CX
+            kill[cx_nodes[rank >= counts[group] % 2]] = True
+
+        emptied = any(
+            (np.add.reduceat((~kill[nodes]).astype(int), starts) == 0).any()
+            for nodes, starts in wires)
+        return kill, emptied
+
+    def _merge(self, nodes, blocks):
+        """Merges the rotations of every block into its first rotation
+
+        :return: boolean mask of the nodes to remove
+        """
+        kill = np.zeros(len(self._codes), dtype=bool)
+        if len(nodes) == 0:
+            return kill
+        # the blocks of a wire are numbered in increasing order
+        first = np.flatnonzero(np.diff(blocks, prepend=-1))
+        counts = np.diff(np.append(first, len(nodes)))
+        angles = np.add.reduceat(self._angles[nodes], first)
+        floats = np.add.reduceat(
+            ((self._flags[nodes] & INTEGER_ANGLE) == 0).astype(int), first)
+
+        merged = counts > 1
+        kill[nodes] = True
+        kill[nodes[first]] = False
+        self._angles[nodes[first[merged]]] = angles[merged]
+        self._flags[nodes[first[merged]]] = np.where(
+            floats[merged] > 0, 0, INTEGER_ANGLE)
+        kill[nodes[first]] |= self._angles[nodes[first]] % 360 == 0
+        return kill
+
+    def _neighbours(self, node, step):
+        """Nodes next to the node on its wires in the direction step"""
+        qubits = [self._qubits_1[node]]
+        if self._codes[node] == CX.code:
+            qubits.append(self._qubits_2[node])
+        neighbours = []
+        for qubit in qubits:
+            nodes = self.wire(int(qubit))
+            position = np.searchsorted(nodes, node) + step
+            if 0 <= position < len(nodes):
+                neighbours.append(int(nodes[position]))
+        return neighbours
+
+    def __len__(self):
+        """Return number of the gates in the DAG"""
+        return len(self._codes)
@@ -0,0 +1,168 @@
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+
+import numpy as np
+
+
+class DecompositionCache:
+    """LRU cache of the optimal gate sequences of one qubit unitaries
+
+    The entries are keyed on the parameters (theta, phi, lam) of
+    OneQubitUnitary quantized with the given tolerance, the basis
+    gates, the gate durations, the calibration and the precision of the
+    hardware, and for a calibrated hardware on the qubit. When the
+    durations of a hardware object change, the entries computed for its
+    old durations are dropped.
+    """
+
+    def __init__(self, maxsize=1024, tolerance=1e-9):
+        """Initializes an empty cache
+
+        :param maxsize: int, the maximal number of entries
+        :param tolerance: float, quantization step of the angles (degrees)
+        """
+        if not isinstance(maxsize, int) or maxsize <= 0:
+            raise ValueError("The maxsize of the cache must be "
+                             "a positive integer")
+        if tolerance <= 0:
+            raise ValueError("The tolerance of the cache must be positive")
+        self._maxsize = maxsize
+        self._tolerance = tolerance
+        self._entries = OrderedDict()
+        self._hardware_states = WeakKeyDictionary()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, theta, phi, lam, hardware, index=None):
+        """Returns the cached gate sequence of the unitary or None
+
+        :param theta: parameter in angles
+        :param phi: parameter in angles
+        :param lam: parameter in angles
+        :param hardware: HardwareConfiguration
+        :param index: the qubit of the unitary, None for the sequences
+                priced with length_x/y/z
+        :return: tuple of (gate class, angle) pairs or None
+        """
+        key = self._key(theta, phi, lam, hardware, index)
+        sequence = self._entries.get(key)
+        if sequence is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return sequence
+
+    def get_many(self, theta, phi, lam, hardware, indexes=None):
+        """Looks up many unitaries at once, the keys are quantized in
+        vectorized form
+
+        :param theta: array of parameters in angles
+        :param phi: array of parameters in angles
+        :param lam: array of parameters in angles
+        :param hardware: HardwareConfiguration
+        :param indexes: the qubits of the unitaries, see get
+        :return: list of the cached sequences (see get), None for the
+                unitaries which are not cached
+        """
+        sequences = []
+        for key in self._keys(theta, phi, lam, hardware, indexes):
+            sequence = self._entries.get(key)
+            if sequence is not None:
+                self._entries.move_to_end(key)
+            sequences.append(sequence)
+        misses = sequences.count(None)
+        self.hits += len(sequences) - misses
+        self.misses += misses
+        return sequences
+
+    def put(self, theta, phi, lam, hardware, gates, index=None):
+        """Stores the optimal gate sequence of the unitary
+
+        :param theta: parameter in angles
+        :param phi: parameter in angles
+        :param lam: parameter in angles
+        :param hardware: HardwareConfiguration
+        :param gates: list of X, Y and Z gates
+        :param index: the qubit of the unitary, see get
+        """
+        self._store(self._key(theta, phi, lam, hardware, index), gates)
+
+    def put_many(self, theta, phi, lam, hardware, gate_lists, indexes=None):
+        """Stores the optimal gate sequences of many unitaries
+
+        :param theta: array of parameters in angles
+        :param phi: array of parameters in angles
+        :param lam: array of parameters in angles
+        :param hardware: HardwareConfiguration
+        :param gate_lists: list of lists of X, Y and Z gates
+        :param indexes: the qubits of the unitaries, see get
+        """
+        for key, gates in zip(self._keys(theta, phi, lam, hardware,
+                                         indexes), gate_lists):
+            self._store(key, gates)
+
+    def clear(self):
+        """Removes all the entries, the statistics are kept"""
+        self._entries.clear()
+
+    def statistics(self):
+        """:returns dict with the size and hit/miss/eviction counters"""
+        lookups = self.hits + self.misses
+        return {"size": len(self._entries),
+                "maxsize": self._maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def _store(self, key, gates):
+        """Stores a sequence, evicts the least recently used entry"""
+        self._entries[key] = tuple((type(gate), gate.theta) for gate in gates)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _key(self, theta, phi, lam, hardware, index):
+        """Key of the entry, invalidates stale entries of the hardware"""
+        return self._keys([theta], [phi], [lam], hardware, [index])[0]
+
+    def _keys(self, theta, phi, lam, hardware, indexes):
+        """Keys of many entries, see _key"""
+        calibration = hardware.calibration
+        hardware_key = (frozenset(hardware.basis_gates), hardware.length_x,
+                        hardware.length_y, hardware.length_z,
+                        hardware.precision,
+                        calibration and calibration.fingerprint)
+        old_key = self._hardware_states.get(hardware)
+        if old_key != hardware_key:
+            if old_key is not None:
+                self._invalidate(old_key)
+            self._hardware_states[hardware] = hardware_key
+
+        quantized = np.rint(np.stack(
+            [theta, phi, lam], axis=-1).astype(float) /
+            self._tolerance).astype(np.int64).tolist()
+        # the sequences of a calibrated hardware depend on the qubit
+        if calibration is None or indexes is None:
+            indexes = [None] * len(quantized)
+        else:
+            indexes = np.asarray(indexes).tolist()
+        return [tuple(angles) + hardware_key + (qubit,)
+                for angles, qubit in zip(quantized, indexes)]
+
+    def _invalidate(self, hardware_key):
+        """Removes the entries computed for the given hardware state"""
+        stale = [key for key in self._entries
+                 if key[3:-1] == hardware_key]
+        for key in stale:
+            del self._entries[key]
+        self.invalidations += len(stale)
+
+    def __len__(self):
+        """Return number of the cached entries"""
+        return len(self._entries)
@@ -0,0 +1,118 @@
+"""Gate counts and angle histograms maintained under the edits of a circuit
+
+GateStatistics is updated with the rows added to and removed from a
+circuit, so the counts of the gates per type and per qubit, the summed
+gate durations and the histograms of the angles are read in O(1) (the
+histograms in O(bins)) instead of a pass over the gates.
+"""
+import numpy as np
+
+from optimize_circuit.gates import X, Y, Z, CX, GATE_TYPES
+
+# the angle histograms have ANGLE_BINS bins over [-180, 180) degrees
+ANGLE_BINS = 36
+
+
+class GateStatistics:
+    """Gate counts per type and qubit and histograms of the angles of
+    the one qubit gates per type
+
+    :ivar totals: array of shape (4,), the number of the gates of every
+            gate code
+    :ivar counts: array of shape (4, qubit_number), the number of the
+            gates of every code acting on every qubit, a CX gate acts on
+            both of its qubits
+    :ivar edges: array of shape (qubit_number, qubit_number), the number
+            of the CX gates of every (control, target)
+    :ivar histograms: array of shape (3, ANGLE_BINS), the angles of the
+            X, Y and Z gates modulo 360
+    """
+
+    def __init__(self, qubit_number):
+        """Initializes the statistics of an empty circuit
+
+        :param qubit_number: int, the qubit number of the hardware
+        """
+        self.totals = np.zeros(len(GATE_TYPES), dtype=np.int64)
+        self.counts = np.zeros((len(GATE_TYPES), qubit_number),
+                               dtype=np.int64)
+        self.edges = np.zeros((qubit_number, qubit_number), dtype=np.int64)
+        self.histograms = np.zeros((CX.code, ANGLE_BINS), dtype=np.int64)
+
+    @classmethod
+    def from_storage(cls, storage, qubit_number):
+        """Counts the gates of a storage
+
+        :param storage: GateStorage
+        :param qubit_number: int, the qubit number of the hardware
+        :return: GateStatistics
+        """
+        statistics = cls(qubit_number)
+        statistics.add(storage.codes, storage.qubits_1, storage.qubits_2,
+                       storage.angles)
+        return statistics
+
+    def add(self, codes, qubits_1, qubits_2, angles, sign=1):
+        """Counts added gates given by their columns
+
+        :param codes: array of gate codes
+        :param qubits_1: array of the first (or only) qubit indexes
+        :param qubits_2: array of the second qubit indexes
+        :param angles: array of the angles in degrees
+        :param sign: 1 for added gates, -1 for removed ones
+        """
+        codes = np.asarray(codes, dtype=np.int64)
+        if not len(codes):
+            return
+        qubits_1 = np.asarray(qubits_1, dtype=np.int64)
+        is_cx = codes == CX.code
+        self.totals += sign * np.bincount(codes, minlength=len(GATE_TYPES))
+        np.add.at(self.counts, (codes, qubits_1), sign)
+        targets = np.asarray(qubits_2, dtype=np.int64)[is_cx]
+        np.add.at(self.counts[CX.code], targets, sign)
+        np.add.at(self.edges, (qubits_1[is_cx], targets), sign)
+        np.add.at(self.histograms,
+                  (codes[~is_cx], angle_bins(np.asarray(angles)[~is_cx])),
+                  sign)
+
+    def remove(self, codes, qubits_1, qubits_2, angles):
+        """Uncounts removed gates given by their columns, see add"""
+        self.add(codes, qubits_1, qubits_2, angles, sign=-1)
+
+    def summary(self, hardware):
+        """The statistics as plain Python values
+
+        :param hardware: HardwareConfiguration, the gate durations and
+                error rates per qubit and per edge
+        :return: dict with the gate number, the counts per gate type,
+                the counts per qubit, the summed duration of the gates,
+                the busy time of every qubit (ns), the summed error
+                rate of the gates and the angle histograms
+                {"X": [...], ...} with their bin edges
+        """
+        one_qubit = self.counts[:CX.code].T
+        durations = (one_qubit * hardware.one_qubit_lengths).sum(axis=1)
+        cx_durations = self.edges * hardware.cx_lengths
+        error = (one_qubit * hardware.one_qubit_errors).sum() + \
+            (self.edges * hardware.cx_errors).sum()
+        names = [gate_type.__name__ for gate_type in GATE_TYPES]
+        return {
+            "gates": int(self.totals.sum()),
+            "counts": dict(zip(names, self.totals.tolist())),
+            "qubit_counts": {name: counts for name, counts in zip(
+                names, self.counts.tolist())},
+            "duration": int(durations.sum() + cx_durations.sum()),
+            "qubit_durations": (durations + cx_durations.sum(axis=0) +
+                                cx_durations.sum(axis=1)).tolist(),
+            "error": float(error),
+            "angle_bins": np.linspace(-180, 180, ANGLE_BINS + 1).tolist(),
+            "angle_histograms": {gate_type.__name__: histogram for
+                                 gate_type, histogram in zip(
+                                     (X, Y, Z), self.histograms.tolist())}}
+
+
+def angle_bins(angles):
+    """:returns array of the histogram bins of angles in degrees"""
+    wrapped = np.mod(np.asarray(angles, dtype=np.float64) + 180, 360)
+    return np.minimum((wrapped * (ANGLE_BINS / 360)).astype(np.int64),
+                      ANGLE_BINS - 1)
@@ -0,0 +1,238 @@
+from collections.abc import Sequence
+
+import numpy as np
+
+from optimize_circuit.gates import X, Y, Z, CX, GATE_TYPES
+
+NO_QUBIT = -1
+INTEGER_ANGLE = 1  # flag: the angle was given as an int, e.g. Z(0, 90)
+
+
+class GateStorage:
+    """Struct-of-arrays storage of the gates of a circuit
+
+    Every gate is kept as one row of the columns: gate code
+    (see Gate.code), indexes of the qubits (qubit_2 is NO_QUBIT for the
+    one qubit gates), angle in degrees and flags. The matrices of the
+    gates are never stored, Gate objects are created only on access.
+    """
+
+    def __init__(self, capacity=16):
+        """Initializes an empty storage
+
+        :param capacity: number of rows allocated in advance
+        """
+        self._size = 0
+        self._codes = np.empty(capacity, dtype=np.int8)
+        self._qubits_1 = np.empty(capacity, dtype=np.int16)
+        self._qubits_2 = np.empty(capacity, dtype=np.int16)
+        self._angles = np.empty(capacity, dtype=np.float64)
+        self._flags = np.empty(capacity, dtype=np.uint8)
+
+    @classmethod
+    def from_gates(cls, gates):
+        """Creates a storage filled with the given gates
+
+        :param gates: iterable of X, Y, Z and CX gates
+        :return: GateStorage
+        """
+        gates = list(gates)
+        storage = cls(max(len(gates), 16))
+        for gate in gates:
+            storage.append(*gate_to_row(gate))
+        return storage
+
+    @classmethod
+    def from_columns(cls, codes, qubits_1, qubits_2, angles, flags):
+        """Creates a storage holding the given column arrays without
+        copying them (e.g. fields of a memory-mapped file), the columns
+        are reallocated when the storage grows
+
+        :return: GateStorage
+        """
+        storage = cls(0)
+        storage._codes, storage._qubits_1, storage._qubits_2, \
+            storage._angles, storage._flags = \
+            codes, qubits_1, qubits_2, angles, flags
+        storage._size = len(codes)
+        return storage
+
+    def append(self, code, qubit_1, qubit_2, angle, flags):
+        """Appends one gate given by its columns"""
+        if self._size == len(self._codes):
+            self._reserve(max(2 * self._size, 16))
+        size = self._size
+        self._codes[size] = code
+        self._qubits_1[size] = qubit_1
+        self._qubits_2[size] = qubit_2
+        self._angles[size] = angle
+        self._flags[size] = flags
+        self._size = size + 1
+
+    def extend(self, codes, qubits_1, qubits_2, angles, flags):
+        """Appends many gates given by arrays of their columns"""
+        count = len(codes)
+        if self._size + count > len(self._codes):
+            self._reserve(max(2 * self._size, self._size + count))
+        rows = slice(self._size, self._size + count)
+        self._codes[rows] = codes
+        self._qubits_1[rows] = qubits_1
+        self._qubits_2[rows] = qubits_2
+        self._angles[rows] = angles
+        self._flags[rows] = flags
+        self._size += count
+
+    def insert(self, position, rows):
+        """Inserts gates given by rows of columns before position
+
+        :param position: int, index of the gate in the circuit
+        :param rows: list of tuples (code, qubit_1, qubit_2, angle, flags)
+        """
+        count = len(rows)
+        if self._size + count > len(self._codes):
+            self._reserve(max(2 * self._size, self._size + count))
+        for column, values in zip(self._columns(), zip(*rows)):
+            column[position + count:self._size + count] = \
+                column[position:self._size]
+            column[position:position + count] = values
+        self._size += count
+
+    def delete(self, start, stop=None):
+        """Deletes the gates in [start, stop), by default only one gate
+
+        :param start: int, index of the first deleted gate
+        :param stop: int, index after the last deleted gate
+        """
+        stop = start + 1 if stop is None else stop
+        for column in self._columns():
+            column[start:self._size - stop + start] = column[stop:self._size]
+        self._size -= stop - start
+
+    def set(self, position, row):
+        """Overwrites the gate at position with a row of columns"""
+        for column, value in zip(self._columns(), row):
+            column[position] = value
+
+    def clear(self):
+        """Removes all the gates"""
+        self._size = 0
+
+    def gate(self, position):
+        """Creates the Gate object stored at the given position
+
+        :param position: int, index of the gate in the circuit
+        :return: X, Y, Z or CX gate
+        """
+        return row_to_gate(int(self._codes[position]),
+                           int(self._qubits_1[position]),
+                           int(self._qubits_2[position]),
+                           float(self._angles[position]),
+                           int(self._flags[position]))
+
+    def _columns(self):
+        """The allocated columns in the order of a row"""
+        return (self._codes, self._qubits_1, self._qubits_2,
+                self._angles, self._flags)
+
+    def _reserve(self, capacity):
+        """Reallocates the columns to hold capacity rows"""
+        for name in ("_codes", "_qubits_1", "_qubits_2",
+                     "_angles", "_flags"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    @property
+    def codes(self):
+        """Array of the gate codes"""
+        return self._codes[:self._size]
+
+    @property
+    def qubits_1(self):
+        """Array of the first (or only) qubit indexes"""
+        return self._qubits_1[:self._size]
+
+    @property
+    def qubits_2(self):
+        """Array of the second qubit indexes, NO_QUBIT for one qubit gates"""
+        return self._qubits_2[:self._size]
+
+    @property
+    def angles(self):
+        """Array of the angles in degrees, 0 for CX gates"""
+        return self._angles[:self._size]
+
+    @property
+    def flags(self):
+        """Array of the flags of the gates"""
+        return self._flags[:self._size]
+
+    def __len__(self):
+        """Return number of the stored gates"""
+        return self._size
+
+
+class GateListView(Sequence):
+    """Read only list-of-Gate view over a GateStorage
+
+    Gate objects are created lazily on every access.
+    """
+
+    def __init__(self, storage):
+        self._storage = storage
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self._storage.gate(i)
+                    for i in range(*position.indices(len(self)))]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError("gate index out of range")
+        return self._storage.gate(position)
+
+    def __len__(self):
+        return len(self._storage)
+
+    def __repr__(self):
+        return repr(list(self))
+
+
+def gate_to_row(gate):
+    """Converts a gate into the columns of GateStorage
+
+    :param gate: X, Y, Z or CX gate
+    :return: tuple (code, qubit_1, qubit_2, angle, flags)
+    """
+    if isinstance(gate, CX):
+        return CX.code, gate.index_1, gate.index_2, 0.0, 0
+    if isinstance(gate, (X, Y, Z)):
+        flags = INTEGER_ANGLE if isinstance(gate.theta, (int, np.integer)) \
+            else 0
+        return gate.code, gate.qubit_index, NO_QUBIT, gate.theta, flags
+    raise TypeError(f"Only X, Y, Z and CX gates can be stored in a "
+                    f"circuit, it was given: {gate}")
+
+
+def row_to_gate(code, qubit_1, qubit_2, angle, flags):
+    """Converts the columns of GateStorage into a gate
+
+    :return: X, Y, Z or CX gate
+    """
+    if code == CX.code:
+        return CX(qubit_1, qubit_2)
+    if flags & INTEGER_ANGLE:
+        angle = int(angle)
+    return GATE_TYPES[code](qubit_1, angle)
+
+
+def row_to_string(code, qubit_1, qubit_2, angle, flags):
+    """String notation of a gate given by the columns of GateStorage,
+    the same as Gate.to_sting_notation of the corresponding gate
+    """
+    if code == CX.code:
+        return f"CX({qubit_1}, {qubit_2})"
+    if flags & INTEGER_ANGLE:
+        angle = int(angle)
+    return f"{GATE_TYPES[code].__name__}({qubit_1}, {angle})"
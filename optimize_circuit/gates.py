@@ -1,11 +1,18 @@
 import numpy as np
 from numpy import cos, sin, exp
 from abc import ABC, abstractmethod
+from functools import lru_cache
+
+
+# the number of the (gate type, angle) matrices shared by the gates
+MATRIX_CACHE_SIZE = 4096
 
 
 class Gate(ABC):
     """Abstract class for gates"""
 
+    __slots__ = ()
+
     @abstractmethod
     def to_sting_notation(self):
         """:returns string version of the gate"""
@@ -15,30 +22,68 @@ class Gate(ABC):
         return self.to_sting_notation()
 
 
-class X(Gate):
-    """X rotation gate:
+class RotationGate(Gate):
+    """Rotation of one qubit by an angle, the matrix is built on the
+    first access and shared (read-only) by the gates of the same type
+    and angle, see rotation_matrix"""
 
-    X(theta) = [[cos(theta/2), -1j * sin(theta/2)]
-                [-1j * sin(theta/2), cos(theta/2]]
-
-    """
+    __slots__ = ("qubit_index", "theta")
 
     def __init__(self, qubit_index, theta):
-        """Initializes an X gate with given
+        """Initializes a rotation gate with given
         parameter theta (degrees) and qubit index
         """
-        th = np.deg2rad(theta) / 2
-        self.arr = np.array([[cos(th), -1j * sin(th)],
-                             [-1j * sin(th), cos(th)]], dtype=complex)
         self.qubit_index = qubit_index
         self.theta = theta
 
+    @property
+    def arr(self):
+        """The read-only matrix of the gate"""
+        return rotation_matrix(type(self), self.theta)
+
+    @staticmethod
+    @abstractmethod
+    def matrix(theta):
+        """:returns a new matrix of the rotation by theta (degrees)"""
+
     def to_sting_notation(self):
         """:returns string version of the gate"""
-        return f"X({self.qubit_index}, {self.theta})"
+        return f"{type(self).__name__}({self.qubit_index}, {self.theta})"
+
 
+@lru_cache(maxsize=MATRIX_CACHE_SIZE)
+def rotation_matrix(gate_type, theta):
+    """The shared read-only matrix of a rotation gate
 
-class Y(Gate):
+    :param gate_type: X, Y or Z
+    :param theta: parameter theta (degrees)
+    :return: array of shape (2, 2)
+    """
+    matrix = gate_type.matrix(theta)
+    matrix.flags.writeable = False
+    return matrix
+
+
+class X(RotationGate):
+    """X rotation gate:
+
+    X(theta) = [[cos(theta/2), -1j * sin(theta/2)]
+                [-1j * sin(theta/2), cos(theta/2]]
+
+    """
+
+    __slots__ = ()
+    code = 0
+
+    @staticmethod
+    def matrix(theta):
+        """:returns a new matrix of X(theta)"""
+        th = np.deg2rad(theta) / 2
+        return np.array([[cos(th), -1j * sin(th)],
+                         [-1j * sin(th), cos(th)]], dtype=complex)
+
+
+class Y(RotationGate):
     """Y rotation gate:
 
     Y(theta) = [[cos(theta/2), -sin(theta/2)]
@@ -46,21 +91,18 @@ class Y(Gate):
 
     """
 
-    def __init__(self, qubit_index, theta):
-        """Initializes an Y gate with given parameter
-        theta (degrees) and qubit index
-        """
-        th = np.deg2rad(theta) / 2
-        self.arr = np.array([[cos(th), -sin(th)],
-                             [sin(th), cos(th)]], dtype=complex)
-        self.qubit_index = qubit_index
-        self.theta = theta
+    __slots__ = ()
+    code = 1
 
-    def to_sting_notation(self):
-        return f"Y({self.qubit_index}, {self.theta})"
+    @staticmethod
+    def matrix(theta):
+        """:returns a new matrix of Y(theta)"""
+        th = np.deg2rad(theta) / 2
+        return np.array([[cos(th), -sin(th)],
+                         [sin(th), cos(th)]], dtype=complex)
 
 
-class Z(Gate):
+class Z(RotationGate):
     """Z rotation gate:
 
     Z(theta) = [[exp(-1j * theta/2), 0]
@@ -68,18 +110,21 @@ class Z(Gate):
 
     """
 
-    def __init__(self, qubit_index, theta):
-        """Initializes an Z gate with given parameter
-        theta (degrees) and qubit index
-        """
+    __slots__ = ()
+    code = 2
+
+    @staticmethod
+    def matrix(theta):
+        """:returns a new matrix of Z(theta)"""
         th = np.deg2rad(theta) / 2
-        self.arr = np.array([[exp(-1j * th), 0],
-                             [0, exp(1j * th)]], dtype=complex)
-        self.qubit_index = qubit_index
-        self.theta = theta
+        return np.array([[exp(-1j * th), 0],
+                         [0, exp(1j * th)]], dtype=complex)
 
-    def to_sting_notation(self):
-        return f"Z({self.qubit_index}, {self.theta})"
+
+def _read_only(matrix):
+    """Makes a module-wide constant matrix immutable"""
+    matrix.flags.writeable = False
+    return matrix
 
 
 class CX(Gate):
@@ -98,19 +143,23 @@ class CX(Gate):
                 [0, 0, 1, 0]]
     """
 
+    __slots__ = ("index_1", "index_2")
+    code = 3
+    # the read-only matrices shared by all CX gates
+    MATRICES = {
+        (0, 1): _read_only(np.array([[1, 0, 0, 0],
+                                     [0, 0, 0, 1],
+                                     [0, 0, 1, 0],
+                                     [0, 1, 0, 0]], dtype=complex)),
+        (1, 0): _read_only(np.array([[1, 0, 0, 0],
+                                     [0, 1, 0, 0],
+                                     [0, 0, 0, 1],
+                                     [0, 0, 1, 0]], dtype=complex)),
+    }
+
     def __init__(self, index_1, index_2):
         """Initializes an CX gate with given gubit indexes"""
-        if index_1 == 0 and index_2 == 1:
-            self.arr = np.array([[1, 0, 0, 0],
-                                 [0, 0, 0, 1],
-                                 [0, 0, 1, 0],
-                                 [0, 1, 0, 0]], dtype=complex)
-        elif index_1 == 1 and index_2 == 0:
-            self.arr = np.array([[1, 0, 0, 0],
-                                 [0, 1, 0, 0],
-                                 [0, 0, 0, 1],
-                                 [0, 0, 1, 0]], dtype=complex)
-        else:
+        if (index_1, index_2) not in CX.MATRICES:
             raise NotImplementedError(
                 "The index_1 and index_2 for CX gate must be given either "
                 "0 or 1 and not equal to each other. It was given: "
@@ -119,10 +168,84 @@ class CX(Gate):
         self.index_1 = index_1
         self.index_2 = index_2
 
+    @property
+    def arr(self):
+        """The read-only matrix of the gate"""
+        return CX.MATRICES[self.index_1, self.index_2]
+
     def to_sting_notation(self):
         return f"CX({self.index_1}, {self.index_2})"
 
 
+GATE_TYPES = (X, Y, Z, CX)
+GATE_CODES = {gate_type.__name__: gate_type.code for gate_type in GATE_TYPES}
+
+
+def rotation_matrices(codes, thetas):
+    """Builds the matrices of X, Y and Z gates in vectorized form
+
+    :param codes: array of gate codes (X.code, Y.code or Z.code)
+    :param thetas: array of parameters theta (degrees)
+    :return: array of shape (len(codes), 2, 2) with the gate matrices
+    """
+    th = np.deg2rad(thetas) / 2
+    cos_th, sin_th = cos(th), sin(th)
+    matrices = np.zeros((len(codes), 2, 2), dtype=complex)
+
+    is_x = codes == X.code
+    matrices[is_x, 0, 0] = matrices[is_x, 1, 1] = cos_th[is_x]
+    matrices[is_x, 0, 1] = matrices[is_x, 1, 0] = -1j * sin_th[is_x]
+
+    is_y = codes == Y.code
+    matrices[is_y, 0, 0] = matrices[is_y, 1, 1] = cos_th[is_y]
+    matrices[is_y, 0, 1] = -sin_th[is_y]
+    matrices[is_y, 1, 0] = sin_th[is_y]
+
+    is_z = codes == Z.code
+    matrices[is_z, 0, 0] = exp(-1j * th[is_z])
+    matrices[is_z, 1, 1] = exp(1j * th[is_z])
+
+    return matrices
+
+
+def circuit_matrices(codes, qubits_1, qubits_2, angles, qubit_number):
+    """Builds the matrices of the gates of a circuit in vectorized form,
+    acting on all the qubits of the hardware (qubit 0 is the lowest bit)
+
+    :param codes: array of gate codes
+    :param qubits_1: array of the first (or only) qubit indexes
+    :param qubits_2: array of the second qubit indexes
+    :param angles: array of the angles in degrees
+    :param qubit_number: 1 or 2
+    :return: array of shape (len(codes), 2 ** qubit_number,
+            2 ** qubit_number)
+    """
+    codes, angles = np.asarray(codes), np.asarray(angles)
+    is_cx = codes == CX.code
+    if qubit_number == 1:
+        if np.any(is_cx):
+            raise ValueError("CX gate cannot be presented in "
+                             "the one qubit circuit")
+        return rotation_matrices(codes, angles)
+    if qubit_number != 2:
+        raise NotImplementedError(
+            "Only one and two qubit circuits are supported, "
+            f"it was given: qubit_number = {qubit_number}")
+
+    matrices = np.empty((len(codes), 4, 4), dtype=complex)
+    one_qubit = rotation_matrices(codes[~is_cx], angles[~is_cx])
+    identity = np.identity(2)
+    on_qubit_0 = (np.asarray(qubits_1)[~is_cx] == 0)[:, None, None]
+    matrices[~is_cx] = np.where(
+        on_qubit_0,
+        np.einsum("ij,nkl->nikjl", identity, one_qubit).reshape(-1, 4, 4),
+        np.einsum("nij,kl->nikjl", one_qubit, identity).reshape(-1, 4, 4))
+    matrices[is_cx] = np.where(
+        (np.asarray(qubits_1)[is_cx] == 0)[:, None, None],
+        CX.MATRICES[0, 1], CX.MATRICES[1, 0])
+    return matrices
+
+
 class OneQubitUnitary(Gate):
     """A one qubit unitary gate
 
@@ -131,6 +254,8 @@ class OneQubitUnitary(Gate):
     [exp(1j * phi) * sin(theta/2), exp(1j * (phi + lam)) * cos(theta/2)]]
     """
 
+    __slots__ = ("index", "theta", "phi", "lam", "_arr")
+
     def __init__(self, index, theta, phi, lam):
         """Initializes a one qubit unitary gate
 
@@ -139,25 +264,53 @@ class OneQubitUnitary(Gate):
         :param phi: parameter in angles
         :param lam: parameter in angles
         """
-        th = np.deg2rad(theta) / 2
-        ph = np.deg2rad(phi)
-        lm = np.deg2rad(lam)
-        self.arr = np.array(
-            [[cos(th), -exp(1j * lm) * sin(th)],
-             [exp(1j * ph) * sin(th), exp(1j * (ph + lm)) * cos(th)]],
-            dtype=complex)
         self.theta = theta
         self.phi = phi
         self.lam = lam
         self.index = index
+        self._arr = None
+
+    @property
+    def arr(self):
+        """The matrix of the gate, built on the first access"""
+        if self._arr is None:
+            th = np.deg2rad(self.theta) / 2
+            ph = np.deg2rad(self.phi)
+            lm = np.deg2rad(self.lam)
+            self._arr = np.array(
+                [[cos(th), -exp(1j * lm) * sin(th)],
+                 [exp(1j * ph) * sin(th), exp(1j * (ph + lm)) * cos(th)]],
+                dtype=complex)
+        return self._arr
 
     def to_sting_notation(self):
         return f"UOne({self.index}, {self.theta}, {self.phi}, {self.lam})"
 
 
 class TwoQubitUnitary(Gate):
-    """A two qubit unitary gate
+    """A two qubit unitary gate, qubit 0 is the lowest bit
     Minimal Universal Two-qubit Quantum Circuits
     from "arXiv preprint quant-ph/0308033"
+
+    The gate is synthesized into at most three CX gates with
+    two_qubit_synthesis.synthesize.
     """
-    pass
+
+    __slots__ = ("arr",)
+
+    def __init__(self, arr):
+        """Initializes a two qubit unitary gate
+
+        :param arr: unitary 4x4 matrix
+        """
+        arr = np.array(arr, dtype=complex)
+        if arr.shape != (4, 4):
+            raise ValueError("The matrix of a two qubit unitary must "
+                             f"be 4x4, it was given: {arr.shape}")
+        if not np.allclose(arr @ arr.conj().T, np.identity(4)):
+            raise ValueError("The matrix of a two qubit unitary "
+                             "must be unitary")
+        self.arr = arr
+
+    def to_sting_notation(self):
+        return "UTwo(0, 1)"
@@ -1,3 +1,5 @@
+import numpy as np
+
 from optimize_circuit.gates import X, Y, Z, CX
 
 DEFAULT_BASIS_GATES = frozenset({'X', 'Y', 'Z', 'CX'})
@@ -6,6 +8,11 @@ ACCEPTABLE_BASIS_GATES_LIST = {
     frozenset({'X', 'Z', 'CX'}),
     frozenset({'Y', 'Z', 'CX'})
 }
+# precisions of the fusion of one qubit gates and the angle extraction
+SINGLE, DOUBLE = "single", "double"
+# error of a fused quaternion (the distance of the unitaries up to the
+# global phase) above which single precision falls back to double
+DEFAULT_PRECISION_TOLERANCE = 1e-4
 
 
 class HardwareConfiguration:
@@ -19,12 +26,17 @@ class HardwareConfiguration:
                              f" {ACCEPTABLE_BASIS_GATES_LIST}")
         self._basis_gates = basis_gates
         self._qubit_number = qubit_number
+        self._calibration = None
+        self._tables = None
 
         self.length_x = 10  # ns
         self.length_y = 10  # ns
         self.length_z = 10  # ns
         self.length_cx = 100  # ns
 
+        self.precision = DOUBLE
+        self.precision_tolerance = DEFAULT_PRECISION_TOLERANCE
+
     def validate_qubit_index(self, qubit_index):
         """Validates if the qubit_index valid for the hardware
 
@@ -41,19 +53,114 @@ class HardwareConfiguration:
         :param gate_list: list of Gates
         :return:
         """
-        duration = 0
-        for gate in gate_list:
-            if isinstance(gate, X):
-                duration += self.length_x
-            elif isinstance(gate, Y):
-                duration += self.length_y
-            elif isinstance(gate, Z):
-                duration += self.length_z
-            elif isinstance(gate, CX):
-                raise ValueError("CX gate cannot be presented in "
-                                 "the list of the single qubit gates")
-
-        return duration
+        # unitary gates have no code and no duration
+        gate_list = [gate for gate in gate_list if hasattr(gate, "code")]
+        if any(isinstance(gate, CX) for gate in gate_list):
+            raise ValueError("CX gate cannot be presented in "
+                             "the list of the single qubit gates")
+        codes = np.array([gate.code for gate in gate_list], dtype=np.int64)
+        qubits = np.array([gate.qubit_index for gate in gate_list],
+                          dtype=np.int64)
+        return int(self.gate_lengths(codes, qubits, qubits).sum())
+
+    def duration_of_codes(self, codes, qubits_1=None, qubits_2=None):
+        """Calculates the duration of the gates given by their codes,
+        CX gates included, calibrated per qubit and per edge when the
+        hardware has a calibration
+
+        :param codes: array of gate codes
+        :param qubits_1: array of the first (or only) qubit indexes,
+                required with a calibration
+        :param qubits_2: array of the second qubit indexes, required with
+                a calibration
+        :return: int, the sum of the lengths of the gates
+        """
+        if self._calibration is not None:
+            if qubits_1 is None or qubits_2 is None:
+                raise ValueError("The qubits of the gates must be given "
+                                 "when the hardware has a calibration")
+            return int(self.gate_lengths(codes, qubits_1, qubits_2).sum())
+        counts = np.bincount(np.asarray(codes, dtype=np.int64),
+                             minlength=CX.code + 1)
+        lengths = {X.code: self.length_x, Y.code: self.length_y,
+                   Z.code: self.length_z, CX.code: self.length_cx}
+        return sum(int(counts[code]) * length
+                   for code, length in lengths.items())
+
+    def gate_lengths(self, codes, qubits_1, qubits_2):
+        """The lengths of gates given by their columns, calibrated per
+        qubit and per edge
+
+        :param codes: array of gate codes
+        :param qubits_1: array of the first (or only) qubit indexes
+        :param qubits_2: array of the second qubit indexes
+        :return: int array of the lengths in ns
+        """
+        return _lookup(self.one_qubit_lengths, self.cx_lengths,
+                       codes, qubits_1, qubits_2)
+
+    def gate_errors(self, codes, qubits_1, qubits_2):
+        """The error rates of gates given by their columns, zero for the
+        gates without calibration
+
+        :param codes: array of gate codes
+        :param qubits_1: array of the first (or only) qubit indexes
+        :param qubits_2: array of the second qubit indexes
+        :return: float array of the error rates
+        """
+        return _lookup(self.one_qubit_errors, self.cx_errors,
+                       codes, qubits_1, qubits_2)
+
+    @property
+    def one_qubit_lengths(self):
+        """Int array (qubit_number, 3) of the lengths of the X, Y and Z
+        gates of every qubit, the calibrated ones or length_x/y/z"""
+        return self._cost_tables()[0]
+
+    @property
+    def one_qubit_errors(self):
+        """Array (qubit_number, 3) of the error rates of the X, Y and Z
+        gates of every qubit"""
+        return self._cost_tables()[1]
+
+    @property
+    def cx_lengths(self):
+        """Int array (qubit_number, qubit_number) of the lengths of the
+        CX gates indexed by (control, target)"""
+        return self._cost_tables()[2]
+
+    @property
+    def cx_errors(self):
+        """Array (qubit_number, qubit_number) of the error rates of the
+        CX gates indexed by (control, target)"""
+        return self._cost_tables()[3]
+
+    def _cost_tables(self):
+        """The lookup tables of the lengths and the error rates, kept
+        until a length or the calibration changes"""
+        if self._tables is None:
+            number = self.qubit_number
+            lengths = np.tile([self.length_x, self.length_y,
+                               self.length_z], (number, 1))
+            cx_lengths = np.full((number, number), self.length_cx)
+            errors = np.zeros((number, CX.code))
+            cx_errors = np.zeros((number, number))
+            calibration = self._calibration
+            if calibration is not None:
+                lengths = np.where(calibration.lengths > 0,
+                                   calibration.lengths, lengths)
+                cx_lengths = np.where(calibration.cx_lengths > 0,
+                                      calibration.cx_lengths, cx_lengths)
+                errors, cx_errors = calibration.errors, calibration.cx_errors
+            self._tables = (lengths, errors, cx_lengths, cx_errors)
+            for table in self._tables:
+                table.flags.writeable = False
+        return self._tables
+
+    @property
+    def calibration(self):
+        """Calibration of the gates per qubit and per edge or None"""
+        return self._calibration
 
     @property
     def length_x(self):
@@ -75,6 +182,18 @@ class HardwareConfiguration:
         """The length of the Z gate in ns"""
         return self._length_cx
 
+    @property
+    def precision(self):
+        """SINGLE or DOUBLE, the float precision of the fusion of one
+        qubit gates and of the angle extraction"""
+        return self._precision
+
+    @property
+    def precision_tolerance(self):
+        """The error bound of single precision fusion above which the
+        gates are fused in double precision"""
+        return self._precision_tolerance
+
     @property
     def basis_gates(self):
         """The basis gates of the Hardware"""
@@ -93,6 +212,7 @@ class HardwareConfiguration:
         if length <= 0:
             raise ValueError("The length of a gate can not be negative")
         self._length_x = length
+        self._tables = None
 
     @length_y.setter
     def length_y(self, length):
@@ -102,6 +222,7 @@ class HardwareConfiguration:
         if length <= 0:
             raise ValueError("The length of a gate can not be negative")
         self._length_y = length
+        self._tables = None
 
     @length_z.setter
     def length_z(self, length):
@@ -111,8 +232,53 @@ class HardwareConfiguration:
         if length <= 0:
             raise ValueError("The length of a gate can not be negative")
         self._length_z = length
+        self._tables = None
 
     @length_cx.setter
-    def length_cx(self, value):
+    def length_cx(self, length):
         """Changes the length of the CX gate"""
-        self._length_cx = value
+        if not isinstance(length, int):
+            raise TypeError("The length of a gate must be an integer")
+        if length <= 0:
+            raise ValueError("The length of a gate can not be negative")
+        self._length_cx = length
+        self._tables = None
+
+    @calibration.setter
+    def calibration(self, calibration):
+        """Changes the calibration, None uses length_x/y/z/cx for all
+        the qubits"""
+        if calibration is not None and \
+                calibration.qubit_number != self.qubit_number:
+            raise ValueError(f"The calibration is for "
+                             f"{calibration.qubit_number} qubits, the "
+                             f"hardware has {self.qubit_number}")
+        self._calibration = calibration
+        self._tables = None
+
+    @precision.setter
+    def precision(self, precision):
+        """Changes the precision of the fusion"""
+        if precision not in (SINGLE, DOUBLE):
+            raise ValueError(f"The precision must be '{SINGLE}' or "
+                             f"'{DOUBLE}', it was given: {precision}")
+        self._precision = precision
+
+    @precision_tolerance.setter
+    def precision_tolerance(self, tolerance):
+        """Changes the error tolerance of single precision fusion"""
+        if not isinstance(tolerance, (int, float)):
+            raise TypeError("The precision tolerance must be a number")
+        if tolerance <= 0:
+            raise ValueError("The precision tolerance must be positive")
+        self._precision_tolerance = tolerance
+
+
+def _lookup(one_qubit_table, cx_table, codes, qubits_1, qubits_2):
+    """Looks up the values of gates in the tables of a hardware"""
+    codes = np.asarray(codes, dtype=np.int64)
+    qubits_1 = np.asarray(qubits_1, dtype=np.int64)
+    is_cx = codes == CX.code
+    return np.where(
+        is_cx, cx_table[qubits_1, np.where(is_cx, qubits_2, 0)],
+        one_qubit_table[qubits_1, np.minimum(codes, CX.code - 1)])
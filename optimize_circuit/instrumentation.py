@@ -0,0 +1,126 @@
+"""Opt-in timing of the stages of the optimization pipeline
+
+The hot functions of the package are decorated with timed(stage), the
+decorator only checks a module global while no Instrumentation is
+recording. Inside
+
+    with recording() as instrumentation:
+        circuit.add_from_string(...)
+        circuit.optimize()
+    print(instrumentation.to_json())
+
+every call of a decorated function is counted with its latency and the
+number of the gates it processed. Stages may be nested (e.g. "fusion"
+is a part of "optimize"), so their times are not additive.
+"""
+import json
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+
+# upper bounds (seconds) of the latency histogram buckets
+HISTOGRAM_BOUNDS = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0, float("inf"))
+
+_active = None
+
+
+class Instrumentation:
+    """Call counts, latencies and gate counts of the pipeline stages"""
+
+    def __init__(self, hooks=()):
+        """Initializes an empty record
+
+        :param hooks: callables hook(stage, seconds, gates) called on
+                every record, e.g. to forward it to a metrics pipeline
+        """
+        self.hooks = list(hooks)
+        self._stages = {}
+
+    def record(self, stage, seconds, gates=0):
+        """Records one call of a stage
+
+        :param stage: str, name of the stage
+        :param seconds: float, latency of the call
+        :param gates: int, number of the gates processed by the call
+        """
+        statistics = self._stages.get(stage)
+        if statistics is None:
+            statistics = self._stages[stage] = {
+                "calls": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                "gates": 0, "histogram": [0] * len(HISTOGRAM_BOUNDS)}
+        statistics["calls"] += 1
+        statistics["total_seconds"] += seconds
+        statistics["max_seconds"] = max(statistics["max_seconds"], seconds)
+        statistics["gates"] += gates
+        statistics["histogram"][bisect_left(HISTOGRAM_BOUNDS, seconds)] += 1
+        for hook in self.hooks:
+            hook(stage, seconds, gates)
+
+    def snapshot(self):
+        """:returns dict, stage -> calls, total/mean/max seconds, gates
+        and the latency histogram {upper bound: calls}"""
+        snapshot = {}
+        for stage, statistics in self._stages.items():
+            snapshot[stage] = {
+                "calls": statistics["calls"],
+                "total_seconds": statistics["total_seconds"],
+                "mean_seconds":
+                    statistics["total_seconds"] / statistics["calls"],
+                "max_seconds": statistics["max_seconds"],
+                "gates": statistics["gates"],
+                "histogram": {f"<={bound:g}": calls for bound, calls in
+                              zip(HISTOGRAM_BOUNDS,
+                                  statistics["histogram"])}}
+        return snapshot
+
+    def to_json(self, **kwargs):
+        """:returns the snapshot as a JSON string"""
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def reset(self):
+        """Removes all the records"""
+        self._stages.clear()
+
+
+@contextmanager
+def recording(instrumentation=None):
+    """Records the decorated functions called inside the with block
+
+    :param instrumentation: Instrumentation to record into, a new one
+            if None
+    :return: context manager giving the Instrumentation
+    """
+    global _active
+    if instrumentation is None:
+        instrumentation = Instrumentation()
+    previous, _active = _active, instrumentation
+    try:
+        yield instrumentation
+    finally:
+        _active = previous
+
+
+def timed(stage, count=None):
+    """Decorator recording the calls of a function as the given stage
+
+    :param stage: str, name of the stage
+    :param count: function count(result, *args, **kwargs) returning the
+            number of the gates processed by a call
+    :return: decorator
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            instrumentation = _active
+            if instrumentation is None:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            result = function(*args, **kwargs)
+            seconds = perf_counter() - start
+            instrumentation.record(
+                stage, seconds,
+                count(result, *args, **kwargs) if count is not None else 0)
+            return result
+        return wrapper
+    return decorator
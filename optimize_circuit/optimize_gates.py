@@ -1,157 +1,516 @@
-from optimize_circuit.transformations import u_to_zxz_gates, u_to_zyz_gates
-from optimize_circuit.gates import OneQubitUnitary, X, Y, Z
+from optimize_circuit.transformations import drop_zero_rotations, \
+    shorten_conjugations, shorten_euler_angles, ZERO_TOLERANCE
+from optimize_circuit.gates import Z, CX, GATE_TYPES, GATE_CODES
+from optimize_circuit.gate_storage import GateStorage, gate_to_row, \
+    NO_QUBIT
+from optimize_circuit.hardware_configuration import SINGLE
+from optimize_circuit.rewrite_rules import rewrite_gates
+from optimize_circuit import quaternion
+from optimize_circuit.instrumentation import timed
 import numpy as np
 
+# gate codes of the bases of quaternion.EULER_BASES
+EULER_CODES = np.array([[GATE_CODES[axis] for axis in basis]
+                        for basis in quaternion.EULER_BASES])
+# at most so many unitaries are decomposed and at most so many gates
+# are fused one by one in Python floats, the numpy call overhead of the
+# vectorized pipeline is higher for them
+SMALL_BATCH = 8
+SMALL_FUSION = 64
+_EULER_CODE_LISTS = EULER_CODES.tolist()
+_EULER_AXES = [set(basis) for basis in quaternion.EULER_BASES]
 
-def optimize_one_qubit_circuit(gate_list, hardware):
+
+def optimize_one_qubit_circuit(gate_list, hardware, cache=None):
     """Optimizes one qubit gate_list
 
     :param hardware: HardwareConfiguration
     :param gate_list: list of Gate objects (X, Y, Z)
+    :param cache: optional DecompositionCache
     :return: optimized gate_list
     """
-    index = gate_list[0].qubit_index
-    resulting_unitary = np.identity(2, dtype=complex)
+    codes = np.array([gate.code for gate in gate_list])
+    angles = np.array([gate.theta for gate in gate_list], dtype=float)
+    return optimize_one_qubit_columns(
+        codes, angles, gate_list[0].qubit_index, hardware, cache)
 
-    for gate in gate_list:
-        resulting_unitary = np.matmul(resulting_unitary, gate.arr)
 
-    global_phase = np.angle(resulting_unitary[0, 0])
+def optimize_batch(circuits, hardware, cache=None):
+    """Optimizes a batch of one qubit circuits at once
 
-    resulting_unitary = np.exp(-1j * global_phase) * resulting_unitary
-    if resulting_unitary[0, 0].imag > 1e-5:
-        raise ArithmeticError(
-            "resulting_unitary[0, 0].imag must be 0 "
-            f"at this point, but it is equal to "
-            f"{resulting_unitary[0, 0].imag }"
-        )
-    theta_rad = np.arccos(np.abs(resulting_unitary[0, 0]))
-    phi_rad = np.angle(resulting_unitary[1, 0])
-    lam_rad = np.angle(-resulting_unitary[0, 1])
+    Circuits longer than three gates are packed into stacked (N, L)
+    arrays of gate codes and angles and fused as quaternions with a
+    pairwise reduction (in the precision of the hardware, see
+    fused_run_angles), the angles and the Euler basis choice are then
+    computed for the whole batch in vectorized form. Shorter circuits
+    go through the micro optimization, exactly like in
+    QuantumCircuit.optimize.
 
-    u_one_qubit_gate = OneQubitUnitary(
-        index, np.rad2deg(theta_rad), np.rad2deg(phi_rad), np.rad2deg(lam_rad))
+    :param circuits: list of gate lists (X, Y, Z) or QuantumCircuit objects
+    :param hardware: HardwareConfiguration
+    :param cache: optional DecompositionCache
+    :return: list of optimized gate lists in the order of circuits
+    """
+    if hardware.qubit_number != 1:
+        return [list(getattr(circuit, "gates", circuit))
+                for circuit in circuits]
+    columns = [_one_qubit_columns(circuit) for circuit in circuits]
 
-    return u_to_optimal_three_gates(u_one_qubit_gate, hardware)
+    optimized = [None] * len(columns)
+    long_circuits = []
+    for position, (codes, _, _) in enumerate(columns):
+        if len(codes) > 3:
+            long_circuits.append(position)
+        else:
+            optimized[position] = micro_optimize_one_qubit_circuit(
+                list(getattr(circuits[position], "gates",
+                             circuits[position])))
 
+    if long_circuits:
+        lengths = np.array([len(columns[position][0])
+                            for position in long_circuits])
+        theta, phi, lam, tolerance = fused_run_angles(
+            np.concatenate([columns[position][0]
+                            for position in long_circuits]),
+            np.concatenate([columns[position][1]
+                            for position in long_circuits]),
+            np.cumsum(lengths) - lengths, lengths, hardware)
+        decomposed = fused_angles_to_gates(
+            theta, phi, lam,
+            [columns[position][2] for position in long_circuits],
+            hardware, cache, tolerance)
+        for position, gate_list in zip(long_circuits, decomposed):
+            optimized[position] = gate_list
 
-def u_to_optimal_three_gates(u_one_gate, hardware):
-    """ Finds the optimal gate sequence
+    return optimized
 
-    :param u_one_gate: OneQubitUnitary
+
+def optimize_wires(storage, hardware, cache=None):
+    """Optimizes a circuit on many qubits wire by wire
+
+    The one qubit gates of every wire are split into maximal runs
+    bounded by the CX gates acting on the wire. All the runs longer
+    than three gates are fused at once and decomposed into the optimal
+    three gate sequences, the shorter ones go through the micro
+    optimization. A run commutes with the gates on the other wires, so
+    its optimized gates take the place of its first gate.
+
+    :param storage: GateStorage of the circuit
     :param hardware: HardwareConfiguration
-    :return: list of optimal gates
+    :param cache: optional DecompositionCache
+    :return: GateStorage of the optimized circuit
     """
-    gates_zxz = u_to_zxz_gates(u_one_gate)
-    gates_zyz = u_to_zyz_gates(u_one_gate)
+    codes, qubits_1, qubits_2 = \
+        storage.codes, storage.qubits_1, storage.qubits_2
+    is_cx = codes == CX.code
+    one_qubit = np.flatnonzero(~is_cx)
 
-    if "X" not in hardware.basis_gates:
-        return gates_zyz
-    if "Y" not in hardware.basis_gates:
-        return gates_zxz
+    # a run is given by its wire and the number of the CX gates acting
+    # on the wire before it
+    run_keys = np.zeros(len(codes), dtype=np.int64)
+    for wire in np.unique(qubits_1[one_qubit]):
+        crossings = np.cumsum(is_cx & ((qubits_1 == wire) |
+                                       (qubits_2 == wire)))
+        on_wire = ~is_cx & (qubits_1 == wire)
+        run_keys[on_wire] = int(wire) * (len(codes) + 1) + \
+            crossings[on_wire]
+    order = one_qubit[np.argsort(run_keys[one_qubit], kind="stable")]
+    starts = np.flatnonzero(np.diff(run_keys[order], prepend=-1))
+    lengths = np.diff(np.append(starts, len(order)))
+    firsts = order[starts]
 
-    if hardware.duration_of_one_qubit_gates(gates_zxz) < \
-            hardware.duration_of_one_qubit_gates(gates_zyz):
-        return gates_zxz
-    else:
-        return gates_zyz
+    angles, flags = storage.angles, storage.flags
+    # (keys, codes, qubits_1, qubits_2, angles, flags) of the optimized
+    # gates, the key of a gate is the position of its CX or of the first
+    # gate of its run
+    parts = []
+    cx_positions = np.flatnonzero(is_cx)
+    parts.append((cx_positions, codes[cx_positions], qubits_1[cx_positions],
+                  qubits_2[cx_positions], angles[cx_positions],
+                  flags[cx_positions]))
 
+    single = firsts[lengths == 1]
+    single = single[angles[single] % 360 != 0]
+    parts.append((single, codes[single], qubits_1[single], qubits_2[single],
+                  angles[single], flags[single]))
 
-def micro_optimize_one_qubit_circuit(gate_list):
-    """Does mini optimization on circuit with
-    less than 3 gates
-    """
-    if len(gate_list) == 1:
-        if int(gate_list[0].theta) % 360 == 0:
-            return []
+    # two gate runs: the gates about the same axis are merged, the same
+    # as in rewrite_rules.rewrite_gates
+    first = order[starts[lengths == 2]]
+    second = order[starts[lengths == 2] + 1]
+    same = codes[first] == codes[second]
+    merged = first[same]
+    merged_angles = angles[merged] + angles[second[same]]
+    nonzero = merged_angles % 360 != 0
+    merged, merged_angles = merged[nonzero], merged_angles[nonzero]
+    parts.append((merged, codes[merged], qubits_1[merged], qubits_2[merged],
+                  merged_angles, flags[merged] & flags[second[same]][nonzero]))
+    # both gates of a pair about different axes stay, keyed by the first
+    pair_keys = first[~same]
+    for gates in (first[~same], second[~same]):
+        parts.append((pair_keys, codes[gates], qubits_1[gates],
+                      qubits_2[gates], angles[gates], flags[gates]))
+
+    rows = []
+    long_runs = np.flatnonzero(lengths > 3)
+    if len(long_runs):
+        theta, phi, lam, tolerance = fused_run_angles(
+            codes[order], angles[order], starts[long_runs],
+            lengths[long_runs], hardware)
+        if cache is None:
+            run_codes, run_angles = choose_euler_bases(
+                theta, phi, lam, hardware, tolerance,
+                qubits_1[firsts[long_runs]])
+            keep = run_angles != 0
+            keys = np.repeat(firsts[long_runs], 3).reshape(-1, 3)[keep]
+            parts.append((keys, run_codes[keep], qubits_1[keys],
+                          np.full(len(keys), NO_QUBIT), run_angles[keep],
+                          np.zeros(len(keys), dtype=np.uint8)))
         else:
-            return gate_list
-    if len(gate_list) == 2:
-        return optimize_two_gate(gate_list)
-    if len(gate_list) == 3:
-        return optimize_three_gate(gate_list)
+            decomposed = fused_angles_to_gates(
+                theta, phi, lam, qubits_1[firsts[long_runs]].tolist(),
+                hardware, cache, tolerance)
+            for key, gate_list in zip(firsts[long_runs].tolist(),
+                                      decomposed):
+                rows += [(key,) + gate_to_row(gate) for gate in gate_list]
+    for run in np.flatnonzero(lengths == 3).tolist():
+        gate_list = micro_optimize_one_qubit_circuit([
+            storage.gate(position) for position in
+            order[starts[run]:starts[run] + lengths[run]].tolist()])
+        rows += [(int(firsts[run]),) + gate_to_row(gate)
+                 for gate in gate_list]
+    if rows:
+        parts.append(tuple(np.array(column) for column in zip(*rows)))
 
+    keys, *columns = [np.concatenate(column) for column in zip(*parts)]
+    order = np.argsort(keys, kind="stable")
+    optimized = GateStorage(max(len(order), 16))
+    optimized.extend(*(column[order] for column in columns))
+    return optimized
 
-def optimize_three_gate(gate_list):
-    """Optimizes three gate circuit
 
-    :param gate_list: list of gates
-    :return: optimized gate_list
+def fused_run_angles(codes, angles, starts, lengths, hardware):
+    """Fuses runs of one qubit gates stored one after another and
+    extracts the parameters of OneQubitUnitary of every run in the
+    precision of the hardware
+
+    In single precision the runs are fused and their angles extracted in
+    float32, except the runs whose error bound (quaternion.fusion_errors)
+    is above hardware.precision_tolerance, those fall back to float64.
+    The rotations of the decompositions of the float32 runs are zero up
+    to the angle error caused by their error bound.
+
+    :param codes: array of gate codes (X, Y, Z)
+    :param angles: array of the gate angles in degrees
+    :param starts: array of the first positions of the runs
+    :param lengths: array of the (positive) lengths of the runs
+    :param hardware: HardwareConfiguration
+    :return: theta, phi, lam and tolerance arrays of shape
+            (len(starts),), the tolerances in degrees are to be passed
+            on to the decomposition
     """
-    optimized_first_two_gates = optimize_two_gate(gate_list[0:2])
-    optimized_last_two_gates = optimize_two_gate(gate_list[1:])
+    starts, lengths = np.asarray(starts), np.asarray(lengths)
+    tolerance = np.full(len(starts), ZERO_TOLERANCE)
+    if hardware.precision != SINGLE and len(starts) <= SMALL_BATCH and \
+            lengths.sum() <= SMALL_FUSION:
+        parameters = [quaternion.scalar_to_angles(quaternion.scalar_fuse(
+            codes[start:start + length].tolist(),
+            angles[start:start + length].tolist()))
+            for start, length in zip(starts.tolist(), lengths.tolist())]
+        return (*np.array(parameters, dtype=float).reshape(-1, 3).T,
+                tolerance)
+    single = np.zeros(len(starts), dtype=bool)
+    if hardware.precision == SINGLE:
+        errors = quaternion.fusion_errors(angles, starts, lengths)
+        single = errors <= hardware.precision_tolerance
+        # a quaternion error changes the rotation angles up to twice as
+        # much, besides the float32 rounding of the angles themselves
+        tolerance[single] = np.rad2deg(2 * errors[single]) + \
+            360 * np.finfo(np.float32).eps
+
+    parameters = np.empty((3, len(starts)))
+    for runs, dtype in ((single, np.float32), (~single, np.float64)):
+        if runs.any():
+            parameters[:, runs] = quaternion.to_angles(fuse_runs(
+                codes, angles, starts[runs], lengths[runs], dtype))
+    return (*parameters, tolerance)
 
-    if len(optimized_first_two_gates) <= 1:
-        gate_list = optimized_first_two_gates + gate_list[2:]
-        return optimize_two_gate(gate_list)
-    if len(optimized_last_two_gates) <= 1:
-        gate_list = gate_list[0:1] + optimized_last_two_gates
-        return optimize_two_gate(gate_list)
 
-    return optimize_with_three_gate_identities(gate_list)
+def fuse_runs(codes, angles, starts, lengths, dtype=np.float64):
+    """Fuses runs of one qubit gates stored one after another, the runs
+    are bucketed by the next power of two of their length, so that the
+    identity padding never doubles the work
+
+    :param codes: array of gate codes (X, Y, Z)
+    :param angles: array of the gate angles in degrees
+    :param starts: array of the first positions of the runs
+    :param lengths: array of the (positive) lengths of the runs
+    :param dtype: float type of the fusion
+    :return: array of shape (len(starts), 4), the fused quaternions
+    """
+    fused = np.empty((len(starts), 4), dtype=dtype)
+    buckets = np.left_shift(1, np.ceil(np.log2(lengths)).astype(int))
+    for bucket in np.unique(buckets):
+        runs = np.flatnonzero(buckets == bucket)
+        offsets = np.arange(bucket)
+        valid = offsets < lengths[runs, np.newaxis]
+        positions = np.where(valid, starts[runs, np.newaxis] + offsets, 0)
+        fused[runs] = quaternion.fuse(quaternion.rotation_quaternions(
+            np.where(valid, codes[positions], Z.code),
+            np.where(valid, angles[positions], 0), dtype))
+    return fused
 
 
-def optimize_two_gate(gate_list):
-    """Optimizes two gate circuit
+def optimize_one_qubit_columns(codes, angles, index, hardware, cache=None):
+    """Optimizes one qubit circuit given in the columnar form of
+    GateStorage, without creating the Gate objects of the circuit
 
-    :param gate_list: list of Gates
+    :param codes: array of gate codes (X, Y, Z)
+    :param angles: array of the gate angles in degrees
+    :param index: index of the qubit
+    :param hardware: HardwareConfiguration
+    :param cache: optional DecompositionCache
     :return: optimized gate_list
     """
-    if isinstance(gate_list[0], X) and isinstance(gate_list[1], X):
-        theta = gate_list[0].theta + gate_list[1].theta
-        if int(theta) % 360 == 0:
-            return []
-        else:
-            return [X(0, theta)]
-    if isinstance(gate_list[0], Y) and isinstance(gate_list[1], Y):
-        theta = gate_list[0].theta + gate_list[1].theta
-        if int(theta) % 360 == 0:
-            return []
-        else:
-            return [Y(0, theta)]
-    if isinstance(gate_list[0], Z) and isinstance(gate_list[1], Z):
-        theta = gate_list[0].theta + gate_list[1].theta
-        if int(theta) % 360 == 0:
-            return []
-        else:
-            return [Z(0, theta)]
+    theta, phi, lam, tolerance = fused_run_angles(
+        codes, angles, [0], [len(codes)], hardware)
+    return fused_angles_to_gates(
+        theta, phi, lam, [index], hardware, cache, tolerance)[0]
 
-    return gate_list
 
+@timed("decomposition",
+       count=lambda _, theta, phi, lam, indexes, *args: len(indexes))
+def fused_angles_to_gates(theta, phi, lam, indexes, hardware, cache=None,
+                          tolerance=ZERO_TOLERANCE):
+    """Decomposes fused unitaries, given by the parameters of
+    OneQubitUnitary, into the optimal three gate sequences
 
-def optimize_with_three_gate_identities(gate_list):
-    """Optimize with three gates identities
+    :param theta: array of parameters in angles
+    :param phi: array of parameters in angles
+    :param lam: array of parameters in angles
+    :param indexes: qubit index for each unitary
+    :param hardware: HardwareConfiguration
+    :param cache: optional DecompositionCache
+    :param tolerance: float or array, the angles (degrees) below which
+            the rotations are dropped
+    :return: list of gate lists
+    """
+    if cache is None:
+        codes, angles = choose_euler_bases(theta, phi, lam, hardware,
+                                           tolerance, indexes)
+        return [_euler_gates(*row) for row in
+                zip(codes.tolist(), angles.tolist(), indexes)]
 
-    :param gate_list: list of gates
-    :return: optimized gate_list
+    # only the unitaries missing in the cache are decomposed
+    indexes = list(indexes)
+    theta, phi, lam = np.asarray(theta), np.asarray(phi), np.asarray(lam)
+    cached = cache.get_many(theta, phi, lam, hardware, indexes)
+    missing = [row for row, sequence in enumerate(cached) if sequence is None]
+    gate_lists = [None if sequence is None else
+                  [gate_type(index, angle) for gate_type, angle in sequence]
+                  for sequence, index in zip(cached, indexes)]
+    if missing:
+        missing_indexes = [indexes[row] for row in missing]
+        codes, angles = choose_euler_bases(
+            theta[missing], phi[missing], lam[missing], hardware,
+            np.broadcast_to(tolerance, theta.shape)[missing],
+            missing_indexes)
+        decomposed = [_euler_gates(*row) for row in
+                      zip(codes.tolist(), angles.tolist(), missing_indexes)]
+        for row, gate_list in zip(missing, decomposed):
+            gate_lists[row] = gate_list
+        cache.put_many(theta[missing], phi[missing], lam[missing],
+                       hardware, decomposed, missing_indexes)
+    return gate_lists
+
+
+def reduce_unitaries(stacked):
+    """Multiplies stacked gate matrices given in the time order
+    pairwise, the product of [G_1, ..., G_L] is G_L ... G_1
+
+    :param stacked: array of shape (N, L, d, d)
+    :return: array of shape (N, d, d) with the products
     """
-    # XYX = -Y, XZX = -Z when X.theta ==180
-    if isinstance(gate_list[0], X) and isinstance(gate_list[2], X) and \
-            int(gate_list[0].theta) == 180 and int(gate_list[2].theta) == 180:
-        if isinstance(gate_list[1], Y):
-            return [Y(gate_list[1].qubit_index, -gate_list[1].theta)]
-        if isinstance(gate_list[1], Z):
-            return [Z(gate_list[1].qubit_index, -gate_list[1].theta)]
-
-    # YXY = -X, YZY = -Z when Y.theta ==180
-    if isinstance(gate_list[0], Y) and isinstance(gate_list[2], Y) and \
-            int(gate_list[0].theta) == 180 and int(gate_list[2].theta) == 180:
-        if isinstance(gate_list[1], X):
-            return [X(gate_list[1].qubit_index, -gate_list[1].theta)]
-        if isinstance(gate_list[1], Z):
-            return [Z(gate_list[1].qubit_index, -gate_list[1].theta)]
-
-    # ZXZ = -X, ZYZ = -Y when Z.theta ==180
-    if isinstance(gate_list[0], Z) and isinstance(gate_list[2], Z) and \
-            int(gate_list[0].theta) == 180 and int(gate_list[2].theta) == 180:
-        if isinstance(gate_list[1], X):
-            return [X(gate_list[1].qubit_index, -gate_list[1].theta)]
-        if isinstance(gate_list[1], Y):
-            return [Y(gate_list[1].qubit_index, -gate_list[1].theta)]
-
-    # Pauli(90)Pauli'(180)Pauli(90) = Pauli'(180)
-    if int(gate_list[0].theta) == 90 and int(gate_list[1].theta) == 180 \
-            and int(gate_list[2].theta) == 90:
-        return [gate_list[1]]
-
-    return gate_list
+    while stacked.shape[1] > 1:
+        if stacked.shape[1] % 2:
+            identity = np.broadcast_to(
+                np.identity(stacked.shape[-1], dtype=stacked.dtype),
+                (stacked.shape[0], 1) + stacked.shape[2:])
+            stacked = np.concatenate([stacked, identity], axis=1)
+        stacked = np.matmul(stacked[:, 1::2], stacked[:, 0::2])
+    return stacked[:, 0]
+
+
+def choose_euler_bases(theta, phi, lam, hardware,
+                       tolerance=ZERO_TOLERANCE, indexes=None):
+    """Decomposes unitaries in all the Euler bases of the basis gates at
+    once and picks the shortest sequence for every unitary. The zero
+    rotations are dropped and the sequences with a rotation by 180
+    degrees are shortened (see shorten_conjugations) before the
+    durations are compared, so no rule of the micro optimization
+    applies to the picked gates. The gates are priced with the lookup
+    tables of the hardware for the qubit of every unitary, equal
+    durations are resolved by the smaller number of the gates, then by
+    the smaller summed error rate and then in the order of
+    quaternion.EULER_BASES. Up to SMALL_BATCH unitaries are decomposed
+    one by one in Python floats.
+
+    :param theta: array of parameters in angles
+    :param phi: array of parameters in angles
+    :param lam: array of parameters in angles
+    :param hardware: HardwareConfiguration
+    :param tolerance: float or array, the angles (degrees) below which
+            the rotations are dropped
+    :param indexes: array of the qubit of every unitary, None prices
+            the gates with length_x, length_y and length_z
+    :return: codes and angles arrays of shape (len(theta), 3) in the
+            time order, the gates with zero angles are to be dropped
+    """
+    if len(theta) <= SMALL_BATCH:
+        rows = [_choose_euler_basis(*row, hardware) for row in zip(
+            np.asarray(theta, dtype=float).tolist(),
+            np.asarray(phi, dtype=float).tolist(),
+            np.asarray(lam, dtype=float).tolist(),
+            np.asarray(tolerance, dtype=float).tolist()
+            if np.ndim(tolerance) else [tolerance] * len(theta),
+            [None] * len(theta) if indexes is None
+            else np.asarray(indexes).tolist())]
+        return np.array([_EULER_CODE_LISTS[basis] for basis, _ in rows],
+                        dtype=EULER_CODES.dtype).reshape(-1, 3), \
+            np.array([angles for _, angles in rows],
+                     dtype=float).reshape(-1, 3)
+
+    angles = shorten_conjugations(drop_zero_rotations(
+        quaternion.to_euler_angles(quaternion.from_angles(theta, phi, lam)),
+        tolerance), tolerance)
+    if indexes is None:
+        lengths = np.array([[hardware.length_x, hardware.length_y,
+                             hardware.length_z]])
+        errors = np.zeros((1, CX.code))
+    else:
+        indexes = np.asarray(indexes, dtype=np.int64)
+        lengths = hardware.one_qubit_lengths[indexes]
+        errors = hardware.one_qubit_errors[indexes]
+    present = angles != 0
+    durations = (present * lengths[:, EULER_CODES]).sum(axis=-1, dtype=float)
+    errors = (present * errors[:, EULER_CODES]).sum(axis=-1)
+    supported = np.array([set(basis) <= hardware.basis_gates
+                          for basis in quaternion.EULER_BASES])
+    durations[:, ~supported] = np.inf
+
+    shortest = durations == durations.min(axis=1, keepdims=True)
+    counts = np.where(shortest, present.sum(axis=-1), np.inf)
+    fewest = counts == counts.min(axis=1, keepdims=True)
+    best = np.argmin(np.where(fewest, errors, np.inf), axis=1)
+    return EULER_CODES[best], angles[np.arange(len(best)), best]
+
+
+def _choose_euler_basis(theta, phi, lam, tolerance, index, hardware):
+    """choose_euler_bases of one unitary in Python floats
+
+    :return: tuple (position of the basis in EULER_BASES, list of the
+            three angles)
+    """
+    if index is None:
+        lengths = [hardware.length_x, hardware.length_y, hardware.length_z]
+        errors = [0.0] * CX.code
+    else:
+        lengths = hardware.one_qubit_lengths[index].tolist()
+        errors = hardware.one_qubit_errors[index].tolist()
+
+    supported = [axes <= hardware.basis_gates for axes in _EULER_AXES]
+    sequences = quaternion.scalar_to_euler_angles(
+        quaternion.scalar_from_angles(theta, phi, lam))
+    costs = []
+    for basis, (first, middle, last) in enumerate(_EULER_CODE_LISTS):
+        if not supported[basis]:
+            costs.append((np.inf,))
+            continue
+        sequences[basis] = shorten_euler_angles(sequences[basis], tolerance)
+        present = [angle != 0 for angle in sequences[basis]]
+        costs.append((
+            present[0] * lengths[first] + present[1] * lengths[middle] +
+            present[2] * lengths[last], sum(present),
+            present[0] * errors[first] + present[1] * errors[middle] +
+            present[2] * errors[last]))
+    best = costs.index(min(costs))
+    return best, sequences[best]
+
+
+def _one_qubit_columns(circuit):
+    """Gate codes, angles and the qubit index of a one qubit circuit
+
+    :param circuit: list of gates (X, Y, Z) or QuantumCircuit
+    :return: tuple (codes, angles, index)
+    """
+    storage = getattr(circuit, "storage", None)
+    if storage is not None:
+        if np.any(storage.codes == CX.code):
+            raise ValueError("CX gate cannot be presented in "
+                             "the one qubit circuit")
+        index = int(storage.qubits_1[0]) if len(storage) else 0
+        return storage.codes, storage.angles, index
+
+    gate_list = list(circuit)
+    codes = [gate.code for gate in gate_list]
+    if CX.code in codes:
+        raise ValueError("CX gate cannot be presented in "
+                         "the one qubit circuit")
+    codes = np.array(codes, dtype=np.int8)
+    angles = np.array([gate.theta for gate in gate_list], dtype=float)
+    index = gate_list[0].qubit_index if gate_list else 0
+    return codes, angles, index
+
+
+@timed("decomposition", count=lambda *_: 1)
+def u_to_optimal_three_gates(u_one_gate, hardware, cache=None):
+    """ Finds the optimal gate sequence
+
+    :param u_one_gate: OneQubitUnitary
+    :param hardware: HardwareConfiguration
+    :param cache: optional DecompositionCache
+    :return: list of optimal gates
+    """
+    if cache is not None:
+        cached = cache.get(u_one_gate.theta, u_one_gate.phi,
+                           u_one_gate.lam, hardware, u_one_gate.index)
+        if cached is not None:
+            return [gate_type(u_one_gate.index, angle)
+                    for gate_type, angle in cached]
+        gates = u_to_optimal_three_gates(u_one_gate, hardware)
+        cache.put(u_one_gate.theta, u_one_gate.phi, u_one_gate.lam,
+                  hardware, gates, u_one_gate.index)
+        return gates
+
+    basis, angles = _choose_euler_basis(
+        u_one_gate.theta, u_one_gate.phi, u_one_gate.lam, ZERO_TOLERANCE,
+        u_one_gate.index, hardware)
+    return _euler_gates(_EULER_CODE_LISTS[basis], angles, u_one_gate.index)
+
+
+def _euler_gates(codes, angles, index):
+    """Gates of an Euler sequence given by the lists of its codes and
+    angles, the gates with zero angles are dropped"""
+    return [GATE_TYPES[code](index, angle)
+            for code, angle in zip(codes, angles) if angle != 0]
+
+
+def micro_optimize_one_qubit_circuit(gate_list):
+    """Does mini optimization on circuit with
+    less than 3 gates, with the identities of
+    optimize_circuit.rewrite_rules
+    """
+    if len(gate_list) == 1:
+        # a single gate is only dropped when it is the identity, which
+        # costs less than its record in the instrumentation
+        try:
+            return [] if gate_list[0].theta % 360 == 0 else list(gate_list)
+        except TypeError:
+            # symbolic angles of optimize_circuit.parametric
+            return list(gate_list)
+    return _timed_rewrite_gates(gate_list)
+
+
+_timed_rewrite_gates = timed(
+    "micro_optimization",
+    count=lambda _, gate_list: len(gate_list))(rewrite_gates)
@@ -0,0 +1,399 @@
+"""Parametric circuits compiled once and bound to many parameter values
+
+The angles of the gates of a CircuitTemplate may be symbolic, linear in
+named parameters, e.g. X(0, 2 * Parameter("theta") + 30). Compiling a
+template does everything that does not depend on the values of the
+parameters: the translation into the basis gates, the rewrite rules of
+optimize_circuit.rewrite_rules (symbolic angles are merged, the
+conditions on the angles hold only for the numeric ones) and, for one
+qubit templates, the fusion of the runs of numeric gates into constant
+quaternions. Binding a (num_points, num_params) array then evaluates all
+the angles with one matrix product and fuses, decomposes or builds the
+circuits of all the points at once.
+"""
+import numbers
+import re
+
+import numpy as np
+
+from optimize_circuit import quaternion
+from optimize_circuit.circuit import QuantumCircuit, translated_rows
+from optimize_circuit.gates import CX, GATE_TYPES, GATE_CODES
+from optimize_circuit.gate_storage import NO_QUBIT, INTEGER_ANGLE
+from optimize_circuit.optimize_gates import choose_euler_bases
+from optimize_circuit.parser import evaluate_expression
+from optimize_circuit.rewrite_rules import rewrite_gates
+
+_TEMPLATE_GATE = re.compile(
+    r"\s*(CX|X|Y|Z)\s*\(([^()]*(?:\([^()]*\)[^()]*)*)\)\s*(?:,|$)")
+
+
+class ParameterExpression:
+    """An angle in degrees linear in symbolic parameters,
+    offset + sum of coefficient * parameter over the terms"""
+
+    __slots__ = ("terms", "offset")
+
+    def __init__(self, terms, offset=0.0):
+        """Initializes an expression
+
+        :param terms: dict {parameter name: coefficient}
+        :param offset: number, the constant part
+        """
+        self.terms = dict(terms)
+        self.offset = offset
+
+    def __add__(self, other):
+        if isinstance(other, ParameterExpression):
+            terms = dict(self.terms)
+            for name, coefficient in other.terms.items():
+                terms[name] = terms.get(name, 0) + coefficient
+            return _expression(terms, self.offset + other.offset)
+        if isinstance(other, numbers.Real):
+            return _expression(self.terms, self.offset + other)
+        return NotImplemented
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return self * -1
+
+    def __pos__(self):
+        return self
+
+    def __sub__(self, other):
+        if isinstance(other, (ParameterExpression, numbers.Real)):
+            return self + -other
+        return NotImplemented
+
+    def __rsub__(self, other):
+        return -self + other
+
+    def __mul__(self, other):
+        if isinstance(other, numbers.Real):
+            return _expression({name: coefficient * other for name,
+                                coefficient in self.terms.items()},
+                               self.offset * other)
+        raise TypeError("The angles must be linear in the parameters")
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        if isinstance(other, numbers.Real):
+            return self * (1 / other)
+        raise TypeError("The angles must be linear in the parameters")
+
+    def __str__(self):
+        parts = [f"{coefficient} * {name}" if coefficient != 1 else name
+                 for name, coefficient in self.terms.items()]
+        if self.offset:
+            parts.append(str(self.offset))
+        return " + ".join(parts)
+
+    def __repr__(self):
+        return f"ParameterExpression({self})"
+
+
+class Parameter(ParameterExpression):
+    """A named symbolic angle in degrees"""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        """Initializes a parameter
+
+        :param name: str, an identifier
+        """
+        if not isinstance(name, str) or not name.isidentifier():
+            raise ValueError(f"'{name}' is not a valid parameter name")
+        super().__init__({name: 1})
+        self.name = name
+
+    def __repr__(self):
+        return f"Parameter({self.name})"
+
+
+class CircuitTemplate:
+    """A circuit with symbolic angles
+
+    Gates are added the same way as to QuantumCircuit (and translated
+    into the basis of the hardware), bind creates the circuits of many
+    parameter values at once.
+    """
+
+    def __init__(self, hardware):
+        """Initializes an empty template
+
+        :param hardware: HardwareConfiguration
+        """
+        self.hardware = hardware
+        self._rows = []
+        self._parameters = {}
+        self._compiled = None
+
+    @property
+    def parameters(self):
+        """Tuple of the parameter names in the order of the columns of
+        the values of bind, the order of their first appearance"""
+        return tuple(self._parameters)
+
+    def add(self, gate):
+        """Adds a gate, its angle may be a ParameterExpression
+
+        :param gate: X, Y, Z or CX gate
+        """
+        rows = translated_rows(gate, self.hardware.basis_gates)
+        for code, qubit_1, qubit_2, angle, _ in rows:
+            self.hardware.validate_qubit_index(qubit_1)
+            if code == CX.code:
+                self.hardware.validate_qubit_index(qubit_2)
+            for name in getattr(angle, "terms", ()):
+                self._parameters.setdefault(name, len(self._parameters))
+        self._rows += rows
+        self._compiled = None
+
+    def add_from_string(self, gates_in_string):
+        """Adds gates from a string in the notation of str(circuit), the
+        angles may be linear expressions of parameter names
+
+        :param gates_in_string: str, e.g. "X(0, 2 * theta + 30), CX(0, 1)"
+        """
+        for gate in parse_template(gates_in_string):
+            self.add(gate)
+
+    def compile(self):
+        """Compiles the template, bind calls it when it is needed
+
+        :return: CompiledTemplate
+        """
+        if self._compiled is None:
+            self._compiled = CompiledTemplate(self._rewritten_rows(),
+                                              self.parameters,
+                                              self.hardware.qubit_number)
+        return self._compiled
+
+    def bind_euler(self, values):
+        """Fuses a one qubit template for every row of values and
+        decomposes it into the optimal Euler sequence
+
+        :param values: array of shape (num_points, len(parameters)) in
+                degrees, or dict {name: array of shape (num_points,)}
+        :return: codes and angles arrays of shape (num_points, 3) in the
+                time order, the gates with zero angles are to be dropped
+        """
+        if self.hardware.qubit_number != 1:
+            raise NotImplementedError("Only one qubit templates are fused "
+                                      "into Euler sequences")
+        compiled = self.compile()
+        values = self._values(values)
+        angles = compiled.evaluate(values, compiled.parametric)
+        quaternions = np.repeat(compiled.constants[np.newaxis],
+                                len(values), axis=0)
+        quaternions[:, compiled.factors] = \
+            quaternion.rotation_quaternions(
+                np.broadcast_to(compiled.codes[compiled.parametric],
+                                angles.shape), angles)
+        theta, phi, lam = quaternion.to_angles(quaternion.fuse(quaternions))
+        return choose_euler_bases(theta, phi, lam, self.hardware,
+                                  indexes=np.zeros(len(theta), dtype=int))
+
+    def bind(self, values, optimize=True):
+        """Creates the circuits of many parameter values
+
+        One qubit templates are fused and decomposed for all the points
+        at once (bind_euler), the circuits of the other templates are
+        optimized one by one if optimize is True.
+
+        :param values: array of shape (num_points, len(parameters)) in
+                degrees, or dict {name: array of shape (num_points,)}
+        :param optimize: bool, optimize the circuits
+        :return: list of QuantumCircuit
+        """
+        circuits = []
+        if optimize and self.hardware.qubit_number == 1:
+            for codes, angles in zip(*self.bind_euler(values)):
+                keep = angles != 0
+                circuit = QuantumCircuit(self.hardware)
+                circuit.add_columns(codes[keep], np.zeros(keep.sum()),
+                                    np.full(keep.sum(), NO_QUBIT),
+                                    angles[keep], np.zeros(keep.sum()))
+                circuits.append(circuit)
+            return circuits
+
+        compiled = self.compile()
+        every = np.ones(len(compiled.codes), dtype=bool)
+        for angles in compiled.evaluate(self._values(values), every):
+            circuit = QuantumCircuit(self.hardware)
+            circuit.add_columns(compiled.codes, compiled.qubits_1,
+                                compiled.qubits_2, angles, compiled.flags)
+            if optimize:
+                circuit.optimize()
+            circuits.append(circuit)
+        return circuits
+
+    def _values(self, values):
+        """The values of bind as an array of shape (N, len(parameters))"""
+        if isinstance(values, dict):
+            missing = set(self._parameters) - set(values)
+            if missing:
+                raise ValueError(f"No values of the parameters {missing}")
+            values = np.stack([np.asarray(values[name], dtype=float)
+                               for name in self._parameters], axis=-1)
+        values = np.asarray(values, dtype=float)
+        if values.ndim != 2 or values.shape[1] != len(self._parameters):
+            raise ValueError(f"The values must have the shape (num_points, "
+                             f"{len(self._parameters)}), it was given: "
+                             f"{values.shape}")
+        return values
+
+    def _rewritten_rows(self):
+        """The rows with the one qubit gates of every wire between the
+        CX gates rewritten by the rewrite rules"""
+        rows, runs = [], {}
+
+        def flush(qubit):
+            rows.extend((gate.code, qubit, NO_QUBIT, gate.theta)
+                        for gate in rewrite_gates(runs.pop(qubit, [])))
+
+        for code, qubit_1, qubit_2, angle, flags in self._rows:
+            if code == CX.code:
+                flush(qubit_1)
+                flush(qubit_2)
+                rows.append((code, qubit_1, qubit_2, 0.0))
+            else:
+                runs.setdefault(qubit_1, []).append(
+                    GATE_TYPES[code](qubit_1, angle))
+        for qubit in sorted(runs):
+            flush(qubit)
+        return rows
+
+    def __len__(self):
+        """Return number of the gates of the template"""
+        return len(self._rows)
+
+    def __str__(self):
+        """The notation of str(circuit) with the symbolic angles"""
+        if not self._rows:
+            return "[]"
+        return ", ".join(
+            f"CX({qubit_1}, {qubit_2})" if code == CX.code else
+            f"{GATE_TYPES[code].__name__}({qubit_1}, {angle})"
+            for code, qubit_1, qubit_2, angle, _ in self._rows)
+
+
+class CompiledTemplate:
+    """The gates of a compiled template in the columnar form, the
+    angles are offsets + values @ coefficients.T
+
+    :ivar codes: array of gate codes
+    :ivar qubits_1: array of the first (or only) qubit indexes
+    :ivar qubits_2: array of the second qubit indexes
+    :ivar offsets: array of the constant parts of the angles
+    :ivar coefficients: array of shape (len(codes), num_params)
+    :ivar flags: array of the flags of the gates
+    :ivar parametric: boolean mask of the gates with symbolic angles
+    :ivar constants: array of shape (L, 4), one qubit templates only:
+            the quaternions of the fused runs of numeric gates and the
+            identity in the place of the parametric gates
+    :ivar factors: array of the positions of the parametric gates in
+            constants, one qubit templates only
+    """
+
+    def __init__(self, rows, parameters, qubit_number):
+        """Compiles the rows (code, qubit_1, qubit_2, angle)
+
+        :param rows: list of rows in the time order
+        :param parameters: tuple of the parameter names
+        :param qubit_number: int, the qubit number of the hardware
+        """
+        columns = ([row[position] for row in rows] for position in range(3))
+        self.codes, self.qubits_1, self.qubits_2 = (
+            np.array(column, dtype=np.int64) for column in columns)
+        angles = [row[3] for row in rows]
+        self.offsets = np.array([getattr(angle, "offset", angle)
+                                 for angle in angles], dtype=float)
+        self.coefficients = np.zeros((len(rows), len(parameters)))
+        for position, angle in enumerate(angles):
+            for name, coefficient in getattr(angle, "terms", {}).items():
+                self.coefficients[position, parameters.index(name)] = \
+                    coefficient
+        self.flags = np.array([INTEGER_ANGLE if isinstance(angle, int)
+                               else 0 for angle in angles], dtype=np.uint8)
+        self.parametric = self.coefficients.any(axis=1)
+        if qubit_number == 1:
+            self._fuse_constants()
+
+    def evaluate(self, values, gates):
+        """The angles of the gates for many parameter values
+
+        :param values: array of shape (N, num_params)
+        :param gates: boolean mask of the gates
+        :return: array of shape (N, number of the gates)
+        """
+        return self.offsets[gates] + values @ self.coefficients[gates].T
+
+    def _fuse_constants(self):
+        """Fuses every run of numeric gates into one constant quaternion"""
+        # a factor is a parametric gate or a run of numeric gates
+        starts = self.parametric | np.diff(self.parametric, prepend=True)
+        rotations = quaternion.rotation_quaternions(
+            self.codes, np.where(self.parametric, 0, self.offsets))
+        self.constants = np.tile(quaternion.IDENTITY,
+                                 (max(starts.sum(), 1), 1))
+        for factor, (start, run) in enumerate(zip(
+                np.flatnonzero(starts).tolist(),
+                np.split(rotations, np.flatnonzero(starts)[1:]))):
+            if not self.parametric[start]:
+                self.constants[factor] = quaternion.fuse(run)
+        self.factors = (np.cumsum(starts) - 1)[self.parametric]
+
+
+def parse_template(gates_in_string):
+    """Parses gates in the notation of str(circuit), the angles may be
+    linear expressions of parameter names
+
+    :param gates_in_string: str, e.g. "X(0, 2 * theta + 30), CX(0, 1)"
+    :return: list of gates, the symbolic angles are ParameterExpression
+    """
+    gates = []
+    position = 0
+    text = gates_in_string.strip()
+    while position < len(text):
+        match = _TEMPLATE_GATE.match(text, position)
+        if match is None:
+            raise ValueError(f"The gate at '{text[position:][:50]}' is not "
+                             "in the form '{Gate}({qubit}, {Angle})'")
+        name, arguments = match.groups()
+        first, _, second = arguments.partition(",")
+        try:
+            qubit = int(first)
+            if name == "CX":
+                gates.append(CX(qubit, int(second)))
+            else:
+                gates.append(GATE_TYPES[GATE_CODES[name]](
+                    qubit, parse_angle(second)))
+        except ValueError as error:
+            raise ValueError(f"{match.group().strip()}: {error}") from None
+        position = match.end()
+    return gates
+
+
+def parse_angle(expression):
+    """Parses an angle expression linear in the parameters
+
+    :param expression: str, e.g. "2 * theta - phi / 2 + 30"
+    :return: number or ParameterExpression
+    """
+    try:
+        return evaluate_expression(expression, Parameter)
+    except (SyntaxError, TypeError, ZeroDivisionError, OverflowError):
+        raise ValueError(
+            f"Unsupported angle expression: {expression.strip()}") from None
+
+
+def _expression(terms, offset):
+    """ParameterExpression without the zero terms, the offset if no term
+    is left"""
+    terms = {name: coefficient for name, coefficient in terms.items()
+             if coefficient != 0}
+    return ParameterExpression(terms, offset) if terms else offset
@@ -0,0 +1,383 @@
+"""Streaming readers of circuits in the text notation and OpenQASM 2
+
+The text notation is the one of QuantumCircuit.__str__, e.g.
+"X(0, 90.0), Z(1, -45), CX(0, 1)", with any whitespace. Of OpenQASM 2
+the gates rx, ry, rz, x, y, z, s, sdg, t, tdg and cx (CX) are read,
+qreg, creg, barrier, the header and include statements are accepted.
+Gates are equal to the OpenQASM ones up to a global phase, e.g.
+s q[0]; is read as Z(0, 90).
+
+Sources are streamed in chunks: files are memory-mapped, file objects
+are read chunk by chunk and iterables of lines are joined in chunks,
+so a reader never holds more than one chunk of text.
+"""
+import ast
+import math
+import mmap
+import operator
+import os
+import re
+
+import numpy as np
+
+from optimize_circuit.gates import X, Y, Z, CX
+from optimize_circuit.instrumentation import timed
+from optimize_circuit.gate_storage import NO_QUBIT
+
+CHUNK_SIZE = 1 << 20  # bytes
+TEXT_FORMAT = "text"
+QASM_FORMAT = "qasm"
+
+# gates of the text notation, every one after a comma or whitespace, the
+# separators are matched in one way only, so a malformed text fails in
+# linear time
+_TEXT_GATES = re.compile(rb"""
+    (?:(?:\s*,\s*|\s+)
+       (?:CX|X|Y|Z)\s*\(\s*[+-]?\d+\s*,\s*
+       [+-]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][+-]?\d+)?\s*\))*""",
+                         re.VERBOSE)
+# once the text is validated, gate names become their codes, so every
+# gate is three numbers
+_TEXT_TABLE = bytes.maketrans(b"(),XYZ", b"   " + bytes(
+    str(X.code) + str(Y.code) + str(Z.code), "ascii"))
+
+_QASM_COMMENT = re.compile(rb"//[^\n]*")
+_QASM_STATEMENT = re.compile(
+    rb"\s*([A-Za-z_]\w*)\s*(?:\(([^)]*)\))?\s*([^;]*);")
+_QASM_QUBIT = re.compile(rb"\s*([A-Za-z_]\w*)\s*\[\s*(\d+)\s*\]\s*")
+_QASM_GATES = {
+    b"rx": (X.code, None), b"ry": (Y.code, None), b"rz": (Z.code, None),
+    b"x": (X.code, 180.0), b"y": (Y.code, 180.0), b"z": (Z.code, 180.0),
+    b"s": (Z.code, 90.0), b"sdg": (Z.code, -90.0),
+    b"t": (Z.code, 45.0), b"tdg": (Z.code, -45.0),
+    b"cx": (CX.code, 0.0), b"CX": (CX.code, 0.0),
+}
+_QASM_IGNORED = {b"OPENQASM", b"include", b"creg", b"barrier"}
+_QASM_CONSTANTS = {"pi": math.pi}
+_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub,
+              ast.Mult: operator.mul, ast.Div: operator.truediv}
+
+
+def iter_gate_columns(source, fmt=None, chunk_size=CHUNK_SIZE):
+    """Streams the gates of a circuit as chunks of GateStorage columns
+
+    :param source: path of a file, binary or text file object, bytes,
+            or an iterable of str/bytes pieces (e.g. lines)
+    :param fmt: TEXT_FORMAT, QASM_FORMAT or None to detect it
+    :param chunk_size: int, size of the chunks in bytes
+    :return: generator of tuples (codes, qubits_1, qubits_2, angles)
+    """
+    chunks = _iter_byte_chunks(source, chunk_size)
+    first = b""
+    for chunk in chunks:
+        first += chunk
+        if len(first.lstrip()) >= len(b"OPENQASM"):
+            break
+    if fmt is None:
+        fmt = QASM_FORMAT if first.lstrip().startswith(b"OPENQASM") \
+            else TEXT_FORMAT
+    if fmt == TEXT_FORMAT:
+        yield from _parse_text_chunks(_prepend(first, chunks))
+    elif fmt == QASM_FORMAT:
+        yield from _parse_qasm_chunks(_prepend(first, chunks))
+    else:
+        raise ValueError(f"Unknown circuit format '{fmt}', it must be "
+                         f"'{TEXT_FORMAT}' or '{QASM_FORMAT}'")
+
+
+def parse_string(gates_in_string, fmt=None):
+    """Parses a whole circuit given as a string
+
+    :param gates_in_string: str, e.g. "X(1, 90), Z(1, 180), CX(0,1)"
+    :param fmt: TEXT_FORMAT, QASM_FORMAT or None to detect it
+    :return: tuple of arrays (codes, qubits_1, qubits_2, angles)
+    """
+    chunks = list(iter_gate_columns(gates_in_string.encode(), fmt,
+                                    max(len(gates_in_string), 1)))
+    if not chunks:
+        return _empty_columns()
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+
+def validate_columns(codes, qubits_1, qubits_2, qubit_number):
+    """Validates the qubit indexes of many gates at once
+
+    :param codes: array of gate codes
+    :param qubits_1: array of the first (or only) qubit indexes
+    :param qubits_2: array of the second qubit indexes
+    :param qubit_number: number of the qubits of the hardware
+    """
+    is_cx = codes == CX.code
+    for qubits in (qubits_1, qubits_2[is_cx]):
+        invalid = (qubits < 0) | (qubits >= qubit_number)
+        if invalid.any():
+            raise ValueError(
+                f"'{qubits[invalid][0]}' is not valid qubit index")
+    # the pairs of gates.CX, CX(0, 1) and CX(1, 0)
+    controls, targets = qubits_1[is_cx], qubits_2[is_cx]
+    invalid = (np.minimum(controls, targets) != 0) | \
+        (np.maximum(controls, targets) != 1)
+    if invalid.any():
+        raise NotImplementedError(
+            "The index_1 and index_2 for CX gate must be given either "
+            "0 or 1 and not equal to each other. It was given: "
+            f"index_1 = {controls[invalid][0]} and "
+            f"index_2 = {targets[invalid][0]}")
+
+
+def evaluate_expression(expression, name_value):
+    """Evaluates an arithmetic expression of numbers and names with the
+    operators +, -, * and /
+
+    :param expression: str, e.g. "2 * theta - pi / 2"
+    :param name_value: function returning the value of a name
+    :return: value of the expression, SyntaxError, TypeError,
+            ZeroDivisionError or OverflowError are raised for the
+            unsupported or the wrong expressions
+    """
+    return _evaluate(ast.parse(expression.strip(), mode="eval").body,
+                     name_value)
+
+
+def _parse_text_chunks(chunks):
+    """Parses the text notation, chunks are cut after a ')'. The gates
+    may be enclosed in brackets, str of a circuit without gates is
+    '[]'."""
+    rest = b""
+    bracket = None
+    first = True
+    for chunk in chunks:
+        text = rest + chunk
+        if bracket is None:
+            stripped = text.lstrip()
+            if not stripped:
+                rest = text
+                continue
+            bracket = stripped.startswith(b"[")
+            if bracket:
+                text = stripped[1:]
+        end = text.rfind(b")") + 1
+        rest = text[end:]
+        if end:
+            yield _parse_text(text[:end], first)
+            first = False
+    if rest.strip() != (b"]" if bracket else b""):
+        raise _text_error(rest)
+
+
+@timed("parse", count=lambda columns, *_: len(columns[0]))
+def _parse_text(text, first=True):
+    """Parses complete gates of the text notation, the gates are
+    separated by a comma or by whitespace
+
+    :param text: bytes ending with the ')' of a gate
+    :param first: bool, the text starts with the first gate, so no
+            comma is allowed before it
+    """
+    if (first and text.lstrip().startswith(b",")) or \
+            _TEXT_GATES.fullmatch(b" " + text if first else text) is None:
+        raise _text_error(text)
+    tokens = text.replace(b"CX", bytes(str(CX.code), "ascii")) \
+        .translate(_TEXT_TABLE).split()
+    values = np.fromiter(map(float, tokens), dtype=np.float64,
+                         count=len(tokens)).reshape(-1, 3)
+
+    codes, qubits, last = values.T
+    is_cx = codes == CX.code
+    if not (np.isfinite(last).all() and np.abs(qubits).max() < 2 ** 62
+            and (last[is_cx] == np.round(last[is_cx])).all()):
+        raise _text_error(text)
+
+    return (codes.astype(np.int8), qubits.astype(np.int64),
+            np.where(is_cx, last, NO_QUBIT).astype(np.int64),
+            np.where(is_cx, 0.0, last))
+
+
+def _text_error(text):
+    """The error of a malformed text notation"""
+    return ValueError(
+        "The given string must be in the "
+        "following form '{Gate}({qubit}, {Angle}), "
+        "CX({qubitA}, {qubitB}), ...'. The given string = "
+        f"{text[:200].decode(errors='replace')}")
+
+
+def _parse_qasm_chunks(chunks):
+    """Parses OpenQASM 2, comments are removed only from complete lines
+    and statements are parsed only up to the last ';'"""
+    registers = {}
+    angles = {}
+    rest = b""
+    for chunk in chunks:
+        text = rest + chunk
+        lines_end = text.rfind(b"\n") + 1
+        head = _QASM_COMMENT.sub(b"", text[:lines_end])
+        end = head.rfind(b";") + 1
+        rest = head[end:] + text[lines_end:]
+        if end:
+            yield _parse_qasm(head[:end], registers, angles)
+
+    text = _QASM_COMMENT.sub(b"", rest)
+    end = text.rfind(b";") + 1
+    if end:
+        yield _parse_qasm(text[:end], registers, angles)
+    if text[end:].strip():
+        raise ValueError(f"Unfinished OpenQASM statement: "
+                         f"{text[end:end + 200].decode()}")
+
+
+@timed("parse", count=lambda columns, *_: len(columns[0]))
+def _parse_qasm(text, registers, angles):
+    """Parses complete OpenQASM statements
+
+    :param registers: dict, name -> (offset, size) of the qregs read
+    :param angles: dict, cache of the evaluated angle expressions
+    """
+    codes, qubits_1, qubits_2, thetas = [], [], [], []
+    position = 0
+    for match in _QASM_STATEMENT.finditer(text):
+        if text[position:match.start()].strip():
+            break
+        position = match.end()
+        name, parameter, arguments = match.groups()
+
+        if name in _QASM_IGNORED:
+            continue
+        if name == b"qreg":
+            register = _QASM_QUBIT.fullmatch(arguments)
+            if register is None:
+                raise ValueError(f"Malformed OpenQASM qreg: "
+                                 f"{arguments.decode()}")
+            register, size = register.groups()
+            registers[register] = (sum(size for _, size in
+                                       registers.values()), int(size))
+            continue
+        if name not in _QASM_GATES:
+            raise ValueError(f"Unsupported OpenQASM statement: "
+                             f"{match.group().strip().decode()}")
+
+        code, theta = _QASM_GATES[name]
+        qubits = [_qasm_qubit(argument, registers)
+                  for argument in arguments.split(b",")]
+        if len(qubits) != (2 if code == CX.code else 1):
+            raise ValueError(f"Wrong number of qubits in OpenQASM "
+                             f"statement: {match.group().strip().decode()}")
+        if theta is None:
+            if parameter is None:
+                raise ValueError(f"Missing angle in OpenQASM statement: "
+                                 f"{match.group().strip().decode()}")
+            theta = angles.get(parameter)
+            if theta is None:
+                theta = angles[parameter] = _qasm_angle(
+                    parameter, match.group().strip().decode())
+
+        codes.append(code)
+        qubits_1.append(qubits[0])
+        qubits_2.append(qubits[1] if code == CX.code else NO_QUBIT)
+        thetas.append(theta)
+
+    if text[position:].strip():
+        raise ValueError(f"Malformed OpenQASM statement: "
+                         f"{text[position:position + 200].decode()}")
+    return (np.array(codes, dtype=np.int8),
+            np.array(qubits_1, dtype=np.int64),
+            np.array(qubits_2, dtype=np.int64),
+            np.array(thetas, dtype=np.float64))
+
+
+def _qasm_qubit(argument, registers):
+    """Index of the qubit given as reg[i] in the hardware"""
+    match = _QASM_QUBIT.fullmatch(argument)
+    if match is None or match.group(1) not in registers:
+        raise ValueError(f"Unknown OpenQASM qubit: {argument.decode()}")
+    offset, size = registers[match.group(1)]
+    index = int(match.group(2))
+    if index >= size:
+        raise ValueError(f"'{index}' is out of the OpenQASM register "
+                         f"{match.group(1).decode()}")
+    return offset + index
+
+
+def _qasm_angle(parameter, statement):
+    """Evaluates an OpenQASM angle expression (radians) into degrees"""
+    try:
+        degrees = math.degrees(
+            evaluate_expression(parameter.decode(), _qasm_constant))
+    except (SyntaxError, TypeError, ZeroDivisionError):
+        raise ValueError(
+            f"Unsupported OpenQASM angle: {parameter.decode()}") from None
+    except OverflowError:
+        raise ValueError(f"Too large angle in OpenQASM statement: "
+                         f"{statement}") from None
+    if not math.isfinite(degrees):
+        raise ValueError(f"Not finite angle in OpenQASM statement: "
+                         f"{statement}")
+    return degrees
+
+
+def _qasm_constant(name):
+    """Value of a constant of the OpenQASM angle expressions"""
+    if name not in _QASM_CONSTANTS:
+        raise TypeError(f"unknown name {name}")
+    return _QASM_CONSTANTS[name]
+
+
+def _evaluate(node, name_value):
+    """Evaluates a node of the syntax tree of an expression"""
+    if isinstance(node, ast.Constant) and \
+            type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.Name):
+        return name_value(node.id)
+    if isinstance(node, ast.UnaryOp) and \
+            isinstance(node.op, (ast.USub, ast.UAdd)):
+        operand = _evaluate(node.operand, name_value)
+        return -operand if isinstance(node.op, ast.USub) else operand
+    if isinstance(node, ast.BinOp) and type(node.op) in _OPERATORS:
+        return _OPERATORS[type(node.op)](_evaluate(node.left, name_value),
+                                         _evaluate(node.right, name_value))
+    raise TypeError("unsupported syntax")
+
+
+def _iter_byte_chunks(source, chunk_size):
+    """Generator of byte chunks of a source"""
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for start in range(0, len(mm), chunk_size):
+                    yield mm[start:start + chunk_size]
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        for start in range(0, len(source), chunk_size):
+            yield bytes(source[start:start + chunk_size])
+    elif hasattr(source, "read"):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk.encode() if isinstance(chunk, str) else chunk
+    else:
+        pieces, size = [], 0
+        for piece in source:
+            piece = piece.encode() if isinstance(piece, str) else piece
+            pieces.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield b"".join(pieces)
+                pieces, size = [], 0
+        if pieces:
+            yield b"".join(pieces)
+
+
+def _prepend(first, chunks):
+    """Puts the first chunk back in front of the others"""
+    if first:
+        yield first
+    yield from chunks
+
+
+def _empty_columns():
+    """Columns of a circuit without gates"""
+    return (np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64))
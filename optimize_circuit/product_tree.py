@@ -0,0 +1,187 @@
+import numpy as np
+
+# the largest fraction of all the leaves holding gates, smaller windows
+# of leaves may be denser, up to full single leaves
+_ROOT_DENSITY = 0.5
+
+
+class ProductTree:
+    """Segment tree of partial products of gates given in the time order
+
+    Every gate has a leaf, every inner node holds the product of the
+    leaves of its subtree, so the root is the unitary of the whole
+    circuit. The leaves of the gates grow with the gate positions but
+    need not be contiguous, the free leaves in between hold the
+    identity. Inserted gates take free leaves next to their neighbours,
+    and when there are none, the smallest window of leaves around them
+    which stays sparse enough is spread out evenly (a packed memory
+    array). So an insertion or a deletion anywhere changes O(log^2 n)
+    leaves amortized, the leaves of all the other gates are only
+    shifted in the position index and keep their values. Leaves are
+    updated lazily: changed leaves are only marked, and the next call of
+    product recomputes the marked leaves and their ancestors level by
+    level in vectorized form.
+    """
+
+    def __init__(self, identity, multiply):
+        """Initializes an empty tree
+
+        :param identity: array, the identity element (e.g. quaternion 1)
+        :param multiply: vectorized function, multiply(a, b) is the
+                product a @ b of stacked elements
+        """
+        self._identity = np.asarray(identity)
+        self._multiply = multiply
+        self._capacity = 1
+        self._nodes = np.broadcast_to(
+            self._identity, (2,) + self._identity.shape).copy()
+        # the leaf of every gate, increasing
+        self._slots = np.zeros(0, dtype=np.int64)
+        self._dirty = []
+
+    def insert(self, position, count=1):
+        """Adds gates before the given position, their leaves are marked
+        as changed
+
+        :param position: int, index of the gate in the circuit
+        :param count: int, number of the inserted gates
+        """
+        if count <= 0:
+            return
+        slots = self._slots
+        left = int(slots[position - 1]) if position else -1
+        right = int(slots[position]) if position < len(slots) \
+            else self._capacity
+        if right - left > count:
+            self._slots = np.concatenate([
+                slots[:position], np.arange(left + 1, left + 1 + count),
+                slots[position:]])
+            self._mark_leaves(left + 1, left + 1 + count)
+            return
+
+        anchor = min(left + 1, self._capacity - 1)
+        levels = self._capacity.bit_length() - 1
+        for height in range(1, levels + 1):
+            start = anchor >> height << height
+            stop = start + (1 << height)
+            first, last = np.searchsorted(slots, [start, stop]).tolist()
+            density = 1 - (1 - _ROOT_DENSITY) * height / levels
+            if last - first + count <= density * (stop - start):
+                self._spread(first, last, count, start, stop)
+                return
+
+        capacity = self._capacity
+        while len(slots) + count > _ROOT_DENSITY * capacity:
+            capacity *= 2
+        self._reallocate(capacity)
+        self._spread(0, len(slots), count, 0, capacity)
+
+    def delete(self, position, count=1):
+        """Removes gates from the given position on, their leaves become
+        the identity
+
+        :param position: int, index of the first removed gate
+        :param count: int, number of the removed gates
+        """
+        removed = self._slots[position:position + count]
+        if not len(removed):
+            return
+        self._mark_leaves(int(removed[0]), int(removed[-1]) + 1)
+        self._slots = np.concatenate([self._slots[:position],
+                                      self._slots[position + count:]])
+        if 8 * len(self._slots) < self._capacity:
+            capacity = 1
+            while len(self._slots) > _ROOT_DENSITY * capacity:
+                capacity *= 2
+            self._reallocate(capacity)
+            self._spread(0, len(self._slots), 0, 0, capacity)
+
+    def mark(self, start, stop):
+        """Marks the gates in [start, stop) as changed"""
+        if stop > start:
+            self._mark_leaves(int(self._slots[start]),
+                              int(self._slots[stop - 1]) + 1)
+
+    def product(self, leaf_values):
+        """Returns the product of all the gates, G_n ... G_1
+
+        :param leaf_values: function returning the elements of the
+                given array of gate positions
+        :return: array, the root of the tree
+        """
+        if self._dirty:
+            ranges = _merge(self._dirty)
+            leaves = _positions(ranges)
+            positions = np.searchsorted(self._slots, leaves)
+            gates = positions < len(self._slots)
+            gates[gates] = self._slots[positions[gates]] == leaves[gates]
+            values = np.broadcast_to(
+                self._identity,
+                (len(leaves),) + self._identity.shape).copy()
+            if gates.any():
+                values[gates] = leaf_values(positions[gates])
+            self._nodes[self._capacity + leaves] = values
+            self._update([(start + self._capacity, stop + self._capacity)
+                          for start, stop in ranges])
+            self._dirty = []
+        return self._nodes[1]
+
+    def __len__(self):
+        """Return number of the gates"""
+        return len(self._slots)
+
+    def _spread(self, first, last, count, start, stop):
+        """Spreads out the leaves of the gates first...last - 1 and of
+        count gates inserted among them evenly over [start, stop)"""
+        number = last - first + count
+        spread = start + np.arange(number) * (stop - start) // max(number, 1)
+        self._slots = np.concatenate([self._slots[:first], spread,
+                                      self._slots[last:]])
+        self._mark_leaves(start, stop)
+
+    def _reallocate(self, capacity):
+        """Replaces the nodes by identities of a new number of leaves"""
+        self._capacity = capacity
+        self._nodes = np.broadcast_to(
+            self._identity, (2 * capacity,) + self._identity.shape).copy()
+        self._dirty = []
+
+    def _mark_leaves(self, start, stop):
+        """Marks the leaves in [start, stop) as changed"""
+        if self._dirty and self._dirty[-1][1] == start:
+            start = self._dirty.pop()[0]
+        self._dirty.append((start, stop))
+
+    def _update(self, ranges):
+        """Recomputes the ancestors of the nodes in the given ranges"""
+        ranges = _parents(ranges)
+        while ranges and ranges[-1][1] > 1:
+            for start, stop in ranges:
+                self._nodes[start:stop] = self._multiply(
+                    self._nodes[2 * start + 1:2 * stop:2],
+                    self._nodes[2 * start:2 * stop:2])
+            ranges = _parents(ranges)
+
+
+def _parents(ranges):
+    """Ranges of the parent nodes of the nodes in the given ranges"""
+    return _merge([(start >> 1, ((stop - 1) >> 1) + 1)
+                   for start, stop in ranges])
+
+
+def _merge(ranges):
+    """Merges overlapping and adjacent [start, stop) ranges"""
+    merged = []
+    for start, stop in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def _positions(ranges):
+    """Array of all the positions in the given [start, stop) ranges"""
+    if not ranges:
+        return np.zeros(0, dtype=int)
+    return np.concatenate([np.arange(start, stop) for start, stop in ranges])
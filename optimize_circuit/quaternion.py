@@ -0,0 +1,328 @@
+"""Fusion of X, Y and Z rotations as unit quaternions
+
+A rotation is kept as 4 real numbers (w, x, y, z) standing for the
+SU(2) matrix
+
+    w * I - 1j * (x * X + y * Y + z * Z) =
+    [[w - 1j * z, -1j * x - y],
+     [-1j * x + y, w + 1j * z]]
+
+so X(theta), Y(theta) and Z(theta) are (cos(theta/2), sin(theta/2) * axis).
+"""
+import math
+
+import numpy as np
+
+from optimize_circuit.gates import X, Y, Z
+from optimize_circuit.instrumentation import timed
+
+IDENTITY = np.array([1.0, 0.0, 0.0, 0.0])
+
+# _STRUCTURE[i, j, k] is the coefficient of the i-th component
+# in the product of the j-th and k-th basis quaternions
+_STRUCTURE = np.zeros((4, 4, 4))
+for _i, _j, _k, _sign in [
+        (0, 0, 0, 1), (0, 1, 1, -1), (0, 2, 2, -1), (0, 3, 3, -1),
+        (1, 0, 1, 1), (1, 1, 0, 1), (1, 2, 3, 1), (1, 3, 2, -1),
+        (2, 0, 2, 1), (2, 1, 3, -1), (2, 2, 0, 1), (2, 3, 1, 1),
+        (3, 0, 3, 1), (3, 1, 2, 1), (3, 2, 1, -1), (3, 3, 0, 1)]:
+    _STRUCTURE[_i, _j, _k] = _sign
+_SMALL_PRODUCT = 64
+
+# bases of the Euler decompositions, in the order of preference when
+# their costs are equal
+EULER_BASES = ("ZYZ", "ZXZ", "XYX", "XZX", "YXY", "YZY")
+# components (w, third, middle, outer axis) and handedness of ZYZ, XYX,
+# XZX, YXY and YZY, the bases computed by relabelling the axes of ZYZ
+_RELABELLINGS = np.array([[0, 1, 2, 3], [0, 3, 2, 1], [0, 2, 3, 1],
+                          [0, 3, 1, 2], [0, 1, 3, 2]])
+_HANDEDNESS = np.array([1, -1, 1, 1, -1])
+# first order rounding errors, in units of the machine epsilon, of the
+# sine and cosine of a gate and of a (four term) Hamilton product
+_GATE_ROUNDING = 2
+_PRODUCT_ROUNDING = 4
+# the scalar functions below do the same for a single run or unitary in
+# Python floats, a few gates cost far less than the numpy call overhead
+_SCALAR_IDENTITY = (1.0, 0.0, 0.0, 0.0)
+_SCALAR_RELABELLINGS = _RELABELLINGS.tolist()
+_SCALAR_HANDEDNESS = _HANDEDNESS.tolist()
+
+
+def rotation_quaternions(codes, angles, dtype=np.float64):
+    """Builds the quaternions of X, Y and Z gates straight from the angles
+
+    :param codes: array of gate codes (X.code, Y.code or Z.code)
+    :param angles: array of the angles in degrees, same shape as codes
+    :param dtype: float type of the result
+    :return: array of shape codes.shape + (4,)
+    """
+    codes = np.asarray(codes)
+    half = np.deg2rad(np.asarray(angles, dtype=dtype)) / 2
+    sin_half = np.sin(half)
+
+    quaternions = np.zeros(codes.shape + (4,), dtype=dtype)
+    quaternions[..., 0] = np.cos(half)
+    quaternions[..., 1] = np.where(codes == X.code, sin_half, 0)
+    quaternions[..., 2] = np.where(codes == Y.code, sin_half, 0)
+    quaternions[..., 3] = np.where(codes == Z.code, sin_half, 0)
+    return quaternions
+
+
+def multiply(left, right):
+    """Hamilton product of quaternions, the matrix product left @ right
+
+    :param left: array of shape (..., 4)
+    :param right: array of shape (..., 4)
+    :return: array of shape (..., 4)
+    """
+    left, right = np.asarray(left), np.asarray(right)
+    if left.size <= _SMALL_PRODUCT and right.size <= _SMALL_PRODUCT:
+        # the call overhead of one einsum is the lowest for a few elements
+        return np.einsum("ijk,...j,...k->...i", _STRUCTURE, left, right)
+
+    w1, x1, y1, z1 = left[..., 0], left[..., 1], left[..., 2], left[..., 3]
+    w2, x2, y2, z2 = \
+        right[..., 0], right[..., 1], right[..., 2], right[..., 3]
+    product = np.empty(np.broadcast_shapes(left.shape, right.shape),
+                       dtype=np.result_type(left, right))
+    product[..., 0] = w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2
+    product[..., 1] = w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2
+    product[..., 2] = w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2
+    product[..., 3] = w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2
+    return product
+
+
+@timed("fusion", count=lambda _, quaternions: quaternions.size // 4)
+def fuse(quaternions):
+    """Fuses runs of rotations given in the time order with a pairwise
+    (tree) reduction, the result of [q_1, ..., q_L] is q_L ... q_1
+
+    :param quaternions: array of shape (..., L, 4)
+    :return: normalized array of shape (..., 4)
+    """
+    while quaternions.shape[-2] > 1:
+        if quaternions.shape[-2] % 2:
+            padding = np.broadcast_to(
+                IDENTITY.astype(quaternions.dtype),
+                quaternions.shape[:-2] + (1, 4))
+            quaternions = np.concatenate([quaternions, padding], axis=-2)
+        quaternions = multiply(quaternions[..., 1::2, :],
+                               quaternions[..., 0::2, :])
+
+    fused = quaternions[..., 0, :]
+    return fused / np.linalg.norm(fused, axis=-1, keepdims=True)
+
+
+def fusion_errors(angles, starts, lengths, dtype=np.float32):
+    """Running bounds of the rounding errors of fusing runs of rotations
+    in the float type dtype, to first order in its machine epsilon
+
+    Every gate adds the rounding of its half angle in radians (growing
+    with the angle) and of its sine and cosine, every product of the
+    reduction the rounding of its sums, so the bound of a run is the sum
+    over its gates.
+
+    :param angles: array of the gate angles in degrees
+    :param starts: array of the first positions of the runs
+    :param lengths: array of the (positive) lengths of the runs
+    :param dtype: float type of the fusion
+    :return: array of the bounds of the distance of the fused
+            quaternions from the exact ones
+    """
+    per_gate = np.abs(np.deg2rad(np.asarray(angles, dtype=float))) / 2 + \
+        _GATE_ROUNDING + _PRODUCT_ROUNDING
+    running = np.concatenate([[0], np.cumsum(per_gate)])
+    starts, lengths = np.asarray(starts), np.asarray(lengths)
+    return np.finfo(dtype).eps * (running[starts + lengths] -
+                                  running[starts] - _PRODUCT_ROUNDING)
+
+
+@timed("angles", count=lambda angles, _: angles[0].size)
+def to_angles(quaternions):
+    """Converts quaternions into the parameters of OneQubitUnitary,
+    equal to the quaternion matrices up to a global phase
+
+    :param quaternions: array of shape (..., 4)
+    :return: theta, phi and lam arrays in angles, phi and lam
+            are in (-180, 180]
+    """
+    w, x, y, z = np.moveaxis(quaternions, -1, 0)
+    # U00 = |U00| exp(-1j * sigma), U10 = |U10| exp(-1j * delta)
+    sigma = np.arctan2(z, w)
+    delta = np.arctan2(x, y)
+    theta = 2 * np.arctan2(np.hypot(x, y), np.hypot(w, z))
+
+    return np.rad2deg(theta), _wrap(np.rad2deg(sigma - delta)), \
+        _wrap(np.rad2deg(sigma + delta))
+
+
+def from_angles(theta, phi, lam):
+    """Builds the quaternions of OneQubitUnitary parameters, the
+    rotations Z(lam), Y(theta), Z(phi) in the time order
+
+    :param theta: array of parameters in angles
+    :param phi: array of parameters in angles
+    :param lam: array of parameters in angles
+    :return: array of shape theta.shape + (4,)
+    """
+    half_theta = np.deg2rad(np.asarray(theta, dtype=float)) / 2
+    half_sum = np.deg2rad(np.add(phi, lam)) / 2
+    half_difference = np.deg2rad(np.subtract(phi, lam)) / 2
+    cos_theta, sin_theta = np.cos(half_theta), np.sin(half_theta)
+    return np.stack([cos_theta * np.cos(half_sum),
+                     -sin_theta * np.sin(half_difference),
+                     sin_theta * np.cos(half_difference),
+                     cos_theta * np.sin(half_sum)], axis=-1)
+
+
+def to_euler_angles(quaternions):
+    """Angles of the decompositions of quaternions in all the Euler
+    bases of EULER_BASES, computed at once
+
+    A basis A-B-A is the ZYZ one with the axes relabelled, the
+    quaternion (w, v_C, v_B, v_A) is decomposed into ZYZ (C is the third
+    axis), the angles change the sign for a left handed (C, B, A).
+
+    :param quaternions: array of shape (..., 4)
+    :return: array of shape (..., 6, 3), the angles in degrees of the
+            gates of every basis in the time order
+    """
+    quaternions = np.asarray(quaternions)
+    signs = np.where(np.arange(4) == 0, 1, _HANDEDNESS[:, np.newaxis])
+    theta, phi, lam = to_angles(quaternions[..., _RELABELLINGS] * signs)
+    angles = _HANDEDNESS[:, np.newaxis] * np.stack([lam, theta, phi],
+                                                   axis=-1)
+    # ZXZ from ZYZ, Y(theta) = Z(-90), X(theta), Z(90)
+    zxz = angles[..., 0, :] + [-90, 0, 90]
+    return np.concatenate([angles[..., :1, :], zxz[..., np.newaxis, :],
+                           angles[..., 1:, :]], axis=-2)
+
+
+@timed("fusion", count=lambda _, codes, angles: len(codes))
+def scalar_fuse(codes, angles):
+    """fuse(rotation_quaternions(codes, angles)) of one run in Python
+    floats, with the same pairwise reduction
+
+    :param codes: list of gate codes (X.code, Y.code or Z.code)
+    :param angles: list of the angles in degrees
+    :return: normalized tuple (w, x, y, z)
+    """
+    quaternions = []
+    for code, angle in zip(codes, angles):
+        half = math.radians(angle) / 2
+        sin_half = math.sin(half)
+        quaternions.append((math.cos(half),
+                            sin_half if code == X.code else 0.0,
+                            sin_half if code == Y.code else 0.0,
+                            sin_half if code == Z.code else 0.0))
+    while len(quaternions) > 1:
+        if len(quaternions) % 2:
+            quaternions.append(_SCALAR_IDENTITY)
+        quaternions = [_scalar_multiply(left, right) for left, right in
+                       zip(quaternions[1::2], quaternions[0::2])]
+
+    fused = quaternions[0] if quaternions else _SCALAR_IDENTITY
+    norm = math.sqrt(sum(component * component for component in fused))
+    return tuple(component / norm for component in fused)
+
+
+def scalar_to_angles(quaternion):
+    """to_angles of one quaternion given as a tuple (w, x, y, z)
+
+    :param quaternion: tuple (w, x, y, z)
+    :return: tuple (theta, phi, lam) in angles
+    """
+    w, x, y, z = quaternion
+    sigma = math.atan2(z, w)
+    delta = math.atan2(x, y)
+    theta = 2 * math.atan2(math.hypot(x, y), math.hypot(w, z))
+    return math.degrees(theta), _scalar_wrap(math.degrees(sigma - delta)), \
+        _scalar_wrap(math.degrees(sigma + delta))
+
+
+def scalar_from_angles(theta, phi, lam):
+    """from_angles of one unitary
+
+    :param theta: parameter in angles
+    :param phi: parameter in angles
+    :param lam: parameter in angles
+    :return: tuple (w, x, y, z)
+    """
+    half_theta = math.radians(theta) / 2
+    half_sum = math.radians(phi + lam) / 2
+    half_difference = math.radians(phi - lam) / 2
+    cos_theta, sin_theta = math.cos(half_theta), math.sin(half_theta)
+    return (cos_theta * math.cos(half_sum),
+            -sin_theta * math.sin(half_difference),
+            sin_theta * math.cos(half_difference),
+            cos_theta * math.sin(half_sum))
+
+
+def scalar_to_euler_angles(quaternion):
+    """to_euler_angles of one quaternion given as a tuple (w, x, y, z)
+
+    :param quaternion: tuple (w, x, y, z)
+    :return: list of the [first, middle, last] angles in degrees of
+            every basis of EULER_BASES
+    """
+    angles = []
+    for relabelling, handedness in zip(_SCALAR_RELABELLINGS,
+                                       _SCALAR_HANDEDNESS):
+        w, third, middle, outer = relabelling
+        theta, phi, lam = scalar_to_angles((
+            quaternion[w], handedness * quaternion[third],
+            handedness * quaternion[middle], handedness * quaternion[outer]))
+        angles.append([handedness * lam, handedness * theta,
+                       handedness * phi])
+    lam, theta, phi = angles[0]
+    angles.insert(1, [lam - 90, theta, phi + 90])
+    return angles
+
+
+def from_unitaries(unitaries):
+    """Converts 2x2 unitaries into quaternions, the global phase of
+    the unitaries is dropped
+
+    :param unitaries: array of shape (..., 2, 2)
+    :return: array of shape (..., 4)
+    """
+    unitaries = np.asarray(unitaries)
+    special = unitaries / np.sqrt(np.linalg.det(unitaries))[..., None, None]
+    return np.stack([special[..., 0, 0].real, -special[..., 1, 0].imag,
+                     special[..., 1, 0].real, -special[..., 0, 0].imag],
+                    axis=-1)
+
+
+def to_unitaries(quaternions):
+    """Converts quaternions into their SU(2) matrices
+
+    :param quaternions: array of shape (..., 4)
+    :return: array of shape (..., 2, 2)
+    """
+    w, x, y, z = np.moveaxis(quaternions, -1, 0)
+    unitaries = np.empty(w.shape + (2, 2), dtype=np.result_type(w, 1j))
+    unitaries[..., 0, 0] = w - 1j * z
+    unitaries[..., 0, 1] = -1j * x - y
+    unitaries[..., 1, 0] = -1j * x + y
+    unitaries[..., 1, 1] = w + 1j * z
+    return unitaries
+
+
+def _scalar_multiply(left, right):
+    """Hamilton product of two quaternions given as tuples"""
+    w1, x1, y1, z1 = left
+    w2, x2, y2, z2 = right
+    return (w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+            w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+            w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+            w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2)
+
+
+def _scalar_wrap(angle):
+    """Wraps an angle in degrees into (-180, 180]"""
+    return 180 - (180 - angle) % 360
+
+
+def _wrap(angles):
+    """Wraps angles in degrees into (-180, 180]"""
+    return 180 - (180 - angles) % 360
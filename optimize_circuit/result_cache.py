@@ -0,0 +1,208 @@
+"""Persistent content addressed cache of optimized circuits
+
+The optimized gates are stored in an SQLite database, so they outlive
+the process and are shared by the processes of the command line
+interface. An entry is keyed by circuit_key, the SHA-256 hash of the
+gates of the circuit (the records of binary_format) and of the
+hardware: the qubit number, the basis gates, the gate durations, the
+calibration and the precision. A changed circuit or hardware never
+meets a stale entry.
+
+optimize_cached optimizes a batch of circuits: the identical circuits
+of the batch are optimized once, the cached results are looked up with
+one query and only the misses are optimized. When the stored gates
+exceed max_bytes, the least recently used entries are removed.
+"""
+import hashlib
+import json
+import sqlite3
+
+from optimize_circuit import binary_format
+from optimize_circuit.optimize_gates import optimize_batch
+
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+# the most keys in one query, below the SQLite variable limit
+_QUERY_SIZE = 500
+
+
+class ResultCache:
+    """SQLite backed cache of optimized circuits, see circuit_key"""
+
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        """Opens the cache, the database is created if it does not exist
+
+        :param path: path of the database file, ":memory:" for a cache
+                of the current process only
+        :param max_bytes: int, the maximal size of the stored gates
+        """
+        if not isinstance(max_bytes, int) or max_bytes <= 0:
+            raise ValueError("The max_bytes of the cache must be "
+                             "a positive integer")
+        self.max_bytes = max_bytes
+        self._connection = sqlite3.connect(path, timeout=60)
+        with self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (key BLOB PRIMARY KEY, "
+                "gates BLOB NOT NULL, used INTEGER NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+        self._clock, self._bytes = self._connection.execute(
+            "SELECT COALESCE(MAX(used), 0), "
+            "COALESCE(SUM(LENGTH(gates)), 0) FROM results").fetchone()
+        self.hits = 0
+        self.misses = 0
+        self.duplicates = 0
+        self.evictions = 0
+
+    def get_many(self, keys):
+        """Looks up many circuits at once
+
+        :param keys: iterable of keys of circuit_key
+        :return: dict {key: GateStorage of the optimized gates} of the
+                found keys
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for start in range(0, len(keys), _QUERY_SIZE):
+            chunk = keys[start:start + _QUERY_SIZE]
+            found.update(self._connection.execute(
+                "SELECT key, gates FROM results WHERE key IN "
+                f"({', '.join('?' * len(chunk))})", chunk))
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        if found:
+            self._clock += 1
+            with self._connection:
+                self._connection.executemany(
+                    "UPDATE results SET used = ? WHERE key = ?",
+                    ((self._clock, key) for key in found))
+        return {key: binary_format.from_bytes(gates)
+                for key, gates in found.items()}
+
+    def put_many(self, items):
+        """Stores many optimized circuits at once, evicts the least
+        recently used entries when the cache is full
+
+        :param items: iterable of (key, GateStorage) pairs
+        """
+        self._clock += 1
+        rows = [(key, binary_format.to_bytes(storage), self._clock)
+                for key, storage in items]
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?)", rows)
+        self._bytes += sum(len(gates) for _, gates, _ in rows)
+        if self._bytes > self.max_bytes:
+            self._evict()
+
+    def clear(self):
+        """Removes all the entries, the statistics are kept"""
+        with self._connection:
+            self._connection.execute("DELETE FROM results")
+        self._bytes = 0
+
+    def statistics(self):
+        """:returns dict with the entry number, the size in bytes and
+        the hit/miss/duplicate/eviction counters, duplicates are the
+        circuits of a batch equal to an earlier circuit of the batch"""
+        lookups = self.hits + self.misses
+        return {"size": len(self),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "duplicates": self.duplicates,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
+
+    def close(self):
+        """Closes the database"""
+        self._connection.close()
+
+    def _evict(self):
+        """Removes the least recently used entries until the stored
+        gates fit into max_bytes"""
+        # other processes change the database, the size is recounted
+        self._bytes, = self._connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(gates)), 0) FROM results").fetchone()
+        stale = []
+        excess = self._bytes - self.max_bytes
+        for key, size in self._connection.execute(
+                "SELECT key, LENGTH(gates) FROM results ORDER BY used"):
+            if excess <= 0:
+                break
+            stale.append((key,))
+            excess -= size
+            self._bytes -= size
+        with self._connection:
+            self._connection.executemany(
+                "DELETE FROM results WHERE key = ?", stale)
+        self.evictions += len(stale)
+
+    def __len__(self):
+        """Return number of the cached entries"""
+        return self._connection.execute(
+            "SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+def circuit_key(circuit, hardware):
+    """The key of a circuit in ResultCache
+
+    :param circuit: QuantumCircuit or GateStorage
+    :param hardware: HardwareConfiguration
+    :return: bytes, SHA-256 digest of the gates and the hardware
+    """
+    storage = getattr(circuit, "storage", circuit)
+    calibration = hardware.calibration
+    digest = hashlib.sha256(json.dumps([
+        hardware.qubit_number, sorted(hardware.basis_gates),
+        hardware.length_x, hardware.length_y, hardware.length_z,
+        hardware.length_cx, hardware.precision, hardware.precision_tolerance,
+        calibration and calibration.fingerprint]).encode())
+    digest.update(binary_format.to_bytes(storage))
+    return digest.digest()
+
+
+def optimize_cached(circuits, hardware, cache, decomposition_cache=None):
+    """Optimizes a batch of circuits in place with a ResultCache, every
+    distinct circuit missing in the cache is optimized once
+
+    :param circuits: list of QuantumCircuit on the hardware
+    :param hardware: HardwareConfiguration
+    :param cache: ResultCache
+    :param decomposition_cache: optional DecompositionCache
+    :return: list of the circuits
+    """
+    keys = [circuit_key(circuit, hardware) for circuit in circuits]
+    results = cache.get_many(keys)
+    missing = {}
+    for key, circuit in zip(keys, circuits):
+        if key not in results:
+            missing.setdefault(key, circuit)
+    cache.duplicates += len(keys) - len(set(keys))
+
+    if hardware.qubit_number == 1:
+        # one qubit circuits are fused at once
+        for circuit, gate_list in zip(missing.values(), optimize_batch(
+                list(missing.values()), hardware, decomposition_cache)):
+            circuit.gates = gate_list
+    else:
+        for circuit in missing.values():
+            circuit.optimize()
+    for key, circuit in missing.items():
+        results[key] = circuit.storage
+    cache.put_many((key, results[key]) for key in missing)
+
+    for key, circuit in zip(keys, circuits):
+        if missing.get(key) is not circuit:
+            # copies, the circuits of a batch are edited independently
+            circuit.storage = binary_format.from_bytes(
+                binary_format.to_bytes(results[key]))
+    return circuits
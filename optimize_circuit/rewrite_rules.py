@@ -0,0 +1,167 @@
+"""Table driven rewriting of the one qubit gates of circuits
+
+RULES maps a tuple of gate codes (a window of neighbouring gates on one
+wire, in the time order) to a rule, a function of the codes and the
+angles of the window returning the replacement as a list of
+(code, angle) in the time order, or None when it does not apply. Every
+rule makes the window shorter, up to a global phase:
+
+    P(a)                -> nothing when a is a multiple of 360
+    P(a), P(b)          -> P(a + b)
+    P(180), Q(t), P(b)  -> Q(-t), P(b + 180)
+    P(a), Q(t), P(180)  -> P(a + 180), Q(-t)
+    P(a), Q(180), P(b)  -> P(a - b), Q(180)
+
+for different axes P and Q, so P(90), Q(180), P(90) becomes Q(180).
+The angles may be symbolic (optimize_circuit.parametric), such angles
+are merged but never match a condition on the angle.
+
+The gates of a wire are pushed one by one on a stack and only the
+windows ending at the top of the stack are looked up. A replacement is
+put back in front of the remaining gates (the worklist), so the windows
+made by a rewrite are checked again and a fixpoint is reached in time
+linear in the number of the gates.
+"""
+from optimize_circuit.gates import X, Y, Z, CX, GATE_TYPES
+from optimize_circuit.gate_storage import GateStorage, NO_QUBIT, \
+    INTEGER_ANGLE
+
+# the longest window of RULES
+WINDOW = 3
+
+
+def _drop_identity(codes, angles):
+    """P(a) is the identity for a multiple of 360"""
+    return [] if _equals(angles[0], 0) else None
+
+
+def _merge(codes, angles):
+    """P(a), P(b) = P(a + b)"""
+    return [(codes[0], angles[0] + angles[1])]
+
+
+def _conjugate(codes, angles):
+    """Rotations conjugated by a 180 degree rotation about another axis
+    change the sign, P(180) = -i P and P Q(t) P = Q(-t)"""
+    outer, middle = codes[0], codes[1]
+    before, theta, after = angles
+    if _equals(before, 180):
+        return [(middle, -theta), (outer, after + 180)]
+    if _equals(after, 180):
+        return [(outer, before + 180), (middle, -theta)]
+    if _equals(theta, 180):
+        return [(outer, before - after), (middle, theta)]
+    return None
+
+
+def _equals(angle, remainder):
+    """True if the angle is remainder modulo 360, symbolic angles have
+    no remainder"""
+    try:
+        return angle % 360 == remainder
+    except TypeError:
+        return False
+
+
+RULES = {}
+for _outer in (X, Y, Z):
+    RULES[(_outer.code,)] = _drop_identity
+    RULES[(_outer.code, _outer.code)] = _merge
+    for _middle in (X, Y, Z):
+        if _middle is not _outer:
+            RULES[(_outer.code, _middle.code, _outer.code)] = _conjugate
+
+
+def rewrite_gates(gate_list):
+    """Rewrites a list of one qubit gates on one wire with RULES until
+    no rule applies
+
+    :param gate_list: list of X, Y and Z gates in the time order
+    :return: list of gates, the gates not touched by a rule are the
+            given objects
+    """
+    if not gate_list:
+        return []
+    if len(gate_list) <= WINDOW and _irreducible(gate_list):
+        return list(gate_list)
+    if len(gate_list) == 2:
+        first, second = gate_list
+        if first.code == second.code and not _equals(first.theta, 0) \
+                and not _equals(second.theta, 0):
+            # _merge and then _drop_identity of the merged gate
+            angle = first.theta + second.theta
+            return [] if _equals(angle, 0) else \
+                [GATE_TYPES[first.code](first.qubit_index, angle)]
+    index = gate_list[0].qubit_index
+    nodes = _rewrite([(gate.code, gate.theta, gate) for gate in gate_list])
+    return [gate if gate is not None else GATE_TYPES[code](index, angle)
+            for code, angle, gate in nodes]
+
+
+def rewrite_storage(storage):
+    """Rewrites the one qubit gates of every wire of a circuit between
+    the CX gates acting on it
+
+    :param storage: GateStorage of the circuit
+    :return: GateStorage of the rewritten circuit, the gates of a wire
+            are put right before the next CX gate on the wire
+    """
+    rewritten = GateStorage(max(len(storage), 16))
+    runs = {}
+
+    def flush(qubit):
+        for code, angle, _ in _rewrite(runs.pop(qubit, [])):
+            rewritten.append(code, qubit, NO_QUBIT, angle,
+                             INTEGER_ANGLE if isinstance(angle, int) else 0)
+
+    for code, qubit_1, qubit_2, angle, flags in zip(
+            storage.codes.tolist(), storage.qubits_1.tolist(),
+            storage.qubits_2.tolist(), storage.angles.tolist(),
+            storage.flags.tolist()):
+        if code == CX.code:
+            flush(qubit_1)
+            flush(qubit_2)
+            rewritten.append(code, qubit_1, qubit_2, angle, flags)
+        else:
+            runs.setdefault(qubit_1, []).append(
+                (code, int(angle) if flags & INTEGER_ANGLE else angle, None))
+    for qubit in sorted(runs):
+        flush(qubit)
+    return rewritten
+
+
+def _irreducible(gate_list):
+    """True if no rule applies to a list of at most WINDOW gates, the
+    common case of the short lists checked without rewriting them"""
+    previous = None
+    for gate in gate_list:
+        if gate.code == previous or _equals(gate.theta, 0):
+            return False
+        previous = gate.code
+    return len(gate_list) < WINDOW or \
+        gate_list[0].code != gate_list[-1].code or \
+        not (_equals(gate_list[0].theta, 180) or
+             _equals(gate_list[1].theta, 180) or
+             _equals(gate_list[2].theta, 180))
+
+
+def _rewrite(nodes):
+    """Rewrites (code, angle, gate) nodes of one wire until no rule
+    applies, the nodes made by a rule have the gate None"""
+    stack = []
+    worklist = nodes[::-1]
+    while worklist:
+        stack.append(worklist.pop())
+        codes = ()
+        for size in range(1, min(WINDOW, len(stack)) + 1):
+            codes = (stack[-size][0],) + codes
+            rule = RULES.get(codes)
+            if rule is None:
+                continue
+            replacement = rule(codes, [node[1] for node in stack[-size:]])
+            if replacement is not None:
+                del stack[-size:]
+                worklist.extend((code, angle, None)
+                                for code, angle in reversed(replacement))
+                break
+    return stack
@@ -0,0 +1,232 @@
+"""Duration-aware scheduling of the gates of a circuit
+
+Gates on different qubits run in parallel, a gate starts when the
+previous gates on all its qubits are finished. Between two CX gates the
+one qubit gates of a wire only add up their lengths, so they are
+scheduled in vectorized form from the per wire cumulative sums, and only
+the CX gates, which synchronize two wires, are scheduled one by one.
+When all the CX gates act on the same two wires (two qubit circuits)
+their times are a plain cumulative sum as well. Both cases are linear in
+the number of the gates.
+
+ALAP schedules are the ASAP schedules of the reversed circuit read
+backwards, and the gates on a critical path are the ones having the
+same start time in both modes.
+"""
+import numpy as np
+
+from optimize_circuit.gates import X, Y, Z, CX
+from optimize_circuit.instrumentation import timed
+
+ASAP, ALAP = "asap", "alap"
+
+
+class Schedule:
+    """Start times of the gates of a circuit
+
+    :ivar mode: ASAP or ALAP
+    :ivar starts: array of the start times in ns, in the gate order
+    :ivar lengths: array of the gate lengths in ns
+    """
+
+    def __init__(self, mode, starts, lengths, other_starts):
+        """Initializes a schedule
+
+        :param mode: ASAP or ALAP
+        :param starts: array of the start times in ns
+        :param lengths: array of the gate lengths in ns
+        :param other_starts: array of the start times in the other mode,
+                used for the critical path
+        """
+        self.mode = mode
+        self.starts = starts
+        self.lengths = lengths
+        self._other_starts = other_starts
+
+    @property
+    def stops(self):
+        """Array of the times the gates are finished"""
+        return self.starts + self.lengths
+
+    @property
+    def duration(self):
+        """The wall-clock duration of the circuit in ns"""
+        return self.stops.max() if len(self.starts) else 0
+
+    def slacks(self):
+        """:returns array, how much every gate may be delayed (ns)
+        without making the circuit longer"""
+        asap, alap = (self.starts, self._other_starts) \
+            if self.mode == ASAP else (self._other_starts, self.starts)
+        return alap - asap
+
+    def critical_path(self):
+        """:returns array of the positions of the gates on a critical
+        path (no slack) in the time order"""
+        return np.flatnonzero(self.slacks() == 0)
+
+    def __len__(self):
+        """Return number of the scheduled gates"""
+        return len(self.starts)
+
+
+@timed("scheduling", count=lambda _, circuit, *args: len(
+    getattr(circuit, "storage", circuit)))
+def schedule(circuit, hardware, mode=ASAP):
+    """Assigns the start times to the gates of a circuit
+
+    :param circuit: QuantumCircuit or GateStorage
+    :param hardware: HardwareConfiguration, the lengths of the gates
+    :param mode: ASAP (as soon as possible) or ALAP (as late as possible)
+    :return: Schedule
+    """
+    if mode not in (ASAP, ALAP):
+        raise ValueError(f"The mode must be '{ASAP}' or '{ALAP}', "
+                         f"it was given: {mode}")
+    storage = getattr(circuit, "storage", circuit)
+    columns = (storage.codes, storage.qubits_1, storage.qubits_2)
+    lengths = gate_lengths(storage.codes, hardware, storage.qubits_1,
+                           storage.qubits_2)
+    asap = _asap(*columns, lengths)
+    alap = _alap(*columns, lengths)
+    if mode == ASAP:
+        return Schedule(ASAP, asap, lengths, alap)
+    return Schedule(ALAP, alap, lengths, asap)
+
+
+def duration(circuit, hardware):
+    """The wall-clock duration (ns) of a circuit, its gates on different
+    qubits run in parallel
+
+    :param circuit: QuantumCircuit or GateStorage
+    :param hardware: HardwareConfiguration
+    :return: the duration of the ASAP schedule
+    """
+    storage = getattr(circuit, "storage", circuit)
+    columns = (storage.codes, storage.qubits_1, storage.qubits_2)
+    lengths = gate_lengths(storage.codes, hardware, storage.qubits_1,
+                           storage.qubits_2)
+    stops = _asap(*columns, lengths) + lengths
+    return stops.max() if len(stops) else 0
+
+
+def layers(circuit):
+    """Groups the gates into layers of gates acting on different qubits,
+    every gate is in the first layer after the layers of the previous
+    gates on its qubits
+
+    :param circuit: QuantumCircuit or GateStorage
+    :return: list of arrays of the gate positions, one per layer
+    """
+    storage = getattr(circuit, "storage", circuit)
+    depths = _asap(storage.codes, storage.qubits_1, storage.qubits_2,
+                   np.ones(len(storage), dtype=np.int64))
+    order = np.argsort(depths, kind="stable")
+    return np.split(order, np.flatnonzero(np.diff(depths[order])) + 1) \
+        if len(order) else []
+
+
+def gate_lengths(codes, hardware, qubits_1=None, qubits_2=None):
+    """The lengths of gates, calibrated per qubit and per edge when the
+    hardware has a calibration and the qubits are given
+
+    :param codes: array of gate codes
+    :param hardware: HardwareConfiguration
+    :param qubits_1: array of the first (or only) qubit indexes
+    :param qubits_2: array of the second qubit indexes
+    :return: int array of the lengths in ns
+    """
+    if hardware.calibration is not None and qubits_1 is not None:
+        return hardware.gate_lengths(codes, qubits_1, qubits_2)
+    table = np.zeros(CX.code + 1, dtype=np.int64)
+    table[[X.code, Y.code, Z.code, CX.code]] = \
+        hardware.length_x, hardware.length_y, hardware.length_z, \
+        hardware.length_cx
+    return table[np.asarray(codes, dtype=np.int64)]
+
+
+def _asap(codes, qubits_1, qubits_2, lengths):
+    """Start times of the gates scheduled as soon as possible"""
+    is_cx = np.asarray(codes) == CX.code
+    cx_positions = np.flatnonzero(is_cx)
+    starts = np.zeros(len(codes), dtype=lengths.dtype)
+    if len(codes) == 0:
+        return starts
+
+    # the lengths of the one qubit gates waiting on the wire of every
+    # side of a CX gate since the previous CX gate on the wire
+    waiting = np.zeros((2, len(cx_positions)), dtype=lengths.dtype)
+    # per one qubit gate: index of the previous CX gate on its wire
+    # (-1 for none) and its start after the end of that CX gate
+    previous = np.full(len(codes), -1)
+    offsets = np.zeros(len(codes), dtype=lengths.dtype)
+    cx_ranks = np.cumsum(is_cx) - 1
+    wires = np.unique(np.concatenate([qubits_1, qubits_2[is_cx]]))
+    for wire in wires.tolist():
+        target = is_cx & (qubits_2 == wire)
+        positions = np.flatnonzero((qubits_1 == wire) | target)
+        crossing = is_cx[positions]
+        one_qubit = np.where(crossing, 0, lengths[positions])
+        # one qubit length on the wire before every gate
+        before = np.cumsum(one_qubit) - one_qubit
+        crossings = positions[crossing]
+        cx_indexes = cx_ranks[crossings]
+        segment_starts = np.concatenate([[0], before[crossing]])
+        is_target = target[crossings].astype(int)
+        waiting[is_target, cx_indexes] = \
+            before[crossing] - segment_starts[:-1]
+
+        segments = np.cumsum(crossing)[~crossing]
+        gates = positions[~crossing]
+        previous[gates] = np.concatenate([[-1], cx_indexes])[segments]
+        offsets[gates] = before[~crossing] - segment_starts[segments]
+
+    cx_lengths = lengths[cx_positions]
+    if len(wires) <= 2:
+        # every CX gate synchronizes the same two wires
+        ends = np.cumsum(waiting.max(axis=0) + cx_lengths)
+        cx_starts = ends - cx_lengths
+    else:
+        cx_starts = _synchronize(qubits_1[cx_positions].tolist(),
+                                 qubits_2[cx_positions].tolist(),
+                                 waiting.tolist(), cx_lengths.tolist())
+        cx_starts = np.array(cx_starts, dtype=lengths.dtype)
+        ends = cx_starts + cx_lengths
+
+    starts[cx_positions] = cx_starts
+    one_qubit = np.flatnonzero(~is_cx)
+    starts[one_qubit] = offsets[one_qubit] + np.where(
+        previous[one_qubit] >= 0,
+        np.concatenate([ends, [0]])[previous[one_qubit]], 0)
+    return starts
+
+
+def _synchronize(controls, targets, waiting, cx_lengths):
+    """Start times of the CX gates, one by one
+
+    :param controls: list of the control qubits
+    :param targets: list of the target qubits
+    :param waiting: lists of the one qubit lengths waiting before every
+            CX gate on its control and target wires
+    :param cx_lengths: list of the CX lengths
+    :return: list of the start times
+    """
+    ready = {}
+    starts = []
+    for control, target, waiting_control, waiting_target, length in zip(
+            controls, targets, waiting[0], waiting[1], cx_lengths):
+        start = max(ready.get(control, 0) + waiting_control,
+                    ready.get(target, 0) + waiting_target)
+        ready[control] = ready[target] = start + length
+        starts.append(start)
+    return starts
+
+
+def _alap(codes, qubits_1, qubits_2, lengths):
+    """Start times of the gates scheduled as late as possible, the ASAP
+    schedule of the reversed circuit read backwards"""
+    reversed_starts = _asap(codes[::-1], qubits_1[::-1], qubits_2[::-1],
+                            lengths[::-1])
+    stops = reversed_starts + lengths[::-1]
+    duration = stops.max() if len(stops) else 0
+    return (duration - stops)[::-1]
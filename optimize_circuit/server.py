@@ -0,0 +1,380 @@
+"""Local optimization server: python -m optimize_circuit.server
+
+The server listens on localhost TCP or on a Unix socket and speaks line
+delimited JSON. A request is {"id": ..., "circuit": "X(0, 90), ..."},
+answered by {"id": ..., "circuit": "..."} or {"id": ..., "error": "..."};
+{"stats": true} is answered by {"stats": {...}}. The responses of a
+connection come in the order the circuits are optimized, the id
+matches them with the requests.
+
+Concurrent requests are gathered into micro-batches, a batch is sent to
+the worker pool when it has max_batch circuits or max_delay seconds
+after its first request. The requests wait in a queue of max_queue
+entries and at most 2 * workers batches are in flight; when the queue
+is full the server stops reading from the connections until there is
+room again (backpressure).
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.cli import add_hardware_arguments, make_hardware, \
+    settings_from_arguments
+from optimize_circuit.decomposition_cache import DecompositionCache
+from optimize_circuit.optimize_gates import optimize_batch
+
+# the number of the latest requests the latency percentiles are taken of
+LATENCY_WINDOW = 10000
+# the longest request line in bytes
+LINE_LIMIT = 2 ** 24
+
+# per process state, set by _init_worker
+_hardware = None
+_cache = None
+
+
+class OptimizationServer:
+    """Asyncio server optimizing circuits in micro-batches"""
+
+    def __init__(self, hardware_settings, workers=1, max_batch=64,
+                 max_delay=0.005, max_queue=1024):
+        """Initializes a server, it is started with start
+
+        :param hardware_settings: dict, see cli.settings_from_arguments
+        :param workers: int, number of the processes, 1 optimizes in a
+                thread of the current process
+        :param max_batch: int, the maximal number of circuits of a batch
+        :param max_delay: float, seconds a request may wait for a batch
+                to fill up
+        :param max_queue: int, the maximal number of waiting requests
+        """
+        for name, value in (("workers", workers), ("max_batch", max_batch),
+                            ("max_queue", max_queue)):
+            if not isinstance(value, int) or value <= 0:
+                raise ValueError(f"The {name} must be a positive integer")
+        if max_delay < 0:
+            raise ValueError("The max_delay can not be negative")
+        make_hardware(hardware_settings)
+        self.hardware_settings = hardware_settings
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+
+        self._queue = None
+        self._in_flight = None
+        self._pool = None
+        self._server = None
+        self._batcher = None
+        self._batches = set()
+        self._connections = set()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._counts = {"requests": 0, "errors": 0, "batches": 0,
+                        "batched_circuits": 0, "max_queue_depth": 0}
+
+    async def start(self, host="127.0.0.1", port=0, path=None):
+        """Starts listening, on a Unix socket if path is given
+
+        :param host: str, the host of the TCP server
+        :param port: int, the port of the TCP server, 0 picks a free one
+        :param path: path of the Unix socket
+        :return: asyncio.Server
+        """
+        self._queue = asyncio.Queue(self.max_queue)
+        self._in_flight = asyncio.Semaphore(2 * self.workers)
+        pool_type = ThreadPoolExecutor if self.workers == 1 \
+            else ProcessPoolExecutor
+        self._pool = pool_type(self.workers, initializer=_init_worker,
+                               initargs=(self.hardware_settings,))
+        self._batcher = asyncio.create_task(self._batch_loop())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(
+                self._handle, path=path, limit=LINE_LIMIT)
+        else:
+            self._server = await asyncio.start_server(
+                self._handle, host, port, limit=LINE_LIMIT)
+        return self._server
+
+    async def close(self):
+        """Stops listening, waits for the batches in flight, fails the
+        waiting requests and shuts the workers down"""
+        self._server.close()
+        for connection in self._connections:
+            connection.cancel()
+        self._batcher.cancel()
+        await asyncio.gather(self._batcher, *self._batches,
+                             *self._connections, return_exceptions=True)
+        while not self._queue.empty():
+            _fail([self._queue.get_nowait()], "the server is closed")
+        await self._server.wait_closed()
+        self._pool.shutdown()
+
+    def statistics(self):
+        """:returns dict with the queue depth, the request, error and
+        batch counts, the mean batch size and the latency percentiles
+        (ms) of the latest LATENCY_WINDOW requests"""
+        counts = dict(self._counts)
+        batched = counts.pop("batched_circuits")
+        latencies = np.array(self._latencies) * 1000
+        percentiles = np.percentile(latencies, [50, 90, 99]).tolist() \
+            if len(latencies) else [0.0, 0.0, 0.0]
+        return dict(
+            counts,
+            queue_depth=self._queue.qsize() if self._queue else 0,
+            batches_in_flight=len(self._batches),
+            mean_batch_size=batched / counts["batches"]
+            if counts["batches"] else 0.0,
+            latency_ms=dict(zip(("p50", "p90", "p99"), percentiles)))
+
+    async def optimize(self, circuit):
+        """Optimizes one circuit in the next micro-batch, waits while
+        the queue is full
+
+        :param circuit: str, the notation of str(circuit)
+        :return: str, the optimized circuit
+        """
+        return await (await self._enqueue(circuit))
+
+    async def _handle(self, reader, writer):
+        """Serves the requests of one connection"""
+        connection = asyncio.current_task()
+        self._connections.add(connection)
+        try:
+            await self._serve(reader, writer)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._connections.discard(connection)
+            writer.close()
+
+    async def _serve(self, reader, writer):
+        """Reads the requests of a connection until its end"""
+        lock = asyncio.Lock()
+        responses = set()
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("a request must be a JSON object")
+            except ValueError as error:
+                await _send(writer, lock, {"error": f"bad request: {error}"})
+                continue
+            if request.get("stats"):
+                await _send(writer, lock, {"stats": self.statistics()})
+                continue
+            if not isinstance(request.get("circuit"), str):
+                await _send(writer, lock, {"id": request.get("id"),
+                                           "error": "no circuit given"})
+                continue
+            # the request is queued before the next line is read
+            future = await self._enqueue(request["circuit"])
+            response = asyncio.create_task(
+                self._respond(request.get("id"), future, writer, lock))
+            responses.add(response)
+            response.add_done_callback(responses.discard)
+        await asyncio.gather(*responses, return_exceptions=True)
+
+    async def _enqueue(self, circuit):
+        """Queues a circuit, waits while the queue is full
+
+        :return: future of the optimized circuit
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((time.perf_counter(), circuit, future))
+        self._counts["max_queue_depth"] = max(
+            self._counts["max_queue_depth"], self._queue.qsize())
+        return future
+
+    async def _respond(self, request_id, future, writer, lock):
+        """Sends the result of a request when it is ready"""
+        try:
+            response = {"id": request_id, "circuit": await future}
+        except ValueError as error:
+            response = {"id": request_id, "error": str(error)}
+        await _send(writer, lock, response)
+
+    async def _batch_loop(self):
+        """Gathers the queued requests into batches by size or deadline"""
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_delay
+            try:
+                while len(batch) < self.max_batch:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(
+                            self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                await self._in_flight.acquire()
+            except asyncio.CancelledError:
+                _fail(batch, "the server is closed")
+                raise
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _run_batch(self, batch):
+        """Optimizes a batch in the pool and resolves its requests"""
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self._pool, _optimize_circuits,
+                [circuit for _, circuit, _ in batch])
+        except Exception as error:
+            results = [(None, f"the optimization failed: {error}")] * \
+                len(batch)
+        finally:
+            self._in_flight.release()
+
+        self._counts["batches"] += 1
+        self._counts["batched_circuits"] += len(batch)
+        now = time.perf_counter()
+        for (received, _, future), (optimized, error) in zip(batch, results):
+            self._counts["requests"] += 1
+            self._latencies.append(now - received)
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(optimized)
+            else:
+                self._counts["errors"] += 1
+                future.set_exception(ValueError(error))
+
+
+def _fail(batch, message):
+    """Fails the waiting requests of a batch"""
+    for _, _, future in batch:
+        if not future.done():
+            future.set_exception(ValueError(message))
+
+
+async def _send(writer, lock, message):
+    """Writes one JSON line, the writes of a connection are serialized"""
+    async with lock:
+        writer.write(json.dumps(message).encode() + b"\n")
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def _init_worker(hardware_settings):
+    """Creates the hardware and the decomposition cache of a worker"""
+    global _hardware, _cache
+    _hardware = make_hardware(hardware_settings)
+    _cache = DecompositionCache()
+
+
+def _optimize_circuits(circuits):
+    """Optimizes the circuits of a batch in a worker
+
+    :param circuits: list of str
+    :return: list of (optimized circuit, None) or (None, error message)
+    """
+    results = [None] * len(circuits)
+    one_qubit = []
+    for position, line in enumerate(circuits):
+        circuit = QuantumCircuit(_hardware, decomposition_cache=_cache)
+        try:
+            circuit.add_from_string(line)
+            if _hardware.qubit_number != 1:
+                circuit.optimize()
+        except Exception as error:
+            # a wrong circuit fails its own request only
+            results[position] = (None, str(error))
+            continue
+        results[position] = circuit
+        one_qubit.append(position)
+
+    if _hardware.qubit_number == 1 and one_qubit:
+        # one qubit circuits of a batch are fused at once, when that
+        # fails they are optimized one by one to find the failing ones
+        try:
+            for position, gate_list in zip(one_qubit, optimize_batch(
+                    [results[position] for position in one_qubit],
+                    _hardware, _cache)):
+                results[position].gates = gate_list
+        except Exception:
+            for position in one_qubit:
+                try:
+                    results[position].optimize()
+                except Exception as error:
+                    results[position] = (None, str(error))
+    return [result if isinstance(result, tuple) else (str(result), None)
+            for result in results]
+
+
+def main(argv=None):
+    """Runs the server until it is interrupted
+
+    :param argv: list of the arguments, sys.argv[1:] if None
+    :return: int, the exit status
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m optimize_circuit.server",
+        description="Optimizes circuits sent as line delimited JSON, "
+                    'e.g. {"id": 1, "circuit": "X(0, 90), Y(0, 45)"}.')
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="host of the TCP server")
+    parser.add_argument("--port", type=int, default=8765,
+                        help="port of the TCP server")
+    parser.add_argument("--unix", default=None,
+                        help="path of a Unix socket instead of TCP")
+    add_hardware_arguments(parser)
+    parser.add_argument("-w", "--workers", type=int,
+                        default=os.cpu_count() or 1,
+                        help="number of the processes (default: CPUs)")
+    parser.add_argument("--max-batch", type=int, default=64,
+                        help="the maximal number of circuits of a batch")
+    parser.add_argument("--max-delay", type=float, default=0.005,
+                        help="seconds a request waits for its batch")
+    parser.add_argument("--max-queue", type=int, default=1024,
+                        help="the maximal number of waiting requests")
+    arguments = parser.parse_args(argv)
+    try:
+        server = OptimizationServer(
+            settings_from_arguments(arguments), arguments.workers,
+            arguments.max_batch, arguments.max_delay, arguments.max_queue)
+    except (TypeError, ValueError, OSError) as error:
+        print(f"error: {error}", file=sys.stderr)
+        return 2
+
+    async def serve():
+        listening = await server.start(arguments.host, arguments.port,
+                                       arguments.unix)
+        print(f"listening on {arguments.unix or listening.sockets[0]}",
+              file=sys.stderr)
+        try:
+            await listening.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""One pass optimization of streams of gates in bounded memory
+
+The one qubit gates of every wire are translated into the basis gates
+of the hardware, as in QuantumCircuit.add, and collected into a run
+until a CX gate acts on the wire, the run is then optimized (fused into at most
+three gates, or micro optimized) and emitted in front of the CX gate.
+When a run reaches the window size it is fused in place, so that its at
+most three gates start the rest of the run: the memory is bounded by the
+window per wire, not by the length of the circuit.
+
+The last CX gate of a wire is held back until another gate is emitted
+on one of its wires, so that a CX gate followed by the same CX gate
+with only identity runs between them cancels.
+"""
+import numpy as np
+
+from optimize_circuit.circuit import translated_rows
+from optimize_circuit.gates import CX, GATE_CODES
+from optimize_circuit.gate_storage import row_to_gate
+from optimize_circuit.optimize_gates import optimize_one_qubit_columns, \
+    micro_optimize_one_qubit_circuit
+from optimize_circuit.parser import iter_gate_columns, validate_columns, \
+    CHUNK_SIZE
+
+DEFAULT_WINDOW = 1024
+
+
+def optimize_stream(gates, hardware, window=DEFAULT_WINDOW, cache=None):
+    """Optimizes a stream of gates in one pass
+
+    :param gates: iterable of X, Y, Z and CX gates in the time order
+    :param hardware: HardwareConfiguration
+    :param window: int, the maximal number of the gates kept per wire
+    :param cache: optional DecompositionCache
+    :return: generator of the optimized gates
+    """
+    if not isinstance(window, int) or window <= 3:
+        raise ValueError("The window must be an integer larger than 3")
+    basis_codes = {GATE_CODES[name] for name in hardware.basis_gates}
+    runs = {}
+    held = {}
+    for gate in gates:
+        if not isinstance(gate, CX):
+            hardware.validate_qubit_index(gate.qubit_index)
+            run = runs.setdefault(gate.qubit_index, [])
+            if gate.code in basis_codes:
+                run.append(gate)
+            else:
+                run.extend(row_to_gate(*row) for row in translated_rows(
+                    gate, hardware.basis_gates))
+            if len(run) >= window:
+                runs[gate.qubit_index] = _optimize_run(run, hardware, cache)
+            continue
+
+        hardware.validate_qubit_index(gate.index_1)
+        hardware.validate_qubit_index(gate.index_2)
+        qubits = (gate.index_1, gate.index_2)
+        optimized = [_optimize_run(runs.pop(qubit, []), hardware, cache)
+                     for qubit in qubits]
+        previous = held.get(gate.index_1)
+        if previous is not None and previous is held.get(gate.index_2) \
+                and (previous.index_1, previous.index_2) == qubits \
+                and not any(optimized):
+            del held[gate.index_1], held[gate.index_2]
+            continue
+        for qubit, run in zip(qubits, optimized):
+            yield from _release(held, qubit)
+            yield from run
+        held[gate.index_1] = held[gate.index_2] = gate
+
+    for qubit in sorted(held.keys() | runs.keys()):
+        yield from _release(held, qubit)
+        yield from _optimize_run(runs.pop(qubit, []), hardware, cache)
+
+
+def iter_file_gates(source, fmt=None, chunk_size=CHUNK_SIZE,
+                    qubit_number=None):
+    """Streams the gates of a file in the text notation or in OpenQASM 2
+    chunk by chunk, see optimize_circuit.parser
+
+    :param source: path of a file, file object or iterable of lines
+    :param fmt: "text", "qasm" or None to detect it
+    :param chunk_size: int, size of the read chunks in bytes
+    :param qubit_number: int, validates the qubit indexes if given
+    :return: generator of X, Y, Z and CX gates
+    """
+    for codes, qubits_1, qubits_2, angles in iter_gate_columns(
+            source, fmt, chunk_size):
+        if qubit_number is not None:
+            validate_columns(codes, qubits_1, qubits_2, qubit_number)
+        for row in zip(codes.tolist(), qubits_1.tolist(),
+                       qubits_2.tolist(), angles.tolist()):
+            yield row_to_gate(*row, 0)
+
+
+def write_gates(gates, stream):
+    """Writes a stream of gates in the notation of str(circuit), gate by
+    gate
+
+    :param gates: iterable of gates
+    :param stream: text file object
+    :return: int, the number of the written gates
+    """
+    number = 0
+    for gate in gates:
+        stream.write(", " + str(gate) if number else str(gate))
+        number += 1
+    return number
+
+
+def _optimize_run(run, hardware, cache):
+    """Optimized gates of a run of one qubit gates on one wire"""
+    if len(run) <= 3:
+        return micro_optimize_one_qubit_circuit(run)
+    codes = np.array([gate.code for gate in run])
+    angles = np.array([gate.theta for gate in run], dtype=float)
+    return optimize_one_qubit_columns(codes, angles, run[0].qubit_index,
+                                      hardware, cache)
+
+
+def _release(held, qubit):
+    """Emits the CX gate held back on the qubit, if any"""
+    gate = held.pop(qubit, None)
+    if gate is not None:
+        other = gate.index_2 if gate.index_1 == qubit else gate.index_1
+        del held[other]
+        yield gate
@@ -1,6 +1,15 @@
 import numpy as np
+
+from optimize_circuit import quaternion
 from optimize_circuit.gates import X, Y, Z, OneQubitUnitary
 
+# gate types of the bases of quaternion.EULER_BASES
+EULER_GATE_TYPES = {basis: tuple({"X": X, "Y": Y, "Z": Z}[axis]
+                                 for axis in basis)
+                    for basis in quaternion.EULER_BASES}
+# angles (degrees) closer to a multiple of 360 are zero rotations
+ZERO_TOLERANCE = 1e-9
+
 
 def u_to_zxz_gates(u_one_gate: OneQubitUnitary):
     """Transforms OneQubitUnitary into ZXZ gate sequence
@@ -9,14 +18,29 @@ def u_to_zxz_gates(u_one_gate: OneQubitUnitary):
     :return: list of equivalent gates in form
             [Z(index, alpha_1), X(index, alpha_2), Z(index, alpha_3)]
     """
+    return angles_to_zxz_gates(u_one_gate.index, u_one_gate.theta,
+                               u_one_gate.phi, u_one_gate.lam)
+
+
+def angles_to_zxz_gates(index, theta, phi, lam):
+    """Builds the ZXZ gate sequence straight from the parameters of
+    a OneQubitUnitary, without constructing its matrix
+
+    :param index: index of the qubit
+    :param theta: parameter in angles
+    :param phi: parameter in angles
+    :param lam: parameter in angles
+    :return: list of gates [Z(index, alpha_1), X(index, alpha_2),
+            Z(index, alpha_3)] with zero rotations dropped
+    """
     gates = []
 
-    if (u_one_gate.lam - (np.pi / 2)) != 0:
-        gates.append(Z(u_one_gate.index, (u_one_gate.lam - (np.pi / 2))))
-    if u_one_gate.theta != 0:
-        gates.append(X(u_one_gate.index, u_one_gate.theta))
-    if (u_one_gate.phi + (np.pi / 2)) != 0:
-        gates.append(Z(u_one_gate.index, (u_one_gate.phi + (np.pi / 2))))
+    if (lam - 90) != 0:
+        gates.append(Z(index, (lam - 90)))
+    if theta != 0:
+        gates.append(X(index, theta))
+    if (phi + 90) != 0:
+        gates.append(Z(index, (phi + 90)))
 
     return gates
 
@@ -28,29 +52,195 @@ def u_to_zyz_gates(u_one_gate: OneQubitUnitary):
     :return: list of equivalent gates in form
             [Z(index, alpha_1), Y(index, alpha_2), Z(index, alpha_3)]
     """
+    return angles_to_zyz_gates(u_one_gate.index, u_one_gate.theta,
+                               u_one_gate.phi, u_one_gate.lam)
+
+
+def angles_to_zyz_gates(index, theta, phi, lam):
+    """Builds the ZYZ gate sequence straight from the parameters of
+    a OneQubitUnitary, without constructing its matrix
+
+    :param index: index of the qubit
+    :param theta: parameter in angles
+    :param phi: parameter in angles
+    :param lam: parameter in angles
+    :return: list of gates [Z(index, alpha_1), Y(index, alpha_2),
+            Z(index, alpha_3)] with zero rotations dropped
+    """
     gates = []
 
-    if u_one_gate.lam != 0:
-        gates.append(Z(u_one_gate.index, u_one_gate.lam))
-    if u_one_gate.theta != 0:
-        gates.append(Y(u_one_gate.index, u_one_gate.theta))
-    if u_one_gate.phi != 0:
-        gates.append(Z(u_one_gate.index, u_one_gate.phi))
+    if lam != 0:
+        gates.append(Z(index, lam))
+    if theta != 0:
+        gates.append(Y(index, theta))
+    if phi != 0:
+        gates.append(Z(index, phi))
 
     return gates
 
 
 def u_to_xyx_gates(u_one_gate: OneQubitUnitary):
-    pass
+    """Transforms OneQubitUnitary into XYX gate sequence
+
+    :param u_one_gate: OneQubitUnitary
+    :return: list of equivalent gates in form
+            [X(index, alpha_1), Y(index, alpha_2), X(index, alpha_3)]
+    """
+    return angles_to_euler_gates("XYX", u_one_gate.index, u_one_gate.theta,
+                                 u_one_gate.phi, u_one_gate.lam)
 
 
 def u_to_xzx_gates(u_one_gate: OneQubitUnitary):
-    pass
+    """Transforms OneQubitUnitary into XZX gate sequence
+
+    :param u_one_gate: OneQubitUnitary
+    :return: list of equivalent gates in form
+            [X(index, alpha_1), Z(index, alpha_2), X(index, alpha_3)]
+    """
+    return angles_to_euler_gates("XZX", u_one_gate.index, u_one_gate.theta,
+                                 u_one_gate.phi, u_one_gate.lam)
 
 
 def u_to_yxy_gates(u_one_gate: OneQubitUnitary):
-    pass
+    """Transforms OneQubitUnitary into YXY gate sequence
+
+    :param u_one_gate: OneQubitUnitary
+    :return: list of equivalent gates in form
+            [Y(index, alpha_1), X(index, alpha_2), Y(index, alpha_3)]
+    """
+    return angles_to_euler_gates("YXY", u_one_gate.index, u_one_gate.theta,
+                                 u_one_gate.phi, u_one_gate.lam)
 
 
 def u_to_yzy_gates(u_one_gate: OneQubitUnitary):
-    pass
+    """Transforms OneQubitUnitary into YZY gate sequence
+
+    :param u_one_gate: OneQubitUnitary
+    :return: list of equivalent gates in form
+            [Y(index, alpha_1), Z(index, alpha_2), Y(index, alpha_3)]
+    """
+    return angles_to_euler_gates("YZY", u_one_gate.index, u_one_gate.theta,
+                                 u_one_gate.phi, u_one_gate.lam)
+
+
+def angles_to_euler_gates(basis, index, theta, phi, lam):
+    """Builds the gate sequence of an Euler basis straight from the
+    parameters of a OneQubitUnitary
+
+    :param basis: str, one of quaternion.EULER_BASES, e.g. "XYX"
+    :param index: index of the qubit
+    :param theta: parameter in angles
+    :param phi: parameter in angles
+    :param lam: parameter in angles
+    :return: list of at most three gates with zero rotations dropped
+    """
+    angles = drop_zero_rotations(quaternion.to_euler_angles(
+        quaternion.from_angles(theta, phi, lam)))
+    return [gate_type(index, angle) for gate_type, angle in zip(
+        EULER_GATE_TYPES[basis],
+        angles[quaternion.EULER_BASES.index(basis)].tolist())
+        if angle != 0]
+
+
+def drop_zero_rotations(angles, tolerance=ZERO_TOLERANCE):
+    """Marks the rotations of Euler sequences which can be dropped
+
+    The rotations by a multiple of 360 degrees (up to the tolerance)
+    get the angle 0, and when the middle rotation is dropped the outer
+    ones are merged into the first one.
+
+    :param angles: array of shape (..., B, 3) of the angles in degrees
+            of the sequences in B bases
+    :param tolerance: float in degrees, or an array of shape
+            angles.shape[:-2] with a tolerance per unitary
+    :return: array of the same shape, the gates with zero angles are
+            to be dropped
+    """
+    angles = np.array(angles, dtype=float)
+    tolerance = np.expand_dims(tolerance, (-2, -1))
+    merged = _is_zero(angles[..., 1:2], tolerance)[..., 0]
+    angles[..., 0] += np.where(merged, angles[..., 2], 0)
+    angles[..., 2] *= ~merged
+    angles[_is_zero(angles, tolerance)] = 0
+    return angles
+
+
+def shorten_conjugations(angles, tolerance=ZERO_TOLERANCE):
+    """Shortens the Euler sequences P(a), Q(t), P(b) with a rotation by
+    180 degrees into two gates with the identities of
+    optimize_circuit.rewrite_rules, the first one applying of
+
+        P(180), Q(t), P(b)  -> Q(-t), P(b + 180)
+        P(a), Q(t), P(180)  -> P(a + 180), Q(-t)
+        P(a), Q(180), P(b)  -> P(a - b), Q(180)
+
+    so that no rule applies to the gates of the sequences any more.
+
+    :param angles: array of shape (..., B, 3) of the angles in degrees
+            given by drop_zero_rotations
+    :param tolerance: float in degrees, or an array of shape
+            angles.shape[:-2] with a tolerance per unitary
+    :return: array of the same shape, the gates with zero angles are
+            to be dropped
+    """
+    angles = np.asarray(angles, dtype=float)
+    tolerance = np.expand_dims(tolerance, (-2, -1))
+    half_turns = _is_zero(angles - 180, tolerance) & \
+        np.all(angles != 0, axis=-1, keepdims=True)
+    first = half_turns[..., 0]
+    last = half_turns[..., 2] & ~first
+    middle = half_turns[..., 1] & ~first & ~last
+    before, theta, after = angles[..., 0], angles[..., 1], angles[..., 2]
+    shortened = np.stack([
+        np.select([first, last, middle], [0, before + 180, before - after],
+                  before),
+        np.where(first | last, -theta, theta),
+        np.select([first, last | middle], [after + 180, 0], after)],
+        axis=-1)
+    shortened[_is_zero(shortened, tolerance)] = 0
+    return shortened
+
+
+def shorten_euler_angles(angles, tolerance=ZERO_TOLERANCE):
+    """drop_zero_rotations and shorten_conjugations of the angles of one
+    sequence in Python floats, for a single unitary
+
+    :param angles: list of the angles [a, t, b] in degrees
+    :param tolerance: float in degrees
+    :return: list of the three angles, the gates with zero angles are
+            to be dropped
+    """
+    before, theta, after = angles
+    # no angle is close to a multiple of 180, the common case
+    if tolerance <= before % 180 <= 180 - tolerance and \
+            tolerance <= theta % 180 <= 180 - tolerance and \
+            tolerance <= after % 180 <= 180 - tolerance:
+        return [before, theta, after]
+    if _is_zero_angle(theta, tolerance):
+        before, theta, after = before + after, 0, 0
+    if _is_zero_angle(before, tolerance):
+        before = 0
+    if after and _is_zero_angle(after, tolerance):
+        after = 0
+    if not (before and theta and after):
+        return [before, theta, after]
+    if _is_zero_angle(before - 180, tolerance):
+        before, theta, after = 0, -theta, after + 180
+    elif _is_zero_angle(after - 180, tolerance):
+        before, theta, after = before + 180, -theta, 0
+    elif _is_zero_angle(theta - 180, tolerance):
+        before, after = before - after, 0
+    else:
+        return [before, theta, after]
+    return [0 if _is_zero_angle(angle, tolerance) else angle
+            for angle in (before, theta, after)]
+
+
+def _is_zero_angle(angle, tolerance):
+    """_is_zero of one angle"""
+    return abs(180 - (180 - angle) % 360) < tolerance
+
+
+def _is_zero(angles, tolerance):
+    """True for the rotations by a multiple of 360 degrees"""
+    return np.abs(180 - (180 - angles) % 360) < tolerance
@@ -0,0 +1,343 @@
+"""Synthesis of two qubit unitaries with the minimal number of CX gates
+
+Follows "Minimal Universal Two-qubit Quantum Circuits" (quant-ph/0308033)
+with the KAK (Cartan) decomposition. In the magic basis M the local
+gates SU(2) x SU(2) are the real orthogonal matrices SO(4), so a unitary
+U of SU(4) is written as
+
+    M^+ U M = K_1 D K_2
+
+with K_1, K_2 in SO(4) and D diagonal. D is given by the eigenvalues of
+(M^+ U M)^T (M^+ U M), which depend only on the Weyl chamber
+coordinates (a, b, c) of U (U is locally equivalent to
+exp(i (a XX + b YY + c ZZ))). The coordinates decide the CX count:
+
+    0 CX: U is local,
+    1 CX: U is locally equivalent to CX,
+    2 CX: the eigenvalues are closed under conjugation (c = 0),
+    3 CX: any other unitary.
+
+Every unitary is matched with the template circuit of its CX count
+having the same D, the template locals then come from the K matrices
+of the two decompositions. All the steps are vectorized over stacks of
+unitaries, so many blocks are synthesized in one batched call.
+"""
+import itertools
+
+import numpy as np
+
+from optimize_circuit import quaternion
+from optimize_circuit.gates import X, Y, Z, CX, rotation_matrices, \
+    circuit_matrices
+from optimize_circuit.gate_storage import GateStorage, NO_QUBIT
+from optimize_circuit.instrumentation import timed
+from optimize_circuit.optimize_gates import choose_euler_bases, \
+    reduce_unitaries
+
+# columns of the magic basis
+MAGIC = np.array([[1, 1j, 0, 0],
+                  [0, 0, 1j, 1],
+                  [0, 0, 1j, -1],
+                  [1, -1j, 0, 0]]) / np.sqrt(2)
+# tolerance of the comparison of the eigenvalues
+TOLERANCE = 1e-7
+
+_PERMUTATIONS = np.array(list(itertools.permutations(range(4))))
+# irrational weights of the imaginary part when the real and imaginary
+# parts of a symmetric unitary are diagonalized at once
+_WEIGHTS = (np.sqrt(2) - 1 / np.e, np.pi / 7, np.sqrt(3) / 5)
+# (index_1, index_2) of the CX gates of the templates in the time order
+_CX_SKELETONS = {0: (), 1: ((0, 1),), 2: ((0, 1), (0, 1)),
+                 3: ((1, 0), (0, 1), (1, 0))}
+
+
+class TwoQubitDecomposition:
+    """KAK decompositions of stacked unitaries, M^+ U M = K_1 D K_2 up
+    to a global phase
+
+    :ivar k_1: array of shape (N, 4, 4), real orthogonal with det 1
+    :ivar phases: array of shape (N, 4), D = diag(exp(1j * phases))
+    :ivar k_2: array of shape (N, 4, 4), real orthogonal with det 1
+    """
+
+    def __init__(self, unitaries):
+        """Decomposes the unitaries
+
+        :param unitaries: array of shape (N, 4, 4)
+        """
+        unitaries = np.asarray(unitaries, dtype=complex)
+        special = unitaries / \
+            np.linalg.det(unitaries)[:, None, None] ** 0.25
+        magic = MAGIC.conj().T @ special @ MAGIC
+        squared = np.swapaxes(magic, 1, 2) @ magic
+
+        vectors = _real_eigenvectors(squared)
+        # det(vectors) = 1, so that K_2 is in SO(4)
+        vectors[:, :, 0] *= np.sign(np.linalg.det(vectors))[:, None]
+        eigenvalues = np.einsum("nji,njk,nki->ni", vectors, squared, vectors)
+        phases = np.angle(eigenvalues) / 2
+        # sum(phases) is a multiple of pi, det(D) = 1 for an even one
+        odd = np.round(phases.sum(axis=1) / np.pi).astype(int) % 2 == 1
+        phases[odd, 0] += np.pi
+
+        self.k_1 = (magic @ vectors * np.exp(-1j * phases)[:, None, :]).real
+        self.phases = phases
+        self.k_2 = np.swapaxes(vectors, 1, 2)
+
+    def coordinates(self):
+        """:returns the Weyl chamber coordinates (a, b, c) in radians
+        as an array of shape (N, 3), not reduced by the symmetries"""
+        d = self.phases
+        return np.stack([d[:, 0] + d[:, 2], d[:, 1] + d[:, 2],
+                         d[:, 0] + d[:, 1]], axis=-1) / 2
+
+    def __len__(self):
+        """Return number of the decomposed unitaries"""
+        return len(self.phases)
+
+
+@timed("synthesis", count=lambda _, unitaries, *args: len(unitaries))
+def synthesize(unitaries, hardware):
+    """Synthesizes two qubit unitaries with the minimal number of CX gates
+
+    :param unitaries: array of shape (N, 4, 4) or list of
+            TwoQubitUnitary, qubit 0 is the lowest bit
+    :param hardware: HardwareConfiguration
+    :return: list of GateStorage, the circuits equal to the unitaries
+            up to a global phase
+    """
+    unitaries = np.array([getattr(unitary, "arr", unitary)
+                          for unitary in unitaries], dtype=complex)
+    if unitaries.ndim != 3 or unitaries.shape[1:] != (4, 4):
+        raise ValueError("The unitaries must be given as 4x4 matrices")
+    if len(unitaries) == 0:
+        return []
+
+    target = TwoQubitDecomposition(unitaries)
+    cx_numbers = np.full(len(unitaries), 3)
+    layers = [None] * len(unitaries)
+    pending = np.arange(len(unitaries))
+    for cx_number in range(4):
+        inner, templates = _templates(cx_number, target, pending)
+        local_1, local_2, matched = _match(target, pending, templates)
+        if cx_number == 3:
+            matched[:] = True
+        rows = pending[matched]
+        cx_numbers[rows] = cx_number
+        _store_layers(layers, rows, cx_number, local_1[matched],
+                      local_2[matched],
+                      [layer[matched] for layer in inner])
+        pending = pending[~matched]
+        if len(pending) == 0:
+            break
+    return _to_storages(layers, cx_numbers, hardware)
+
+
+def storage_unitary(storage, chunk_size=4096):
+    """The 4x4 unitary of a two qubit circuit, multiplied chunk by chunk
+    so that the gate matrices of a long circuit are never all stored
+
+    :param storage: GateStorage of the circuit
+    :param chunk_size: int, number of the gates multiplied at once
+    :return: array of shape (4, 4)
+    """
+    unitary = np.identity(4, dtype=complex)
+    for start in range(0, len(storage), chunk_size):
+        stop = start + chunk_size
+        matrices = circuit_matrices(
+            storage.codes[start:stop], storage.qubits_1[start:stop],
+            storage.qubits_2[start:stop], storage.angles[start:stop], 2)
+        unitary = reduce_unitaries(matrices[np.newaxis])[0] @ unitary
+    return unitary
+
+
+def cx_number(unitaries):
+    """The minimal numbers of CX gates implementing the unitaries
+
+    :param unitaries: array of shape (N, 4, 4)
+    :return: int array of shape (N,)
+    """
+    target = TwoQubitDecomposition(unitaries)
+    numbers = np.full(len(target), 3)
+    pending = np.arange(len(target))
+    for count in range(3):
+        _, templates = _templates(count, target, pending)
+        matched = _match(target, pending, templates)[2]
+        numbers[pending[matched]] = count
+        pending = pending[~matched]
+    return numbers
+
+
+def _templates(cx_number, target, rows):
+    """Template circuits with the given CX count for the rows of target
+
+    :return: list of the inner layers (arrays of shape (n, 2, 2, 2) of
+            the unitaries of qubit 0 and 1) and the template unitaries
+    """
+    count = len(rows)
+    if cx_number == 0:
+        return [], np.broadcast_to(np.identity(4, dtype=complex),
+                                   (count, 4, 4))
+    if cx_number == 1:
+        return [], np.broadcast_to(CX(0, 1).arr, (count, 4, 4))
+
+    if cx_number == 2:
+        # CX(0, 1), X(0, s), Z(1, t), CX(0, 1) has the eigenvalues
+        # exp(+-1j * (s + t)), exp(+-1j * (s - t)), found by pairing
+        eigenvalues = np.exp(2j * target.phases[rows])
+        partner = 1 + np.argmin(np.abs(
+            eigenvalues[:, 1:] - eigenvalues[:, :1].conj()), axis=1)
+        others = np.ones((count, 4), dtype=bool)
+        others[:, 0] = False
+        others[np.arange(count), partner] = False
+        alpha = np.angle(eigenvalues[:, 0])
+        beta = np.angle(eigenvalues[others].reshape(count, 2)[:, 0])
+        inner = [_layer(rotation_matrices(np.full(count, X.code),
+                                          np.rad2deg(alpha + beta) / 2),
+                        rotation_matrices(np.full(count, Z.code),
+                                          np.rad2deg(alpha - beta) / 2))]
+    else:
+        # CX(1, 0), Z(0, t_1), Y(1, t_2), CX(0, 1), Y(1, t_3), CX(1, 0)
+        # has the coordinates pi/4 + t_i/2
+        t = np.rad2deg(2 * target.coordinates()[rows] - np.pi / 2)
+        identity = np.broadcast_to(np.identity(2, dtype=complex),
+                                   (count, 2, 2))
+        inner = [_layer(rotation_matrices(np.full(count, Z.code), t[:, 0]),
+                        rotation_matrices(np.full(count, Y.code), t[:, 1])),
+                 _layer(identity,
+                        rotation_matrices(np.full(count, Y.code), t[:, 2]))]
+
+    templates = _cx_unitary(*_CX_SKELETONS[cx_number][0], count)
+    for layer, (index_1, index_2) in zip(inner,
+                                         _CX_SKELETONS[cx_number][1:]):
+        templates = _kron(layer) @ templates
+        templates = _cx_unitary(index_1, index_2, count) @ templates
+    return inner, templates
+
+
+def _match(target, rows, templates):
+    """Matches the D matrices of the target rows with the templates
+
+    :return: local unitaries L and R, U = L T R up to a phase, as
+            arrays of shape (n, 4, 4) and the boolean mask of the rows
+            equivalent to their templates
+    """
+    template = TwoQubitDecomposition(templates)
+    target_d = np.exp(1j * target.phases[rows])
+    template_d = np.exp(1j * template.phases)[:, _PERMUTATIONS]
+    # D_U = i^k S Q^T D_T Q, S a diagonal of signs, Q a permutation
+    distances = np.stack([np.abs(
+        target_d[:, None, :] ** 2 - sign * template_d ** 2).max(axis=-1)
+        for sign in (1, -1)], axis=1)
+    best = distances.reshape(len(rows), -1).argmin(axis=1)
+    matched = distances.reshape(len(rows), -1)[
+        np.arange(len(rows)), best] < TOLERANCE
+    phase, permutation = np.divmod(best, len(_PERMUTATIONS))
+
+    permuted = template_d[np.arange(len(rows)), permutation]
+    signs = np.where(
+        ((target_d / (1j ** phase[:, None] * permuted)).real) < 0, -1, 1)
+    permutations = np.zeros((len(rows), 4, 4))
+    columns = np.arange(4)
+    permutations[np.arange(len(rows))[:, None],
+                 _PERMUTATIONS[permutation], columns] = 1
+    # a row of the permutation with its sign flipped keeps Q^T D Q
+    permutations[:, :, 0] *= np.linalg.det(permutations)[:, None]
+
+    k_1 = target.k_1[rows] * signs[:, None, :] @ \
+        np.swapaxes(permutations, 1, 2) @ np.swapaxes(template.k_1, 1, 2)
+    k_2 = np.swapaxes(template.k_2, 1, 2) @ permutations @ target.k_2[rows]
+    return MAGIC @ k_1 @ MAGIC.conj().T, MAGIC @ k_2 @ MAGIC.conj().T, \
+        matched
+
+
+def _store_layers(layers, rows, cx_number, left, right, inner):
+    """Stores the one qubit layers (first to last) of the matched rows"""
+    if len(rows) == 0:
+        return
+    if cx_number == 0:
+        # no CX gate, the two locals are one layer
+        outer = [_factor(left @ right)]
+    else:
+        outer = [_factor(right)] + inner + [_factor(left)]
+    for position, row in enumerate(rows.tolist()):
+        layers[row] = [layer[position] for layer in outer]
+
+
+def _to_storages(layers, cx_numbers, hardware):
+    """Lowers the layers and the CX gates between them into circuits"""
+    count = len(layers)
+    depth = np.array([len(row_layers) for row_layers in layers])
+    stacked = np.concatenate([np.stack(row_layers)
+                              for row_layers in layers])
+    # stacked (n, 2, 2, 2): the unitaries of qubit 0 and 1 of a layer
+    theta, phi, lam = quaternion.to_angles(
+        quaternion.from_unitaries(stacked))
+    codes, angles = choose_euler_bases(
+        theta.ravel(), phi.ravel(), lam.ravel(), hardware,
+        indexes=np.tile([0, 1], theta.size // 2))
+    codes, angles = codes.reshape(-1, 2, 3), angles.reshape(-1, 2, 3)
+
+    storages = []
+    offsets = np.concatenate([[0], np.cumsum(depth)])
+    for row in range(count):
+        storage = GateStorage()
+        skeleton = _CX_SKELETONS[int(cx_numbers[row])]
+        for position in range(offsets[row], offsets[row + 1]):
+            for qubit in (0, 1):
+                keep = angles[position, qubit] != 0
+                storage.extend(codes[position, qubit][keep],
+                               np.full(keep.sum(), qubit),
+                               np.full(keep.sum(), NO_QUBIT),
+                               angles[position, qubit][keep],
+                               np.zeros(keep.sum(), dtype=np.uint8))
+            layer = position - offsets[row]
+            if layer < len(skeleton):
+                storage.append(CX.code, *skeleton[layer], 0, 0)
+        storages.append(storage)
+    return storages
+
+
+def _real_eigenvectors(symmetric):
+    """Real orthogonal eigenvectors of stacked symmetric unitaries, the
+    real and imaginary parts commute and are diagonalized at once"""
+    vectors = np.empty(symmetric.shape, dtype=float)
+    pending = np.arange(len(symmetric))
+    for weight in _WEIGHTS:
+        combined = symmetric[pending].real + weight * symmetric[pending].imag
+        _, found = np.linalg.eigh(combined)
+        vectors[pending] = found
+        diagonal = np.einsum("nji,njk,nkl->nil", found,
+                             symmetric[pending], found)
+        off_diagonal = diagonal - np.einsum(
+            "nii,ij->nij", diagonal, np.identity(4))
+        pending = pending[np.abs(off_diagonal).max(axis=(1, 2)) > TOLERANCE]
+        if len(pending) == 0:
+            return vectors
+    raise ValueError("The unitaries could not be diagonalized")
+
+
+def _layer(qubit_0, qubit_1):
+    """Stacks the unitaries of qubit 0 and 1 into a layer (n, 2, 2, 2)"""
+    return np.stack([qubit_0, qubit_1], axis=1)
+
+
+def _kron(layer):
+    """The 4x4 unitaries of a layer, qubit 0 is the lowest bit"""
+    return np.einsum("nij,nkl->nikjl", layer[:, 1],
+                     layer[:, 0]).reshape(-1, 4, 4)
+
+
+def _factor(locals_):
+    """Factors stacked local 4x4 unitaries into a layer (n, 2, 2, 2),
+    the rearranged matrix of B_1 x B_0 is the rank one vec(B_1) vec(B_0)^T
+    """
+    rearranged = locals_.reshape(-1, 2, 2, 2, 2).transpose(
+        0, 1, 3, 2, 4).reshape(-1, 4, 4)
+    u, _, vh = np.linalg.svd(rearranged)
+    return _layer(vh[:, 0].reshape(-1, 2, 2), u[:, :, 0].reshape(-1, 2, 2))
+
+
+def _cx_unitary(index_1, index_2, count):
+    """Stacked matrices of the CX gate"""
+    return np.broadcast_to(CX(index_1, index_2).arr, (count, 4, 4))
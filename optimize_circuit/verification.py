@@ -0,0 +1,153 @@
+"""Batched equivalence checks of optimized circuits
+
+verify compares many (original, optimized) pairs at once. The gates of
+all the circuits of a side are padded with identities to the same
+length and fused by one batched pairwise product: one qubit circuits as
+quaternions (quaternion.fuse), two qubit circuits as 4x4 matrices. The
+pairs are compared up to the global phase by the distance
+
+    || exp(-i phi) V - U || / sqrt(2 ** qubit_number)
+
+in the Frobenius norm, phi = arg tr(U^dagger V) is the phase aligning V
+with U. Unlike the infidelity 1 - |tr(U^dagger V)| / 2 ** qubit_number,
+the distance is linear in the errors of the angles (an angle off by
+epsilon radians gives epsilon / 2), so small errors are not lost to the
+rounding. With samples given, the two qubit circuits are applied to
+the same random states instead of being fused (matrix-vector products
+are cheaper than matrix products for a few samples) and the states of
+all the samples are aligned by one phase.
+"""
+import numpy as np
+
+from optimize_circuit import quaternion
+from optimize_circuit.gates import circuit_matrices
+from optimize_circuit.instrumentation import timed
+
+DEFAULT_TOLERANCE = 1e-8
+
+
+def verify(originals, optimized, tolerance=DEFAULT_TOLERANCE,
+           samples=None, seed=None):
+    """Checks that the optimized circuits are equal to the originals up
+    to the global phase
+
+    :param originals: list of QuantumCircuit
+    :param optimized: list of QuantumCircuit of the same hardware
+    :param tolerance: float, the largest accepted distance
+    :param samples: int, number of the random states of two qubit
+            circuits, None compares the unitaries
+    :param seed: seed of the random states
+    :return: boolean array, True for the pairs which are not equal
+    """
+    return distances(originals, optimized, samples, seed) > tolerance
+
+
+@timed("verification", count=lambda _, originals, optimized, *args: sum(
+    len(circuit) for circuit in originals) + sum(
+    len(circuit) for circuit in optimized))
+def distances(originals, optimized, samples=None, seed=None):
+    """The distances of (original, optimized) pairs up to the global
+    phase, see verify
+
+    :param originals: list of QuantumCircuit
+    :param optimized: list of QuantumCircuit of the same hardware
+    :param samples: int, number of the random states of two qubit
+            circuits, None compares the unitaries
+    :param seed: seed of the random states
+    :return: array of the distances, one per pair
+    """
+    if len(originals) != len(optimized):
+        raise ValueError("The numbers of the original and the optimized "
+                         f"circuits differ: {len(originals)} and "
+                         f"{len(optimized)}")
+    if not len(originals):
+        return np.zeros(0)
+    qubit_number = originals[0].hardware.qubit_number
+    if samples is not None and (not isinstance(samples, int) or
+                                samples <= 0):
+        raise ValueError("The samples must be a positive integer")
+
+    if qubit_number == 1:
+        before, after = (_fused_quaternions(circuits)
+                         for circuits in (originals, optimized))
+        # the phase of SU(2) rotations is the sign of the quaternion
+        signs = np.where(np.sum(before * after, axis=-1) < 0, -1.0, 1.0)
+        return np.linalg.norm(signs[:, np.newaxis] * after - before,
+                              axis=-1)
+
+    dimension = 2 ** qubit_number
+    if samples is None:
+        before, after = (_fused_matrices(circuits, qubit_number)
+                         for circuits in (originals, optimized))
+        return _aligned_distances(before, after) / np.sqrt(dimension)
+
+    rng = np.random.default_rng(seed)
+    states = rng.normal(size=(len(originals), dimension, samples)) + \
+        1j * rng.normal(size=(len(originals), dimension, samples))
+    states /= np.linalg.norm(states, axis=(-2, -1), keepdims=True)
+    before, after = (_applied(circuits, qubit_number, states)
+                     for circuits in (originals, optimized))
+    return _aligned_distances(before, after)
+
+
+def _aligned_distances(before, after):
+    """Frobenius norms of exp(-i phi) after - before over the last two
+    axes, phi aligns the phases"""
+    overlaps = np.sum(before.conj() * after, axis=(-2, -1))
+    phases = np.exp(-1j * np.angle(overlaps))[:, np.newaxis, np.newaxis]
+    return np.linalg.norm(phases * after - before, axis=(-2, -1))
+
+
+def _padded(circuits, values, identity):
+    """Scatters the values of the concatenated gates of the circuits
+    into an array of shape (len(circuits), L) + identity.shape padded
+    with the identity, L is the length of the longest circuit"""
+    lengths = np.array([len(circuit) for circuit in circuits])
+    padded = np.broadcast_to(identity, (len(circuits), max(
+        lengths.max(), 1)) + identity.shape).copy()
+    starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    padded[np.repeat(np.arange(len(circuits)), lengths),
+           np.arange(lengths.sum()) - starts] = values
+    return padded
+
+
+def _columns(circuits):
+    """The concatenated codes, qubits and angles of the circuits"""
+    storages = [getattr(circuit, "storage", circuit) for circuit in circuits]
+    return [np.concatenate([getattr(storage, name) for storage in storages])
+            for name in ("codes", "qubits_1", "qubits_2", "angles")]
+
+
+def _fused_quaternions(circuits):
+    """The quaternions of one qubit circuits, shape (len(circuits), 4)"""
+    codes, _, _, angles = _columns(circuits)
+    return quaternion.fuse(_padded(
+        circuits, quaternion.rotation_quaternions(codes, angles),
+        quaternion.IDENTITY))
+
+
+def _matrices(circuits, qubit_number):
+    """The padded gate matrices of the circuits, shape
+    (len(circuits), L, 2 ** qubit_number, 2 ** qubit_number)"""
+    return _padded(circuits, circuit_matrices(*_columns(circuits),
+                                              qubit_number),
+                   np.identity(2 ** qubit_number, dtype=complex))
+
+
+def _fused_matrices(circuits, qubit_number):
+    """The unitaries of the circuits by a pairwise reduction"""
+    matrices = _matrices(circuits, qubit_number)
+    identity = np.identity(2 ** qubit_number, dtype=complex)
+    while matrices.shape[1] > 1:
+        if matrices.shape[1] % 2:
+            matrices = np.concatenate([matrices, np.broadcast_to(
+                identity, (len(matrices), 1) + identity.shape)], axis=1)
+        matrices = matrices[:, 1::2] @ matrices[:, 0::2]
+    return matrices[:, 0]
+
+
+def _applied(circuits, qubit_number, states):
+    """The states after the gates of the circuits, gate by gate"""
+    for matrices in np.moveaxis(_matrices(circuits, qubit_number), 1, 0):
+        states = matrices @ states
+    return states
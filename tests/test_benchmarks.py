@@ -0,0 +1,15 @@
+from benchmarks.suite import run, compare, case_name
+
+
+def test_benchmarks():
+    results = run(["micro_optimize", "decompositions"], quick=True,
+                  min_time=0.001, repeat=1)
+    assert case_name("micro_optimize", 2, 1) in results
+    assert all(result["seconds"] > 0 for result in results.values())
+    assert compare(results, results) == []
+
+    faster = {case: {"seconds": result["seconds"] / 2,
+                     "relative": result["relative"] / 2}
+              for case, result in results.items()}
+    assert [case for case, _ in compare(results, faster, 1.5)] == \
+        list(results)
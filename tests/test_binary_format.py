@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from optimize_circuit import binary_format
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+
+
+def test_binary_format(tmp_path):
+    hardware = HardwareConfiguration(2, basis_gates={'X', 'Z', 'CX'})
+    hardware.length_cx = 250
+    circuit = QuantumCircuit(hardware)
+    circuit.add_from_string("Z(0, 90), X(1, 12.5), CX(0, 1), Z(1, -45)")
+    path = tmp_path / "circuit.oqc"
+    circuit.save(path)
+
+    loaded = QuantumCircuit.load(path)
+    assert str(loaded) == str(circuit)
+    assert loaded.hardware.basis_gates == {'X', 'Z', 'CX'}
+    assert loaded.hardware.length_cx == 250
+    # the columns are views of the memory-mapped file
+    assert isinstance(loaded.storage.angles.base, np.memmap)
+    assert np.allclose(loaded.unitary(), circuit.unitary())
+
+    tail = QuantumCircuit(hardware)
+    tail.add_from_string("CX(1, 0), X(0, 30)")
+    tail.append_to(path)
+    assert binary_format.gate_number(path) == 6
+    part = QuantumCircuit.load(path, hardware, start=2, stop=5)
+    assert str(part) == "CX(0, 1), Z(1, -45.0), CX(1, 0)"
+
+    # changes of a loaded circuit never reach the file
+    part.delete(0)
+    part.add(part.gates[0])
+    assert str(QuantumCircuit.load(path)).endswith(
+        "CX(0, 1), Z(1, -45.0), CX(1, 0), X(0, 30.0)")
+
+    empty = tmp_path / "empty.oqc"
+    QuantumCircuit(hardware).save(empty)
+    assert len(QuantumCircuit.load(empty)) == 0
+
+    with pytest.raises(ValueError):
+        QuantumCircuit.load(path, HardwareConfiguration(1))
+    with pytest.raises(ValueError):
+        QuantumCircuit.load(
+            path, HardwareConfiguration(2, basis_gates={'Y', 'Z', 'CX'}))
+    one_qubit = QuantumCircuit(HardwareConfiguration(1))
+    one_qubit.add_from_string("X(0, 10)")
+    one_qubit.save(empty)
+    with pytest.raises(ValueError):
+        tail.append_to(empty)
+    (tmp_path / "text.txt").write_text("X(0, 90)")
+    with pytest.raises(ValueError):
+        QuantumCircuit.load(tmp_path / "text.txt")
@@ -0,0 +1,92 @@
+import json
+
+import numpy as np
+import pytest
+
+from optimize_circuit.calibration import Calibration, load_calibration
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.decomposition_cache import DecompositionCache
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+
+
+def test_load_calibration(tmp_path):
+    entries = [{"gate": "X", "qubit": 1, "length": 50, "error": 1e-3},
+               {"gate": "CX", "qubit": 1, "target": 0, "length": 400}]
+    json_path = tmp_path / "calibration.json"
+    json_path.write_text(json.dumps({"gates": entries}))
+    csv_path = tmp_path / "calibration.csv"
+    csv_path.write_text("gate,qubit,target,length,error\n"
+                        "X,1,,50,0.001\nCX,1,0,400,\n")
+    calibrations = [load_calibration(json_path),
+                    load_calibration(csv_path, 2)]
+    assert calibrations[0].fingerprint == calibrations[1].fingerprint
+
+    hardware = HardwareConfiguration(2)
+    hardware.calibration = calibrations[0]
+    assert hardware.one_qubit_lengths.tolist() == [[10, 10, 10],
+                                                   [50, 10, 10]]
+    assert hardware.cx_lengths.tolist() == [[100, 100], [400, 100]]
+    hardware.length_cx = 200
+    assert hardware.gate_lengths([0, 0, 3, 3], [0, 1, 0, 1],
+                                 [-1, -1, 1, 0]).tolist() == \
+        [10, 50, 200, 400]
+    assert hardware.gate_errors([0, 0], [0, 1], [-1, -1]).tolist() == \
+        [0, 1e-3]
+
+    for bad in ([("X", 2, None, 10, None)], [("CX", 0, 0, 10, None)],
+                [("X", 0, None, 10.5, None)], [("H", 0, None, 10, None)],
+                [("Y", 0, None, 10, 2.0)]):
+        with pytest.raises(ValueError):
+            Calibration(2, bad)
+    # wrong fields of a file raise ValueError naming the entry
+    for bad in ({"gate": "X", "length": 50}, {"gate": "X", "qubit": 0,
+                                              "length": 50, "error": "low"},
+                {"gate": "X", "qubit": 0, "length": "50"},
+                {"gate": "X", "qubit": 0, "target": "a", "length": 50},
+                {"gate": ["X"], "qubit": 0, "length": 50}):
+        json_path.write_text(json.dumps({"gates": entries + [bad]}))
+        with pytest.raises(ValueError, match="Bad calibration entry"):
+            load_calibration(json_path)
+    for bad in ("X,,,50,\n", "X,0,,50,low\n", "X,0\n"):
+        csv_path.write_text("gate,qubit,target,length,error\n" + bad)
+        with pytest.raises(ValueError, match="Bad calibration row"):
+            load_calibration(csv_path)
+    with pytest.raises(ValueError):
+        HardwareConfiguration(1).calibration = calibrations[0]
+    with pytest.raises(TypeError):
+        hardware.length_cx = 1.5
+    with pytest.raises(ValueError):
+        hardware.length_cx = 0
+
+
+def test_calibrated_optimization():
+    # Z is slow on qubit 0 and X on qubit 1, the runs avoid them
+    hardware = HardwareConfiguration(2)
+    hardware.calibration = Calibration(2, [("Z", 0, None, 100, None),
+                                           ("X", 1, None, 100, None)])
+    circuit = QuantumCircuit(hardware,
+                             decomposition_cache=DecompositionCache())
+    run = "X({0}, 30), Y({0}, 40), Z({0}, 50), X({0}, 60), Y({0}, 20)"
+    circuit.add_from_string(", ".join([run.format(0), run.format(1)]))
+    original = circuit.unitary()
+    circuit.optimize()
+    storage = circuit.storage
+    assert not np.any((storage.qubits_1 == 1) & (storage.codes == 0))
+    assert not np.any((storage.qubits_1 == 0) & (storage.codes == 2))
+    overlap = np.trace(original.conj().T @ circuit.unitary()) / 4
+    assert np.isclose(abs(overlap), 1)
+    assert circuit.stats()["qubit_durations"] == [30, 30]
+    assert hardware.duration_of_codes(
+        storage.codes, storage.qubits_1, storage.qubits_2) == \
+        circuit.stats()["duration"]
+    assert hardware.duration_of_codes([2, 2, 0], [0, 1, 1],
+                                      [-1, -1, -1]) == 210
+    with pytest.raises(ValueError):
+        hardware.duration_of_codes(storage.codes)
+    # the error rates resolve equal durations
+    hardware.calibration = Calibration(2, [("Z", 0, None, 10, 0.01)])
+    circuit = QuantumCircuit(hardware)
+    circuit.add_from_string(run.format(0))
+    circuit.optimize()
+    assert 2 not in circuit.storage.codes.tolist()
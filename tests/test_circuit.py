@@ -1,4 +1,8 @@
+import numpy as np
+
 from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.gates import X, Y, Z, CX
+from optimize_circuit.gate_statistics import GateStatistics
 from optimize_circuit.hardware_configuration \
     import HardwareConfiguration
 
@@ -27,3 +31,195 @@ def test_parser():
     assert str(circuit3) == "X(0, 180.0), Z(0, -90), X(0, 67.0), " \
                             "Z(0, 90), X(0, 5.0), Z(0, -90), " \
                             "X(0, 55.0), Z(0, 90)"
+
+
+def test_columnar_storage():
+    two_qubit_hardware = HardwareConfiguration(
+        2, basis_gates={'X', 'Z', 'CX'})
+    gates_string = "X(0, 180.0), Y(1, 67.0), CX(0, 1), Z(1, 5.0), CX(1, 0)"
+
+    from_string = QuantumCircuit(two_qubit_hardware)
+    from_string.add_from_string(gates_string)
+
+    gate_by_gate = QuantumCircuit(two_qubit_hardware)
+    for gate in [X(0, 180.0), Y(1, 67.0), CX(0, 1), Z(1, 5.0), CX(1, 0)]:
+        gate_by_gate.add(gate)
+
+    assert str(from_string) == str(gate_by_gate) == \
+        "X(0, 180.0), Z(1, -90), X(1, 67.0), Z(1, 90), CX(0, 1), " \
+        "Z(1, 5.0), CX(1, 0)"
+    assert len(from_string) == 7
+    assert from_string.get_cx_number() == 2
+    assert from_string.get_x_number() == 2
+    assert from_string.get_y_number() == 0
+    assert from_string.get_z_number() == 3
+
+    gates = from_string.gates
+    assert isinstance(gates[-1], CX) and gates[-1].index_1 == 1
+    assert isinstance(gates[1], Z) and gates[1].theta == -90
+    assert ", ".join(str(gate) for gate in gates) == str(from_string)
+
+
+def test_incremental_unitary():
+    rng = np.random.default_rng(3)
+    for hardware in (xz_hardware, HardwareConfiguration(2)):
+        circuit = QuantumCircuit(hardware)
+        for step in range(300):
+            qubit = int(rng.integers(hardware.qubit_number))
+            gate_type = (X, Y, Z)[rng.integers(3)]
+            gate = gate_type(qubit, float(rng.uniform(-180, 180)))
+            if hardware.qubit_number == 2 and step % 5 == 0:
+                gate = CX(qubit, 1 - qubit)
+
+            action = rng.integers(4) if len(circuit) else 0
+            if action == 0:
+                circuit.add(gate)
+            elif action == 1:
+                circuit.insert(int(rng.integers(len(circuit) + 1)), gate)
+            elif action == 2:
+                circuit.delete(int(rng.integers(len(circuit))))
+            else:
+                circuit.replace(int(rng.integers(len(circuit))), gate)
+
+            if step % 7 == 0:
+                expected = np.identity(2 ** hardware.qubit_number)
+                for gate in circuit.gates:
+                    matrix = gate.arr
+                    if hardware.qubit_number == 2 and not isinstance(gate,
+                                                                     CX):
+                        matrix = np.kron(matrix, np.identity(2)) \
+                            if gate.qubit_index == 1 \
+                            else np.kron(np.identity(2), matrix)
+                    expected = matrix @ expected
+                assert np.allclose(circuit.unitary(), expected)
+
+
+def test_local_unitary_updates():
+    circuit = QuantumCircuit(xz_hardware)
+    circuit.add_from_string(", ".join(
+        f"X(0, {angle})" for angle in range(-500, 500)))
+    circuit.unitary()
+    leaf_values = circuit._leaf_values
+    recomputed = []
+    circuit._leaf_values = lambda positions: \
+        recomputed.append(len(positions)) or leaf_values(positions)
+
+    # edits at the front keep the leaves of the gates after them
+    for step in range(100):
+        if step % 3:
+            circuit.insert(0, Z(0, step))
+        else:
+            circuit.delete(0)
+        circuit.unitary()
+    assert sum(recomputed) < 10 * 100
+
+    expected = np.identity(2)
+    for gate in circuit.gates:
+        expected = gate.arr @ expected
+    assert np.allclose(circuit.unitary(), expected)
+
+
+def test_streaming_parser():
+    two_qubit_hardware = HardwareConfiguration(2)
+    circuit = QuantumCircuit(two_qubit_hardware)
+    circuit.add_from_file(["X(0,90.0),\n", "Z( 1 , -45 )  CX(1,0)"],
+                          chunk_size=4)
+    assert str(circuit) == "X(0, 90.0), Z(1, -45.0), CX(1, 0)"
+
+    qasm = "OPENQASM 2.0;\ninclude \"qelib1.inc\";\n" \
+           "qreg a[1];\nqreg b[1];\n// comment; with a semicolon\n" \
+           "rx(pi/2) a[0];\ntdg b[0];\ncx b[0], a[0];\n"
+    from_qasm = QuantumCircuit(two_qubit_hardware)
+    from_qasm.add_from_file(qasm.splitlines(keepends=True), chunk_size=3)
+    assert str(from_qasm) == str(circuit)
+
+    for wrong in ["X(0, 90), Z(1 45)", "X(0, 90), W(0, 45)", "X(2, 90)",
+                  "OPENQASM 2.0; qreg q[1]; h q[0];", "X(0, 9X)",
+                  "X(0, 4Z5)", "XY(0, 90)", "X(0 90), Y(0, 1, )",
+                  "X(0, 90),, Y(0, 1)", ", X(0, 90)", "X(0, 90),",
+                  "[X(0, 90)", "CX(0, 1.5)"]:
+        try:
+            QuantumCircuit(two_qubit_hardware).add_from_string(wrong)
+        except ValueError:
+            pass
+        else:
+            assert False, wrong
+    # overflowing and not finite angles, the error names the statement
+    for angle in ("1" * 400, "1e999", "1e308 * 10", "-2 * 1e308"):
+        statement = f"rz({angle}) q[0];"
+        try:
+            QuantumCircuit(two_qubit_hardware).add_from_string(
+                f"OPENQASM 2.0; qreg q[1]; {statement}")
+        except ValueError as error:
+            assert statement in str(error)
+        else:
+            assert False, angle
+    for wrong in ["rz(theta) q[0];", "rz(pi ** 2) q[0];",
+                  "rz(__import__) q[0];", "rz(1 / 0) q[0];"]:
+        try:
+            QuantumCircuit(two_qubit_hardware).add_from_string(
+                f"OPENQASM 2.0; qreg q[1]; {wrong}")
+        except ValueError:
+            pass
+        else:
+            assert False, wrong
+    empty = QuantumCircuit(two_qubit_hardware)
+    empty.add_from_string(" [] ")
+    assert len(empty) == 0
+
+    # CX acts on the qubits 0 and 1 only, as gates.CX
+    try:
+        QuantumCircuit(HardwareConfiguration(3)).add_from_string("CX(1, 2)")
+    except NotImplementedError:
+        pass
+    else:
+        assert False
+
+
+def test_gate_matrices():
+    # gates have no instance dictionaries and share read-only matrices
+    gate = X(0, 90)
+    assert not hasattr(gate, "__dict__")
+    assert gate.arr is X(1, 90).arr and gate.arr is not Y(0, 90).arr
+    assert not gate.arr.flags.writeable
+    assert CX(0, 1).arr is CX(0, 1).arr
+    assert np.allclose(Z(0, 180).arr, [[-1j, 0], [0, 1j]])
+    assert np.allclose(Y(0, 90).arr @ Y(0, -90).arr, np.identity(2))
+    gate.theta = 180
+    assert np.allclose(gate.arr, [[0, -1j], [-1j, 0]])
+    assert str(gate) == "X(0, 180)"
+
+
+def test_gate_statistics():
+    hardware = HardwareConfiguration(2, basis_gates={'X', 'Z', 'CX'})
+    hardware.length_z = 20
+    circuit = QuantumCircuit(hardware)
+    circuit.add_from_string("X(0, 90), Y(1, 45), CX(0, 1), Z(1, -170)")
+    assert circuit.get_x_number() == 2 and circuit.get_z_number() == 3
+
+    rng = np.random.default_rng(24)
+    for _ in range(200):
+        edit = rng.integers(4)
+        gate = [X(0, 30), Y(1, 400), Z(0, -185.5), CX(1, 0)][rng.integers(4)]
+        if edit == 0:
+            circuit.add(gate)
+        elif edit == 1:
+            circuit.insert(int(rng.integers(len(circuit) + 1)), gate)
+        elif edit == 2 and len(circuit):
+            circuit.delete(int(rng.integers(len(circuit))))
+        elif len(circuit):
+            circuit.replace(int(rng.integers(len(circuit))), gate)
+        assert circuit.stats() == GateStatistics.from_storage(
+            circuit.storage, 2).summary(hardware)
+
+    statistics = circuit.stats()
+    assert statistics["gates"] == len(circuit)
+    assert statistics["counts"]["CX"] == circuit.get_cx_number()
+    assert statistics["duration"] == hardware.duration_of_codes(
+        circuit.storage.codes, circuit.storage.qubits_1,
+        circuit.storage.qubits_2)
+    assert sum(statistics["angle_histograms"]["X"]) == \
+        circuit.get_x_number()
+    circuit.optimize()
+    assert circuit.get_x_number() == np.count_nonzero(
+        circuit.storage.codes == X.code)
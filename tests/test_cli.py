@@ -0,0 +1,71 @@
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit import cli
+from optimize_circuit.cli import main
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+
+
+def test_cli(tmp_path, capsys):
+    lines = ["X(0, 90), Y(0, 45), Z(0, 30), X(0, 10)", "",
+             "Z(0, 90), X(0, 180), Z(0, 90)", "Y(0, 35.5)",
+             "X(0, 15), X(0, 20), Y(0, 40), Z(0, 10), X(0, 5)"] * 5
+    source = tmp_path / "circuits.txt"
+    source.write_text("\n".join(lines) + "\n")
+    hardware = HardwareConfiguration(1, basis_gates={'X', 'Z', 'CX'})
+    hardware.length_z = 20
+
+    expected = []
+    for line in lines:
+        circuit = QuantumCircuit(hardware)
+        circuit.add_from_string(line)
+        circuit.optimize()
+        expected.append(str(circuit) if line else "")
+
+    for workers in ("1", "3"):
+        target = tmp_path / f"optimized_{workers}.txt"
+        assert main([str(source), "-o", str(target), "-b", "X,Z,CX",
+                     "--length-z", "20", "-w", workers, "-c", "2"]) == 0
+        assert target.read_text().splitlines() == expected
+        assert f"{len(lines)} circuits in" in capsys.readouterr().err
+
+    cache = str(tmp_path / "results.sqlite")
+    for workers in ("1", "2"):
+        target = tmp_path / "cached.txt"
+        assert main([str(source), "-o", str(target), "-b", "X,Z,CX",
+                     "--length-z", "20", "-w", workers, "-c", "4",
+                     "--result-cache", cache]) == 0
+        assert target.read_text().splitlines() == expected
+    assert f"{len(lines)} of {len(lines)} circuits reused" in \
+        capsys.readouterr().err
+
+    source.write_text("X(0, 90)\nX(1, 90)\n")
+    assert main([str(source), "-w", "1", "--quiet"]) == 1
+    assert "line 2" in capsys.readouterr().err
+
+    missing = str(tmp_path / "missing.txt")
+    assert main([missing, "-w", "1"]) == 2
+    assert "error:" in capsys.readouterr().err
+    assert main([str(source), "-o", str(tmp_path), "-w", "1"]) == 2
+    assert "error:" in capsys.readouterr().err
+
+
+def test_cli_line_errors(tmp_path, capsys, monkeypatch):
+    optimize = QuantumCircuit.optimize
+
+    def failing_optimize(circuit):
+        if any(getattr(gate, "theta", 0) == 13 for gate in circuit.gates):
+            raise OverflowError("math range error")
+        optimize(circuit)
+
+    def failing_batch(circuits, *args):
+        raise ArithmeticError("the batch failed")
+
+    monkeypatch.setattr(QuantumCircuit, "optimize", failing_optimize)
+    monkeypatch.setattr(cli, "optimize_batch", failing_batch)
+    source = tmp_path / "circuits.txt"
+    source.write_text("X(0, 90), Y(0, 45)\nX(0, 13), Y(0, 45)\n")
+    # per circuit on two qubits, at once per chunk on one qubit
+    for qubits in ("2", "1"):
+        assert main([str(source), "-q", qubits, "-w", "1",
+                     "--quiet"]) == 1
+        assert "error: line 2: math range error" in capsys.readouterr().err
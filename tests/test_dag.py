@@ -0,0 +1,36 @@
+import numpy as np
+
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.dag import CircuitDAG
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+
+hardware = HardwareConfiguration(2)
+
+
+def test_cancel_commuting():
+    for gates_string, expected in [
+            ("CX(0, 1), Z(0, 30), X(1, 20), CX(0, 1)",
+             "Z(0, 30.0), X(1, 20.0)"),
+            ("Z(0, 30), CX(0, 1), Z(0, 15), CX(0, 1), Z(0, 45)",
+             "Z(0, 90.0)"),
+            ("X(1, 30), CX(0, 1), X(1, -30), CX(0, 1)", "[]"),
+            ("CX(0, 1), Y(1, 20), CX(0, 1), X(0, 10), CX(1, 0), X(0, 5)",
+             "CX(0, 1), Y(1, 20.0), CX(0, 1), X(0, 15.0), CX(1, 0)"),
+            ("CX(0, 1), X(0, 90), CX(0, 1)",
+             "CX(0, 1), X(0, 90.0), CX(0, 1)")]:
+        circuit = QuantumCircuit(hardware)
+        circuit.add_from_string(gates_string)
+        expected_unitary = circuit.unitary()
+
+        dag = circuit.to_dag()
+        dag.cancel_commuting()
+        lowered = QuantumCircuit.from_dag(dag, hardware)
+        assert str(lowered) == expected
+        overlap = np.trace(expected_unitary.conj().T @ lowered.unitary())
+        assert np.isclose(abs(overlap), 4)
+
+    dag = CircuitDAG.from_storage(circuit.storage)
+    assert dag.successors(0) == [1, 2]
+    assert dag.predecessors(2) == [1, 0]
+    assert dag.wire(1).tolist() == [0, 2]
@@ -0,0 +1,32 @@
+import json
+
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.gates import Y
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+from optimize_circuit.instrumentation import Instrumentation, recording
+
+
+def test_instrumentation():
+    hardware = HardwareConfiguration(1, basis_gates={'X', 'Z', 'CX'})
+    records = []
+    with recording(Instrumentation(hooks=[
+            lambda *record: records.append(record)])) as instrumentation:
+        circuit = QuantumCircuit(hardware)
+        circuit.add_from_string("X(0, 75.0), Y(0, 67.0), X(0, 85.0)")
+        circuit.add(Y(0, 10))
+        circuit.optimize()
+
+    snapshot = json.loads(instrumentation.to_json())
+    assert snapshot["parse"]["gates"] == 3
+    assert snapshot["translation"]["calls"] == 2
+    assert snapshot["translation"]["gates"] == 4
+    assert snapshot["fusion"]["gates"] == 8
+    assert snapshot["decomposition"]["gates"] == 1
+    assert snapshot["optimize"]["calls"] == 1
+    for statistics in snapshot.values():
+        assert sum(statistics["histogram"].values()) == statistics["calls"]
+    assert len(records) == sum(s["calls"] for s in snapshot.values())
+
+    circuit.optimize()
+    assert instrumentation.snapshot()["optimize"]["calls"] == 1
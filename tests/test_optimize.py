@@ -1,6 +1,20 @@
+import numpy as np
+import pytest
+
 from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.decomposition_cache import DecompositionCache
+from optimize_circuit.gates import X, Y, Z, CX, OneQubitUnitary, \
+    rotation_matrices
+from optimize_circuit.dag import CircuitDAG
+from optimize_circuit.optimize_gates import optimize_batch, \
+    optimize_wires, reduce_unitaries, choose_euler_bases, \
+    u_to_optimal_three_gates, fused_run_angles
+from optimize_circuit import optimize_gates, quaternion
+from optimize_circuit.transformations import u_to_zyz_gates, \
+    u_to_zxz_gates, u_to_xyx_gates, u_to_xzx_gates, u_to_yxy_gates, \
+    u_to_yzy_gates
 from optimize_circuit.hardware_configuration \
-    import HardwareConfiguration
+    import HardwareConfiguration, SINGLE
 
 xyz_hardware = HardwareConfiguration(1, basis_gates={'X', 'Y', 'Z', 'CX'})
 xz_hardware = HardwareConfiguration(1, basis_gates={'X', 'Z', 'CX'})
@@ -35,3 +49,267 @@ def test_optimize():
     circuit_9018090.add_from_string("Z(0, 90), X(0, 180), Z(0, 90)")
     circuit_9018090.optimize()
     assert str(circuit_9018090) == "X(0, 180.0)"
+
+
+def test_optimize_batch():
+    gate_strings = ["X(0, 180.0), Y(0, 67.0), X(0, 5.0), Y(0, 55.0)",
+                    "X(0, 90), X(0, 180)",
+                    "Z(0, 90), X(0, 180), Z(0, 90)",
+                    "X(0, 75.0), Y(0, 67.0), X(0, 85.0), Y(0, 55.0), "
+                    "X(0, 55.0), Y(0, 67.0), X(0, 96.0)",
+                    "Y(0, 12.5), Z(0, 33.0), X(0, -41.0), Z(0, 7.0), "
+                    "Y(0, 99.0)"]
+
+    for hardware in (xyz_hardware, xz_hardware, yz_hardware):
+        circuits = []
+        for gates_string in gate_strings:
+            circuit = QuantumCircuit(hardware)
+            circuit.add_from_string(gates_string)
+            circuits.append(circuit)
+
+        batch = optimize_batch(circuits, hardware)
+
+        for circuit, optimized in zip(circuits, batch):
+            circuit.optimize()
+            assert len(optimized) == len(circuit)
+            for gate, expected in zip(optimized, circuit.gates):
+                assert type(gate) is type(expected)
+                assert np.isclose(gate.theta, expected.theta)
+
+
+def test_optimize_batch_cx():
+    gate_list = [X(0, 30), CX(0, 1), X(0, 40)]
+    two_qubit_hardware = HardwareConfiguration(
+        2, basis_gates={'X', 'Z', 'CX'})
+    # circuits on many qubits are left as they are
+    assert optimize_batch([gate_list], two_qubit_hardware) == [gate_list]
+    with pytest.raises(ValueError):
+        optimize_batch([gate_list], xz_hardware)
+
+
+def test_optimize_batch_random_parity():
+    # right angles make the fused rotations by 180 degrees the micro
+    # optimization shortens
+    rng = np.random.default_rng(18)
+    for hardware in (xyz_hardware, xz_hardware, yz_hardware):
+        circuits = []
+        for length in rng.integers(1, 9, 300).tolist():
+            angles = np.where(rng.random(length) < 0.5,
+                              rng.choice([90.0, 180.0, -90.0], length),
+                              rng.uniform(-360, 360, length))
+            circuit = QuantumCircuit(hardware)
+            circuit.add_columns(rng.integers(0, 3, length),
+                                np.zeros(length, dtype=int),
+                                np.full(length, -1), angles,
+                                np.zeros(length, dtype=np.uint8))
+            circuits.append(circuit)
+
+        batch = optimize_batch(circuits, hardware)
+
+        for circuit, optimized in zip(circuits, batch):
+            circuit.optimize()
+            assert [type(gate) for gate in optimized] == \
+                [type(gate) for gate in circuit.gates]
+            differences = np.subtract(
+                [gate.theta for gate in optimized],
+                [gate.theta for gate in circuit.gates])
+            assert np.allclose((differences + 180) % 360 - 180, 0)
+
+
+def test_optimize_preserves_unitary():
+    rng = np.random.default_rng(7)
+
+    for hardware in (xyz_hardware, xz_hardware, yz_hardware):
+        for length in (4, 9, 100000):
+            circuit = QuantumCircuit(hardware)
+            circuit.add_columns(rng.integers(0, 3, length),
+                                np.zeros(length, dtype=int),
+                                np.full(length, -1),
+                                rng.uniform(-360, 360, length),
+                                np.zeros(length, dtype=np.uint8))
+            expected = reduce_unitaries(rotation_matrices(
+                circuit.storage.codes, circuit.storage.angles)[np.newaxis])
+
+            circuit.optimize()
+            assert len(circuit) <= 3
+            optimized = reduce_unitaries(np.array(
+                [[gate.arr for gate in circuit.gates]]))
+            overlap = np.trace(expected[0].conj().T @ optimized[0]) / 2
+            assert np.isclose(abs(overlap), 1)
+
+
+def test_optimize_two_qubit_wires():
+    rng = np.random.default_rng(11)
+    hardware = HardwareConfiguration(2, basis_gates={'X', 'Z', 'CX'})
+    hardware.length_z = 20
+
+    for length in (0, 3, 40, 2000):
+        codes = rng.integers(0, 4, length)
+        qubits_1 = rng.integers(0, 2, length)
+        qubits_2 = np.where(codes == 3, 1 - qubits_1, -1)
+        angles = rng.uniform(-360, 360, length)
+        circuit, cached = QuantumCircuit(hardware), QuantumCircuit(
+            hardware, decomposition_cache=DecompositionCache())
+        for added in (circuit, cached):
+            added.add_columns(codes, qubits_1, qubits_2, angles,
+                              np.zeros(length, dtype=np.uint8))
+            added.add_from_string("Z(1, 45), CX(0, 1), X(1, 30), X(1, 50)")
+        expected = circuit.unitary()
+        cx_number = circuit.get_cx_number()
+        wires = QuantumCircuit.from_dag(CircuitDAG.from_storage(
+            optimize_wires(circuit.storage, hardware)), hardware)
+
+        circuit.optimize()
+        cached.optimize()
+        assert str(cached) == str(circuit)
+        overlap = np.trace(expected.conj().T @ circuit.unitary()) / 4
+        assert np.isclose(abs(overlap), 1)
+        # the whole circuit is synthesized with at most three CX gates
+        assert circuit.get_cx_number() <= min(cx_number, 3)
+        # at most three gates on every wire between the CX gates
+        assert len(wires) <= 3 * 2 * (cx_number + 1) + cx_number
+        assert str(wires).endswith("CX(0, 1), X(1, 80.0)")
+
+
+def test_euler_bases():
+    rng = np.random.default_rng(5)
+    theta, phi, lam = rng.uniform(-180, 180, (3, 20))
+    for row in range(len(theta)):
+        unitary = OneQubitUnitary(0, theta[row], phi[row], lam[row])
+        for to_gates in (u_to_zyz_gates, u_to_zxz_gates, u_to_xyx_gates,
+                         u_to_xzx_gates, u_to_yxy_gates, u_to_yzy_gates):
+            gate_list = to_gates(unitary)
+            product = reduce_unitaries(np.array(
+                [[gate.arr for gate in gate_list]]))[0]
+            overlap = np.trace(unitary.arr.conj().T @ product) / 2
+            assert np.isclose(abs(overlap), 1)
+
+    # Z is the most expensive gate: the XYX or YXY sequences win
+    hardware = HardwareConfiguration(1)
+    hardware.length_z = 50
+    codes, angles = choose_euler_bases(theta, phi, lam, hardware)
+    assert not ((codes == Z.code) & (angles != 0)).any()
+
+    xz_hardware = HardwareConfiguration(1, basis_gates={'X', 'Z', 'CX'})
+    xz_hardware.length_z = 50
+    gate_list = u_to_optimal_three_gates(
+        OneQubitUnitary(0, theta[0], phi[0], lam[0]), xz_hardware)
+    assert [type(gate) for gate in gate_list] == [X, Z, X]
+    # a pure X rotation is one gate in every basis starting with X
+    assert [str(gate) for gate in u_to_xzx_gates(
+        OneQubitUnitary(0, 40, -90, 90))] == ["X(0, 40.0)"]
+
+    # Z(180), Y(t), Z(b) is Y(-t), Z(b + 180)
+    gate_list = u_to_optimal_three_gates(
+        OneQubitUnitary(0, 3.53, -12.93, 180), xyz_hardware)
+    assert [type(gate) for gate in gate_list] == [Y, Z]
+    assert np.allclose([gate.theta for gate in gate_list], [-3.53, 167.07])
+    # a few unitaries are decomposed one by one in Python floats, with
+    # the same choice as the vectorized pipeline
+    special = rng.choice([0, 90, 180, -90], (3, 40))
+    theta, phi, lam = np.where(rng.random((3, 40)) < 0.5, special,
+                               rng.uniform(-180, 180, (3, 40)))
+    for hardware in (xyz_hardware, xz_hardware):
+        codes, angles = choose_euler_bases(theta, phi, lam, hardware)
+        for row in range(len(theta)):
+            row_codes, row_angles = choose_euler_bases(
+                theta[row:row + 1], phi[row:row + 1], lam[row:row + 1],
+                hardware)
+            present = angles[row] != 0
+            assert np.array_equal(row_angles[0] != 0, present)
+            assert np.array_equal(row_codes[0][present],
+                                  codes[row][present])
+            assert np.allclose(row_angles[0], angles[row])
+
+
+def test_single_precision():
+    rng = np.random.default_rng(16)
+    codes = rng.integers(0, 3, 64 * 100)
+    angles = rng.uniform(-180, 180, 64 * 100)
+    starts, lengths = np.arange(100) * 64, np.full(100, 64)
+    hardware = HardwareConfiguration(1)
+    theta, phi, lam, tolerance = fused_run_angles(
+        codes, angles, starts, lengths, hardware)
+    exact = quaternion.from_angles(theta, phi, lam)
+    assert (tolerance == 1e-9).all()
+
+    hardware.precision = SINGLE
+    *parameters, tolerance = fused_run_angles(
+        codes, angles, starts, lengths, hardware)
+    fused = quaternion.from_angles(*parameters)
+    errors = np.minimum(np.linalg.norm(fused - exact, axis=1),
+                        np.linalg.norm(fused + exact, axis=1))
+    bounds = quaternion.fusion_errors(angles, starts, lengths)
+    assert (errors <= bounds).all() and (bounds <= 1e-4).all()
+    assert (tolerance > 1e-9).all()
+
+    # the runs with a too large error bound are fused in double precision
+    hardware.precision_tolerance = float(np.median(bounds))
+    *parameters, tolerance = fused_run_angles(
+        codes, angles, starts, lengths, hardware)
+    fallback = bounds > hardware.precision_tolerance
+    assert np.array_equal(np.array(parameters)[:, fallback],
+                          np.array([theta, phi, lam])[:, fallback])
+    assert (tolerance[fallback] == 1e-9).all()
+
+    # rounding noise does not leave near zero rotations behind
+    circuit = QuantumCircuit(hardware)
+    circuit.add_from_string("X(0, 33.3), Y(0, 12.1), Y(0, -12.1), "
+                            "X(0, -33.3), Z(0, 17)")
+    circuit.optimize()
+    assert str(circuit) == "Z(0, 17.0)"
+    with pytest.raises(ValueError):
+        hardware.precision = "half"
+
+
+def test_decomposition_cache():
+    hardware = HardwareConfiguration(1)
+    cache = DecompositionCache(maxsize=2)
+    gates_string = "X(0, 75.0), Y(0, 67.0), X(0, 85.0), Y(0, 55.0)"
+
+    results = []
+    for _ in range(3):
+        circuit = QuantumCircuit(hardware, decomposition_cache=cache)
+        circuit.add_from_string(gates_string)
+        circuit.optimize()
+        results.append(str(circuit))
+    assert results[0] == results[1] == results[2]
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    hardware.length_y = 30
+    circuit = QuantumCircuit(hardware, decomposition_cache=cache)
+    circuit.add_from_string(gates_string)
+    circuit.optimize()
+    assert cache.invalidations == 1 and cache.misses == 2
+    assert circuit.get_y_number() == 0
+
+    for theta in (10.0, 20.0):
+        circuit = QuantumCircuit(hardware, decomposition_cache=cache)
+        circuit.add_from_string(f"X(0, {theta}), Y(0, 67.0), "
+                                f"X(0, 85.0), Y(0, 55.0)")
+        circuit.optimize()
+    assert len(cache) == 2 and cache.evictions == 1
+
+
+def test_decomposition_cache_hits_skip_decomposition(monkeypatch):
+    hardware = HardwareConfiguration(1)
+    circuits = [[X(0, 10.0 * (seed % 3)), Y(0, 67.0), Z(0, 85.0),
+                 X(0, 55.0)] for seed in range(30)]
+    decomposed = []
+
+    def counted(theta, *args, **kwargs):
+        decomposed.append(len(theta))
+        return choose_euler_bases(theta, *args, **kwargs)
+    monkeypatch.setattr(optimize_gates, "choose_euler_bases", counted)
+
+    cache = DecompositionCache()
+    expected = [[str(gate) for gate in gate_list]
+                for gate_list in optimize_batch(circuits, hardware)]
+    assert decomposed == [30]
+    for _ in range(2):
+        optimized = optimize_batch(circuits, hardware, cache)
+        assert [[str(gate) for gate in gate_list]
+                for gate_list in optimized] == expected
+    # the first batch decomposes its misses, the second one nothing
+    assert decomposed == [30, 30]
+    assert (cache.hits, cache.misses) == (30, 30)
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.gates import X
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+from optimize_circuit.parametric import CircuitTemplate, Parameter, \
+    parse_angle
+
+
+def _overlap(circuit, reference):
+    return abs(np.trace(circuit.unitary().conj().T @ reference.unitary())
+               ) / 2 ** circuit.hardware.qubit_number
+
+
+def test_bind():
+    hardware = HardwareConfiguration(1, {"X", "Z", "CX"})
+    template = CircuitTemplate(hardware)
+    template.add_from_string("Y(0, 90), Z(0, 2 * theta - 30), X(0, 45), "
+                             "X(0, phi / 2), Z(0, theta - theta), Y(0, 10)")
+    assert template.parameters == ("theta", "phi")
+
+    values = np.random.default_rng(21).uniform(-360, 360, (20, 2))
+    circuits = template.bind(values)
+    codes, angles = template.bind_euler(values)
+    assert codes.shape == angles.shape == (20, 3)
+    for circuit, (theta, phi) in zip(circuits, values):
+        reference = QuantumCircuit(hardware)
+        reference.add_from_string(f"Y(0, 90), Z(0, {2 * theta - 30}), "
+                                  f"X(0, 45), X(0, {phi / 2}), Y(0, 10)")
+        assert len(circuit.gates) <= 3
+        assert np.isclose(_overlap(circuit, reference), 1)
+    # unoptimized circuits keep the rewritten structure
+    assert all(np.isclose(_overlap(circuit, optimized), 1) for circuit,
+               optimized in zip(template.bind(values, optimize=False),
+                                circuits))
+
+    hardware = HardwareConfiguration(2)
+    template = CircuitTemplate(hardware)
+    theta = Parameter("theta")
+    template.add(X(0, theta))
+    template.add_from_string("CX(0, 1), Y(1, theta), Y(1, -theta)")
+    circuits = template.bind({"theta": [90, 180]})
+    assert [str(circuit) for circuit in circuits] == \
+        ["X(0, 90.0), CX(0, 1)", "X(0, 180.0), CX(0, 1)"]
+
+
+def test_bind_errors():
+    template = CircuitTemplate(HardwareConfiguration(1))
+    template.add_from_string("X(0, theta), Y(0, phi)")
+    with pytest.raises(ValueError):
+        template.bind(np.zeros((4, 3)))
+    with pytest.raises(ValueError):
+        template.bind({"theta": [0, 1]})
+    with pytest.raises(NotImplementedError):
+        CircuitTemplate(HardwareConfiguration(2)).bind_euler(np.zeros((1, 0)))
+    for expression in ("theta * phi", "30 / theta", "theta ** 2", "f(1)"):
+        with pytest.raises(ValueError):
+            parse_angle(expression)
+    with pytest.raises(ValueError):
+        template.add_from_string("X(1, theta)")
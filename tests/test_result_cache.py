@@ -0,0 +1,71 @@
+import pytest
+
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.gates import X
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+from optimize_circuit.result_cache import ResultCache, circuit_key, \
+    optimize_cached
+
+
+def _circuits(hardware, lines):
+    circuits = []
+    for line in lines:
+        circuit = QuantumCircuit(hardware)
+        circuit.add_from_string(line)
+        circuits.append(circuit)
+    return circuits
+
+
+def test_optimize_cached(tmp_path):
+    path = tmp_path / "results.sqlite"
+    lines = ["X(0, 90), Y(0, 45), Z(0, 30), X(0, 10)", "Y(0, 35.5)",
+             "X(0, 15), X(0, 20), Y(0, 40), Z(0, 10), X(0, 5)"] * 3
+    for qubit_number in (1, 2):
+        hardware = HardwareConfiguration(qubit_number, {"X", "Z", "CX"})
+        expected = _circuits(hardware, lines)
+        for circuit in expected:
+            circuit.optimize()
+
+        with ResultCache(str(path)) as cache:
+            circuits = optimize_cached(_circuits(hardware, lines), hardware,
+                                       cache)
+            assert [str(c) for c in circuits] == [str(c) for c in expected]
+            statistics = cache.statistics()
+            assert (statistics["misses"], statistics["duplicates"]) == (3, 6)
+        # the results outlive the process
+        with ResultCache(str(path)) as cache:
+            circuits = optimize_cached(_circuits(hardware, lines), hardware,
+                                       cache)
+            assert [str(c) for c in circuits] == [str(c) for c in expected]
+            assert cache.statistics()["hit_rate"] == 1.0
+            # the copies of a batch are independent
+            circuits[0].add(X(0, 10))
+            assert str(circuits[3]) == str(expected[3])
+
+    hardware = HardwareConfiguration(1)
+    circuit = _circuits(hardware, lines[:1])[0]
+    key = circuit_key(circuit, hardware)
+    hardware.length_z = 20
+    assert circuit_key(circuit.storage, hardware) != key
+    key = circuit_key(circuit, hardware)
+    hardware.precision_tolerance = 1e-6
+    assert circuit_key(circuit, hardware) != key
+
+
+def test_result_cache_eviction():
+    hardware = HardwareConfiguration(1)
+    circuits = _circuits(hardware, [f"X(0, {angle})" for angle in
+                                    range(1, 11)])
+    with ResultCache(":memory:", max_bytes=5 * 16) as cache:
+        for circuit in circuits[:5]:
+            cache.put_many([(circuit_key(circuit, hardware),
+                             circuit.storage)])
+        # the first entry is used recently, the second one is evicted
+        assert len(cache.get_many([circuit_key(circuits[0], hardware)])) == 1
+        cache.put_many([(circuit_key(circuits[5], hardware),
+                         circuits[5].storage)])
+        assert len(cache) == 5 and cache.evictions == 1
+        assert cache.get_many([circuit_key(circuits[1], hardware)]) == {}
+    with pytest.raises(ValueError):
+        ResultCache(":memory:", max_bytes=0)
@@ -0,0 +1,49 @@
+import numpy as np
+
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.gates import X, Y, Z
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+from optimize_circuit.rewrite_rules import rewrite_gates
+
+
+def _strings(gate_list):
+    return [str(gate) for gate in gate_list]
+
+
+def test_rewrite_gates():
+    # rewrites enable further rewrites until the fixpoint
+    assert rewrite_gates([X(0, 90), Y(0, 180), X(0, 45), X(0, 45),
+                          Z(0, 30), Z(0, -30), Y(0, 180)]) == []
+    assert _strings(rewrite_gates([Z(0, 180), X(0, 30), Z(0, 180)])) == \
+        ["X(0, -30)"]
+    assert _strings(rewrite_gates([Y(0, 10), X(0, 180), Y(0, 70)])) == \
+        ["Y(0, -60)", "X(0, 180)"]
+    # only multiples of 360 plus 180 are 180 degree rotations
+    gate_list = [X(0, 180.5), Y(0, 30), X(0, 180.5)]
+    assert rewrite_gates(gate_list) == gate_list
+
+    rng = np.random.default_rng(18)
+    hardware = HardwareConfiguration(1)
+    for _ in range(100):
+        gate_list = [(X, Y, Z)[code](0, angle) for code, angle in zip(
+            rng.integers(0, 3, 12).tolist(),
+            rng.choice([0, 90, 180, -90, 270, 45], 12).tolist())]
+        rewritten = rewrite_gates(gate_list)
+        assert len(rewritten) <= len(gate_list)
+        original, optimized = QuantumCircuit(hardware), \
+            QuantumCircuit(hardware)
+        original.gates, optimized.gates = gate_list, rewritten
+        overlap = np.trace(original.unitary().conj().T @
+                           optimized.unitary()) / 2
+        assert np.isclose(abs(overlap), 1)
+
+
+def test_rewrite_circuit():
+    hardware = HardwareConfiguration(2)
+    circuit = QuantumCircuit(hardware)
+    circuit.add_from_string("Z(0, 90), X(1, 20), X(0, 180), Z(0, 90), "
+                            "X(1, -20), CX(0, 1), Y(0, 30), Y(0, 330), "
+                            "Z(1, 15)")
+    circuit.rewrite()
+    assert str(circuit) == "X(0, 180.0), CX(0, 1), Z(1, 15.0)"
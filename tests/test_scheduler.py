@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from optimize_circuit import scheduler
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.gate_storage import GateStorage
+from optimize_circuit.gates import CX
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+
+
+def _reference_starts(storage, lengths):
+    ready = {}
+    starts = []
+    for code, qubit_1, qubit_2, length in zip(
+            storage.codes.tolist(), storage.qubits_1.tolist(),
+            storage.qubits_2.tolist(), lengths.tolist()):
+        qubits = (qubit_1, qubit_2) if code == CX.code else (qubit_1,)
+        start = max(ready.get(qubit, 0) for qubit in qubits)
+        for qubit in qubits:
+            ready[qubit] = start + length
+        starts.append(start)
+    return np.array(starts)
+
+
+def test_schedule():
+    hardware = HardwareConfiguration(3, basis_gates={'X', 'Y', 'Z', 'CX'})
+    hardware.length_z = 5
+    circuit = QuantumCircuit(hardware)
+    circuit.add_from_string("X(0, 10), Z(1, 20), Z(1, 30), CX(0, 1), "
+                            "Y(2, 40), CX(1, 0), X(0, 50)")
+    asap = circuit.schedule()
+    assert asap.starts.tolist() == [0, 0, 5, 10, 0, 110, 210]
+    assert asap.duration == 220
+    alap = circuit.schedule(scheduler.ALAP)
+    assert alap.starts.tolist() == [0, 0, 5, 10, 210, 110, 210]
+    assert alap.duration == 220
+    assert asap.critical_path().tolist() == [0, 1, 2, 3, 5, 6]
+    assert alap.slacks().tolist() == [0, 0, 0, 0, 210, 0, 0]
+    assert [layer.tolist() for layer in scheduler.layers(circuit)] == \
+        [[0, 1, 4], [2], [3], [5], [6]]
+    assert scheduler.duration(circuit, hardware) == 220
+    with pytest.raises(ValueError):
+        circuit.schedule("soon")
+
+    rng = np.random.default_rng(15)
+    for qubit_number in (2, 5):
+        storage = GateStorage()
+        size = 500
+        codes = rng.integers(0, 4, size)
+        qubits_1 = rng.integers(0, qubit_number, size)
+        qubits_2 = np.where(
+            codes == CX.code,
+            (qubits_1 + rng.integers(1, qubit_number, size)) % qubit_number,
+            -1)
+        storage.extend(codes, qubits_1, qubits_2, rng.uniform(0, 90, size),
+                       np.zeros(size))
+        result = scheduler.schedule(storage, hardware)
+        assert np.array_equal(result.starts, _reference_starts(
+            storage, scheduler.gate_lengths(storage.codes, hardware)))
+        assert (result.slacks() >= 0).all()
+        assert len(scheduler.schedule(storage, hardware, "alap")) == size
+    assert scheduler.schedule(GateStorage(), hardware).duration == 0
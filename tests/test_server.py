@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+
+from optimize_circuit import server as server_module
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+from optimize_circuit.server import OptimizationServer
+
+
+def test_server():
+    lines = ["X(0, 90), Y(0, 45), Z(0, 30), X(0, 10)",
+             "Z(0, 90), X(0, 180), Z(0, 90)", "Y(0, 35.5)",
+             "X(0, 15), X(0, 20), Y(0, 40), Z(0, 10), X(0, 5)"] * 25
+    hardware = HardwareConfiguration(1)
+    expected = []
+    for line in lines:
+        circuit = QuantumCircuit(hardware)
+        circuit.add_from_string(line)
+        circuit.optimize()
+        expected.append(str(circuit))
+
+    settings = {"qubit_number": 1, "basis_gates": hardware.basis_gates,
+                "length_x": None, "length_y": None, "length_z": None,
+                "length_cx": None}
+    # a small queue makes the connection wait for room (backpressure)
+    server = OptimizationServer(settings, max_batch=16, max_delay=0.01,
+                                max_queue=8)
+
+    async def run():
+        listening = await server.start()
+        port = listening.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for number, line in enumerate(lines):
+            writer.write(json.dumps({"id": number, "circuit": line})
+                         .encode() + b"\n")
+        writer.write(b'{"id": "bad", "circuit": "X(1, 90)"}\nnot json\n')
+        await writer.drain()
+        responses = [json.loads(await reader.readline())
+                     for _ in range(len(lines) + 2)]
+        writer.write(b'{"stats": true}\n')
+        await writer.drain()
+        statistics = json.loads(await reader.readline())["stats"]
+        # the server API without a connection
+        single = await server.optimize(lines[0])
+        writer.close()
+        await server.close()
+        return responses, statistics, single
+
+    responses, statistics, single = asyncio.run(run())
+    results = {response.get("id"): response for response in responses}
+    assert [results[number]["circuit"] for number in range(len(lines))] \
+        == expected
+    assert "error" in results["bad"] and "error" in results[None]
+    assert statistics["requests"] == len(lines) + 1
+    assert statistics["errors"] == 1
+    assert statistics["batches"] < statistics["requests"]
+    assert statistics["max_queue_depth"] <= 8
+    assert 0 < statistics["latency_ms"]["p50"] <= \
+        statistics["latency_ms"]["p99"]
+    assert single == expected[0]
+
+
+@pytest.mark.parametrize("qubit_number", [1, 2])
+def test_server_failing_circuit(monkeypatch, qubit_number):
+    optimize = QuantumCircuit.optimize
+
+    def failing_optimize(circuit):
+        if any(getattr(gate, "theta", 0) == 13 for gate in circuit.gates):
+            raise OverflowError("math range error")
+        optimize(circuit)
+
+    def failing_batch(circuits, *args):
+        raise ArithmeticError("the batch failed")
+
+    monkeypatch.setattr(QuantumCircuit, "optimize", failing_optimize)
+    monkeypatch.setattr(server_module, "optimize_batch", failing_batch)
+    hardware = HardwareConfiguration(qubit_number)
+    lines = ["X(0, 90), Y(0, 45), Z(0, 30), X(0, 10)", "X(0, 13), Y(0, 1)",
+             "OPENQASM 2.0; qreg q[1]; rz(" + "1" * 400 + ") q[0];",
+             "Z(0, 90), X(0, 180), Z(0, 90)"]
+    expected = []
+    for line in lines[::3]:
+        circuit = QuantumCircuit(hardware)
+        circuit.add_from_string(line)
+        optimize(circuit)
+        expected.append(str(circuit))
+
+    settings = {"qubit_number": qubit_number,
+                "basis_gates": hardware.basis_gates, "length_x": None,
+                "length_y": None, "length_z": None, "length_cx": None}
+    server = OptimizationServer(settings, max_batch=16, max_delay=0.05)
+
+    async def run():
+        await server.start()
+        results = await asyncio.gather(
+            *(server.optimize(line) for line in lines),
+            return_exceptions=True)
+        statistics = server.statistics()
+        await server.close()
+        return results, statistics
+
+    # the wrong circuits fail their own requests of the same batch only
+    results, statistics = asyncio.run(run())
+    assert statistics["batches"] == 1
+    assert results[::3] == expected
+    assert "math range error" in str(results[1])
+    assert isinstance(results[2], ValueError)
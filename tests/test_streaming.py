@@ -0,0 +1,81 @@
+import io
+
+import numpy as np
+import pytest
+
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.gates import X, Y, Z, CX
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+from optimize_circuit.streaming import optimize_stream, iter_file_gates, \
+    write_gates
+
+
+def test_optimize_stream():
+    hardware = HardwareConfiguration(2)
+    rng = np.random.default_rng(17)
+    for _ in range(50):
+        gates = []
+        for _ in range(rng.integers(0, 40)):
+            kind = int(rng.integers(0, 5))
+            if kind >= 3:
+                gates.append(CX(*rng.permutation(2).tolist()))
+            else:
+                gates.append((X, Y, Z)[kind](
+                    int(rng.integers(0, 2)),
+                    float(rng.choice([0, 90, 180, -90, 33.5]))))
+        original, optimized = QuantumCircuit(hardware), \
+            QuantumCircuit(hardware)
+        for gate in gates:
+            original.add(gate)
+        for gate in optimize_stream(iter(gates), hardware, window=5):
+            optimized.add(gate)
+        overlap = np.trace(original.unitary().conj().T @
+                           optimized.unitary()) / 4
+        assert np.isclose(abs(overlap), 1)
+        assert optimized.get_cx_number() <= original.get_cx_number()
+
+    # a CX pair with only identity runs between them cancels
+    stream = optimize_stream([CX(0, 1), X(0, 90), X(0, -90), CX(0, 1),
+                              Z(1, 10)], hardware)
+    assert [str(gate) for gate in stream] == ["Z(1, 10)"]
+
+    output = io.StringIO()
+    source = ["X(0, 10), Y(0, 20), CX(0, 1), X(1, 5), X(1, 5)"]
+    assert write_gates(optimize_stream(iter_file_gates(source), hardware),
+                       output) == 4
+    assert output.getvalue() == \
+        "X(0, 10.0), Y(0, 20.0), CX(0, 1), X(1, 10.0)"
+
+    # the gates outside the basis are translated into it, also in the
+    # short runs which are not fused
+    yz_hardware = HardwareConfiguration(2, basis_gates={'Y', 'Z', 'CX'})
+    gates = [X(0, 30), CX(0, 1), X(1, 20), X(1, 10), Y(1, 5), X(1, 15),
+             X(0, 40), X(0, 50), Y(0, 70), X(0, 20), CX(1, 0)]
+    original = QuantumCircuit(yz_hardware)
+    for gate in gates:
+        original.add(gate)
+    for window in (4, 1024):
+        optimized = QuantumCircuit(yz_hardware)
+        for gate in optimize_stream(gates, yz_hardware, window=window):
+            assert not isinstance(gate, X)
+            optimized.add(gate)
+        overlap = np.trace(original.unitary().conj().T @
+                           optimized.unitary()) / 4
+        assert np.isclose(abs(overlap), 1)
+    one_qubit = HardwareConfiguration(1, basis_gates={'Y', 'Z', 'CX'})
+    circuit = QuantumCircuit(one_qubit)
+    circuit.add(X(0, 30))
+    circuit.optimize()
+    assert [str(gate) for gate in optimize_stream([X(0, 30)], one_qubit)] \
+        == [str(gate) for gate in circuit.gates]
+
+    # the runs are fused in place when they reach the window
+    long_run = optimize_stream((X(0, 10) if position % 2 else Y(0, 10)
+                                for position in range(10 ** 4)),
+                               hardware, window=8)
+    assert len(list(long_run)) <= 3
+    with pytest.raises(ValueError):
+        list(optimize_stream([], hardware, window=3))
+    with pytest.raises(ValueError):
+        list(optimize_stream([X(2, 10)], hardware))
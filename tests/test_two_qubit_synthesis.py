@@ -0,0 +1,42 @@
+import numpy as np
+
+from optimize_circuit.gates import X, Y, Z, CX, TwoQubitUnitary, \
+    rotation_matrices
+from optimize_circuit.two_qubit_synthesis import synthesize, cx_number, \
+    storage_unitary
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+
+hardware = HardwareConfiguration(2, basis_gates={'Y', 'Z', 'CX'})
+
+
+def test_synthesize():
+    rng = np.random.default_rng(7)
+
+    def local(count):
+        one_qubit = [rotation_matrices(np.full(count, code),
+                                       rng.uniform(-180, 180, count))
+                     for code in [Z.code, Y.code] * 3]
+        qubit_0 = one_qubit[2] @ one_qubit[1] @ one_qubit[0]
+        qubit_1 = one_qubit[5] @ one_qubit[4] @ one_qubit[3]
+        return np.einsum("nij,nkl->nikjl", qubit_1,
+                         qubit_0).reshape(-1, 4, 4)
+
+    count = 20
+    cx_01, cx_10 = CX(0, 1).arr, CX(1, 0).arr
+    blocks = [local(count),
+              local(count) @ cx_10 @ local(count),
+              local(count) @ cx_01 @ local(count) @ cx_10 @ local(count),
+              local(count) @ cx_01 @ local(count) @ cx_10 @ local(count) @
+              cx_01 @ local(count) @ cx_10 @ local(count)]
+    unitaries = np.concatenate(blocks)
+    expected = np.repeat([0, 1, 2, 3], count)
+    assert (cx_number(unitaries) == expected).all()
+
+    synthesized = synthesize([TwoQubitUnitary(unitary)
+                              for unitary in unitaries], hardware)
+    for unitary, storage, cx in zip(unitaries, synthesized, expected):
+        assert np.count_nonzero(storage.codes == CX.code) == cx
+        assert not (storage.codes == X.code).any()
+        overlap = np.trace(unitary.conj().T @ storage_unitary(storage)) / 4
+        assert np.isclose(abs(overlap), 1)
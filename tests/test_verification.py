@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from optimize_circuit.circuit import QuantumCircuit
+from optimize_circuit.hardware_configuration \
+    import HardwareConfiguration
+from optimize_circuit.verification import verify, distances
+
+
+def _random_circuits(hardware, rng, number):
+    # CX only on more than one qubit
+    gate_number = 3 if hardware.qubit_number == 1 else 4
+    circuits = []
+    for length in rng.integers(0, 30, number).tolist():
+        circuit = QuantumCircuit(hardware)
+        circuit.add_from_string(", ".join(
+            "CX(0, 1)" if code == 3 else f"{'XYZ'[code]}({qubit}, {angle})"
+            for code, qubit, angle in zip(
+                rng.integers(0, gate_number, length).tolist(),
+                rng.integers(0, hardware.qubit_number, length).tolist(),
+                rng.uniform(-180, 180, length).tolist())))
+        circuits.append(circuit)
+    return circuits
+
+
+def test_verify():
+    rng = np.random.default_rng(23)
+    for qubit_number in (1, 2):
+        hardware = HardwareConfiguration(qubit_number)
+        originals = _random_circuits(hardware, rng, 40)
+        optimized = []
+        for circuit in originals:
+            copy = QuantumCircuit(hardware)
+            copy.add_from_string(str(circuit))
+            copy.optimize()
+            optimized.append(copy)
+        assert not verify(originals, optimized).any()
+        assert not verify(originals, optimized, samples=3, seed=1).any()
+
+        # a changed angle and a missing gate are found
+        broken = [position for position, circuit in enumerate(optimized)
+                  if len(circuit)][:2]
+        optimized[broken[0]].storage.angles[0] += 1e-4
+        optimized[broken[1]].delete(0)
+        for samples in (None, 2):
+            assert np.flatnonzero(verify(originals, optimized,
+                                         samples=samples)).tolist() == broken
+        # a global phase is not a difference
+        assert np.allclose(distances(originals[:1], originals[:1]), 0)
+
+    with pytest.raises(ValueError):
+        verify(originals, optimized[:-1])
+    with pytest.raises(ValueError):
+        verify(originals, optimized, samples=0)